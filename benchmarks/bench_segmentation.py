@@ -0,0 +1,50 @@
+"""
+Segmentation benchmark: vectorized process_dataframe vs the row-by-row reference.
+
+Checks that both produce identical turns, then prints rows/second for each.
+
+Usage:
+    python benchmarks/bench_segmentation.py --rows 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import preprocessor
+from synthetic import make_transcripts
+
+def check_parity(df):
+    expected = preprocessor.process_dataframe_iterrows(df)
+    actual = preprocessor.process_dataframe(df)
+    cols = preprocessor.TURN_COLUMNS
+    assert list(actual.columns) == cols, actual.columns
+    assert len(actual) == len(expected), (len(actual), len(expected))
+    assert (actual[cols].astype(object).values == expected[cols].astype(object).values).all()
+
+def time_it(func, df, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="number of transcripts")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_transcripts(args.rows)
+    check_parity(df)
+    print(f"Parity OK on {len(df)} transcripts.")
+
+    for name, func in [("iterrows", preprocessor.process_dataframe_iterrows),
+                       ("vectorized", preprocessor.process_dataframe)]:
+        seconds = time_it(func, df, args.repeat)
+        print(f"{name:>10}: {seconds:.3f}s  ({len(df) / seconds:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
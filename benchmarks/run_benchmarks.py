@@ -0,0 +1,194 @@
+"""
+Benchmark suite: times every public analysis stage on synthetic transcripts.
+
+For each size the synthetic corpus (see synthetic.py) is generated offline, then
+every stage is run --repeat times (best wall time kept) and once more under
+tracemalloc for its peak Python/numpy allocation. Results go to a JSON file.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --compare old.json new.json --threshold 0.2
+
+Compare mode exits with status 1 if any stage got slower (or used more memory) by
+more than the threshold.
+"""
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# Keep every artifact the stages write (models, images) out of the working tree
+WORK_DIR = tempfile.mkdtemp(prefix="interviewer-bench-")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+os.environ.setdefault("CLUSTER_MODEL_PATH", os.path.join(WORK_DIR, "cluster_model.npz"))
+os.environ.setdefault("LAYOUT_CACHE_DIR", os.path.join(WORK_DIR, "layouts"))
+os.environ.setdefault("FIGURE_CACHE_DIR", os.path.join(WORK_DIR, "figures"))
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import networkx as nx
+import pandas as pd
+# The analysis modules import these lazily; load them here so that the first timed
+# call of a stage does not include their import time
+import matplotlib.pyplot
+import sklearn.cluster
+import sklearn.feature_extraction.text
+import preprocessor
+import analysis
+import cooccurrence_matrix
+import figure_render
+import graph_layout
+import semantic_analysis
+import token_store
+from synthetic import make_transcripts
+
+def stages(raw, df_turns):
+    """
+    (name, unit, number of items processed, callable) for every benchmarked stage.
+    Inputs are prepared outside the timed calls.
+    """
+    texts = raw['text'].tolist()
+    n_user = int((df_turns['role'] == 'user').sum())
+    graph = semantic_analysis.analyze_semantic_network(df_turns, target_word="satisfied")
+    store = token_store.build_store(df_turns)
+    n_user_tokens = int(token_store.row_token_ids(store, store['is_user'].nonzero()[0])[1].sum())
+    image = os.path.join(WORK_DIR, "network.png")
+    # Corpus-wide semantic map (the large graph the force layout is meant for)
+    _, map_edges = semantic_analysis.analyze_semantic_map(store, ["satisfied"], n_terms=2000)
+    map_graph = nx.Graph()
+    map_graph.add_weighted_edges_from(map_edges[['source', 'target', 'weight']].itertuples(index=False))
+    nodes, rows, cols, weights = graph_layout.graph_arrays(map_graph)
+    return [
+        ("segment_dialogue", "transcripts", len(texts), lambda: [preprocessor.segment_dialogue(t) for t in texts]),
+        ("process_dataframe", "transcripts", len(raw), lambda: preprocessor.process_dataframe(raw)),
+        ("analyze_topics_tfidf", "user turns", n_user, lambda: analysis.analyze_topics_tfidf(df_turns)),
+        ("analyze_interactions", "user turns", n_user, lambda: analysis.analyze_interactions(df_turns)),
+        ("analyze_semantic_network", "user turns", n_user,
+         lambda: semantic_analysis.analyze_semantic_network(df_turns, target_word="satisfied")),
+        ("cooccurrence_matrix", "user tokens", n_user_tokens, lambda: cooccurrence_matrix.build_matrix(store)),
+        ("analyze_maturity_clusters", "user turns", n_user, lambda: analysis.analyze_maturity_clusters(df_turns)),
+        # Drawn directly: visualize_network copies unchanged images from the figure cache
+        ("visualize_network", "edges", graph.number_of_edges(),
+         lambda: figure_render.draw(semantic_analysis.network_figure(graph, "satisfied", image), image)),
+        # Uncached layout (the image benchmarks reuse theirs after the first repeat)
+        ("graph_layout", "nodes", len(nodes), lambda: graph_layout.force_layout(len(nodes), rows, cols, weights)),
+    ]
+
+def measure(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    # Separate run for memory: tracemalloc slows the code down too much to time it
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run(sizes, repeat, only=None, seed=42):
+    results = []
+    for size in sizes:
+        raw = make_transcripts(size, seed=seed)
+        df_turns = preprocessor.process_dataframe(raw)
+        print(f"\n{size} transcripts ({len(df_turns)} turns)")
+        for name, unit, n_items, func in stages(raw, df_turns):
+            if only and name not in only:
+                continue
+            seconds, peak = measure(func, repeat)
+            results.append({
+                'stage': name,
+                'transcripts': size,
+                'items': n_items,
+                'unit': unit,
+                'seconds': seconds,
+                'throughput': n_items / seconds if seconds > 0 else None,
+                'peak_mb': peak / 1e6,
+            })
+            print(f"  {name:<26} {seconds:9.3f}s  {n_items / max(seconds, 1e-9):>12,.0f} {unit}/s  {peak / 1e6:9.1f} MB")
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+            'seed': seed,
+            'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': results,
+    }
+
+def compare(old_path, new_path, threshold):
+    """
+    Prints old vs new per stage/size and returns the list of regressions.
+    """
+    with open(old_path, encoding="utf-8") as f:
+        old = {(r['stage'], r['transcripts']): r for r in json.load(f)['results']}
+    with open(new_path, encoding="utf-8") as f:
+        new = {(r['stage'], r['transcripts']): r for r in json.load(f)['results']}
+
+    regressions = []
+    print(f"{'stage':<26} {'size':>8} {'old s':>9} {'new s':>9} {'time':>7} {'old MB':>8} {'new MB':>8} {'mem':>7}")
+    for key in sorted(old.keys() & new.keys(), key=lambda k: (k[1], k[0])):
+        o, n = old[key], new[key]
+        time_ratio = n['seconds'] / o['seconds'] if o['seconds'] > 0 else 1.0
+        mem_ratio = n['peak_mb'] / o['peak_mb'] if o['peak_mb'] > 0 else 1.0
+        flags = []
+        if time_ratio > 1 + threshold:
+            flags.append("SLOWER")
+        if mem_ratio > 1 + threshold:
+            flags.append("MORE MEMORY")
+        if flags:
+            regressions.append((key, flags))
+        print(f"{key[0]:<26} {key[1]:>8} {o['seconds']:>9.3f} {n['seconds']:>9.3f} {time_ratio:>6.2f}x "
+              f"{o['peak_mb']:>8.1f} {n['peak_mb']:>8.1f} {mem_ratio:>6.2f}x  {' '.join(flags)}")
+    for key in sorted(old.keys() ^ new.keys()):
+        print(f"{key[0]:<26} {key[1]:>8} only in {'old' if key in old else 'new'} results")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="transcripts per run (e.g. 1000 ... 1000000)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (best is kept)")
+    parser.add_argument("--stages", nargs="+", default=None, help="only run these stages")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results.json"))
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown/memory growth in compare mode")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}.")
+            sys.exit(1)
+        print("\nNo regressions.")
+        return
+
+    report = run(args.sizes, args.repeat, only=args.stages, seed=args.seed)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
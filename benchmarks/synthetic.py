@@ -0,0 +1,78 @@
+"""
+Deterministic synthetic Anthropic Interviewer transcripts for offline benchmarks.
+
+Transcripts alternate "User:" / "Assistant:" turns like the real dataset, with
+interview-style sentences that contain the words the analyses look for (keyword
+families, emotion words for the semantic network) and the edge cases segmentation
+has to handle (text before the first marker, empty turns, missing text).
+
+Usage:
+    python benchmarks/synthetic.py --rows 100000 --out data/workforce.parquet
+"""
+import argparse
+import os
+import random
+
+import pandas as pd
+
+WORDS = ("the data code report team schedule results change update draft template idea "
+         "career skill future learn research project process function analysis email").split()
+
+OPENERS = ["I usually", "Honestly I", "Most days I", "At work we", "Sometimes I", "Last week I"]
+VERBS = ["automate", "generate", "draft", "revise", "update", "change", "learn", "write", "check", "review"]
+OBJECTS = ["the weekly report", "some python code", "a sql query", "the data pipeline", "an email draft",
+           "a project template", "the api function", "my research notes", "the team schedule", "a new idea"]
+FEELINGS = ["I was satisfied with the results", "I felt frustrated when it was wrong",
+            "it made a mistake but the fix was quick", "the output was not quite right",
+            "there is a better way to do it", "it is a good starting point",
+            "I worry it could replace parts of my job", "it helps me build new skills for my career"]
+QUESTIONS = ["Can you tell me more about that?", "How did that make you feel?",
+             "What happens when the output is wrong?", "How do you see your role changing in the future?",
+             "Could you walk me through a recent example?"]
+
+def user_turn(rng):
+    sentences = []
+    for _ in range(rng.randint(1, 6)):
+        sentence = f"{rng.choice(OPENERS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}"
+        if rng.random() < 0.5:
+            sentence += f", and {rng.choice(FEELINGS)}"
+        sentences.append(sentence + rng.choice([".", ".", "!", "..."]))
+    if rng.random() < 0.3:
+        sentences.append(" ".join(rng.choices(WORDS, k=rng.randint(5, 40))))
+    return " ".join(sentences)
+
+def assistant_turn(rng):
+    return f"{rng.choice(['Thanks for sharing.', 'That makes sense.', 'Interesting.'])} {rng.choice(QUESTIONS)}"
+
+def make_transcripts(n_rows, seed=42, prefix="t"):
+    """
+    n_rows transcripts (columns transcript_id, text), identical for the same seed.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        parts = ["Interview notes"] if i % 50 == 0 else []
+        for t in range(rng.randint(1, 10)):
+            parts.append("User: " + ("" if t and rng.random() < 0.02 else user_turn(rng)))
+            parts.append("Assistant: " + assistant_turn(rng))
+        text = None if i % 97 == 0 else "\n\n".join(parts)
+        rows.append({'transcript_id': f"{prefix}{i:07d}", 'text': text})
+    return pd.DataFrame(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="number of transcripts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", required=True, help="output .parquet or .jsonl file")
+    args = parser.parse_args()
+
+    df = make_transcripts(args.rows, args.seed)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    if args.out.endswith(".parquet"):
+        df.to_parquet(args.out, index=False)
+    else:
+        df.to_json(args.out, orient="records", lines=True)
+    print(f"Wrote {len(df)} transcripts to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Command line entry point, run from the repository root:
+
+    python -m src run --stages tfidf,network --split creatives
+    python -m src stages
+
+See main.cli.
+"""
+import os
+import sys
+import time
+
+start = time.perf_counter()
+# The modules in src/ import each other by bare name (as when running src/main.py)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import main
+
+main.cli(startup_import_s=time.perf_counter() - start)
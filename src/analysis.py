@@ -1,18 +1,38 @@
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
+import numpy as np
+from collections import Counter
+import instrumentation
+import keyword_matcher
+import preprocessor
+import token_store
+import turn_table
+import term_index
 # from sklearn.decomposition import LatentDirichletAllocation # Optional if needed
 import re
 
-def analyze_topics_tfidf(df_turns, top_n=20):
+# scikit-learn (and clustering/validation, which build on it) is imported inside the
+# functions that use it: the keyword-based stages import this module without paying
+# for it.
+
+@instrumentation.timed
+def analyze_topics_tfidf(df_turns, top_n=20, index=None, split=None, store=None):
     """
     Analyzes topics using TF-IDF on user turns.
+    With a term index (see term_index.py), df_turns is only added to the index under
+    `split` (if not already there) and the ranking is answered from the stored counts;
+    pass the split's token store to count from it without re-tokenizing.
     """
-    user_turns = df_turns[df_turns['role'] == 'user']['content'].tolist()
+    if index is not None:
+        term_index.update_index(index, split, df_turns, store=store)
+        return term_index.top_terms(index, [split], top_n=top_n, max_features=100)
+
+    user_turns = turn_table.user_turns(df_turns)['content'].tolist()
     
     if not user_turns:
         return {}
     
-    tfidf = TfidfVectorizer(stop_words='english', max_features=100)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    tfidf = TfidfVectorizer(analyzer=preprocessor.tfidf_tokens, max_features=100)
     tfidf_matrix = tfidf.fit_transform(user_turns)
     feature_names = tfidf.get_feature_names_out()
     
@@ -27,132 +47,248 @@ def analyze_topics_tfidf(df_turns, top_n=20):
     
     return ranking.head(top_n)
 
-def analyze_interactions(df_turns):
+# --- Mergeable TF-IDF partials (streaming mode, see streaming.py) ---
+# Pass 1 collects term statistics per chunk, pass 2 sums the TF-IDF scores per chunk
+# once the vocabulary and IDF are known. Both partials merge by simple addition and
+# together reproduce analyze_topics_tfidf exactly.
+
+def tfidf_term_stats(df_turns):
+    """
+    Pass 1 partial: number of user turns, document frequency and total count per term.
+    """
+    user_turns = turn_table.user_turns(df_turns)['content'].tolist()
+    stats = {'n_docs': len(user_turns), 'df': Counter(), 'tf': Counter()}
+    if not user_turns:
+        return stats
+    from sklearn.feature_extraction.text import CountVectorizer
+    try:
+        cv = CountVectorizer(analyzer=preprocessor.tfidf_tokens)
+        counts = cv.fit_transform(user_turns)
+    except ValueError:
+        # Chunk contains only stop words
+        return stats
+    terms = cv.get_feature_names_out()
+    stats['df'].update(dict(zip(terms, (counts > 0).sum(axis=0).A1.tolist())))
+    stats['tf'].update(dict(zip(terms, counts.sum(axis=0).A1.tolist())))
+    return stats
+
+def merge_tfidf_term_stats(a, b):
+    return {'n_docs': a['n_docs'] + b['n_docs'], 'df': a['df'] + b['df'], 'tf': a['tf'] + b['tf']}
+
+def tfidf_vocabulary(stats, max_features=100):
+    """
+    Picks the vocabulary and IDF weights from merged pass-1 stats, the same way
+    TfidfVectorizer(max_features=..., smooth_idf=True) does.
+    """
+    terms = np.array(sorted(stats['tf']))
+    if len(terms) == 0:
+        return terms, np.array([])
+    tfs = np.array([stats['tf'][t] for t in terms])
+    if max_features is not None and max_features < len(terms):
+        keep = (-tfs).argsort()[:max_features]
+        terms = np.sort(terms[keep])
+    dfs = np.array([stats['df'][t] for t in terms])
+    idf = np.log((1 + stats['n_docs']) / (1 + dfs)) + 1
+    return terms, idf
+
+def tfidf_score_sums(df_turns, vocabulary, idf):
+    """
+    Pass 2 partial: column sums of the l2-normalised TF-IDF matrix of the chunk.
+    """
+    user_turns = turn_table.user_turns(df_turns)['content'].tolist()
+    if not user_turns or len(vocabulary) == 0:
+        return np.zeros(len(vocabulary))
+    from sklearn.feature_extraction.text import CountVectorizer
+    cv = CountVectorizer(analyzer=preprocessor.tfidf_tokens, vocabulary=vocabulary)
+    weighted = cv.transform(user_turns).multiply(idf).tocsr()
+    norms = np.sqrt(weighted.multiply(weighted).sum(axis=1)).A1
+    norms[norms == 0] = 1
+    weighted = weighted.multiply(1 / norms[:, None])
+    return np.asarray(weighted.sum(axis=0)).ravel()
+
+def rank_tfidf_terms(vocabulary, sums, top_n=20):
+    """
+    Turns summed scores into the same ranking table as analyze_topics_tfidf.
+    """
+    ranking = pd.DataFrame({'term': vocabulary, 'rank': sums})
+    ranking = ranking.sort_values('rank', ascending=False)
+    return ranking.head(top_n)
+
+@instrumentation.timed
+def compute_keyword_hits(df_turns, families=None):
+    """
+    Counts hits for all keyword families over the USER turns in one go: the column is
+    lowercased once and matched with combined-regex Arrow kernels (see keyword_matcher.py).
+    The classifiers below are views over this matrix; compute it once and pass it as
+    hits= to avoid re-scanning the corpus.
+
+    Returns:
+        pd.DataFrame: one row per user turn (df_turns index), one column per family.
+    """
+    user_df = turn_table.user_turns(df_turns)
+    return keyword_matcher.family_hits(user_df['content'], families)
+
+@instrumentation.timed
+def analyze_interactions(df_turns, hits=None):
     """
     Classifies interactions based on keywords/patterns in USER turns.
+    A turn counts for the first matching family: delegation, collaboration, foundation.
     """
-    # Define keywords/patterns
-    delegation_keywords = ['automate', 'write this code', 'generate', 'draft']
-    collaboration_keywords = ['revise', 'change', 'update', 'not quite', 'better way']
-    foundation_keywords = ['starting point', 'template', 'idea', 'inspiration']
+    if hits is None:
+        hits = compute_keyword_hits(df_turns)
+    
+    is_delegation = hits['delegation'] > 0
+    is_collaboration = ~is_delegation & (hits['collaboration'] > 0)
+    is_foundation = ~is_delegation & ~is_collaboration & (hits['foundation'] > 0)
     
     results = {
-        'delegation': 0,
-        'collaboration': 0,
-        'foundation': 0,
-        'total_user_turns': 0
+        'delegation': int(is_delegation.sum()),
+        'collaboration': int(is_collaboration.sum()),
+        'foundation': int(is_foundation.sum()),
+        'total_user_turns': len(hits)
     }
-    
-    user_df = df_turns[df_turns['role'] == 'user']
-    results['total_user_turns'] = len(user_df)
-    
-    for text in user_df['content']:
-        text_lower = text.lower()
-        
-        if any(k in text_lower for k in delegation_keywords):
-            results['delegation'] += 1
-        elif any(k in text_lower for k in collaboration_keywords):
-            results['collaboration'] += 1
-        elif any(k in text_lower for k in foundation_keywords):
-            results['foundation'] += 1
-            
     return results
 
-def analyze_trust_issues(df_turns):
+@instrumentation.timed
+def analyze_trust_issues(df_turns, hits=None):
     """
     Simple keyword search for trust/error issues.
     """
-    error_keywords = ['wrong', 'incorrect', 'hallucinat', 'error', 'mistake', 'false']
-    
-    count = 0
-    user_df = df_turns[df_turns['role'] == 'user']
+    if hits is None:
+        hits = compute_keyword_hits(df_turns)
     
-    for text in user_df['content']:
-        if any(k in text.lower() for k in error_keywords):
-            count += 1
-            
-    return count, len(user_df)
+    count = int((hits['error'] > 0).sum())
+    return count, len(hits)
 
-def analyze_future_outlook(df_turns):
+@instrumentation.timed
+def analyze_future_outlook(df_turns, hits=None):
     """
     Look for career/skill related discussion.
     """
-    keywords = ['career', 'skill', 'future', 'replace', 'job', 'learn']
-    
-    mentions = []
-    user_df = df_turns[df_turns['role'] == 'user']
+    if hits is None:
+        hits = compute_keyword_hits(df_turns)
     
-    for text in user_df['content']:
-        if any(k in text.lower() for k in keywords):
-            mentions.append(text[:200] + "...") # Store snippet
-            
+    user_df = turn_table.user_turns(df_turns)
+    texts = user_df['content'][(hits['future'] > 0).to_numpy()]
+    mentions = [text[:200] + "..." for text in texts] # Store snippet
     return mentions
 
-import networkx as nx
-from collections import Counter
-import itertools
-from sklearn.feature_extraction.text import TfidfVectorizer
-import nltk
-from nltk.corpus import stopwords
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA
-import numpy as np
-import re # Added import re
-
-# Ensure nltk is ready
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
-
 # analyze_semantic_network has been moved to semantic_analysis.py
 
-def analyze_maturity_clusters(df_turns, n_clusters=3):
+FEATURE_NAMES = ["Avg Length", "Complexity", "Refinement", "Tech Score"]
+
+@instrumentation.timed
+def extract_user_features(df_turns, hits=None, store=None):
     """
-    Segments users based on their interaction patterns.
+    Builds one feature row per transcript (user) from its user turns, using grouped
+    column operations instead of a Python loop over users:
+        Avg Length  - mean character length of the user's turns
+        Complexity  - unique words / total words (token store ids, see token_store.py;
+                      built from df_turns if no store is passed)
+        Refinement  - 'refinement' keyword hits (change, wrong, ...)
+        Tech Score  - 'tech' keyword hits (code, api, ...)
+
+    Rows of different chunks can simply be concatenated (streaming mode),
+    as long as every transcript is inside a single chunk.
+
+    Returns:
+        (list, np.ndarray): user_ids (sorted) and the (n_users, 4) feature matrix.
     """
+    user_rows = turn_table.role_rows(df_turns, 'user')
+    user_df = df_turns.iloc[user_rows]
+    
     # Group by Transcript ID (User)
-    user_groups = df_turns[df_turns['role'] == 'user'].groupby('transcript_id')
+    user_codes, user_ids = pd.factorize(user_df['transcript_id'], sort=True)
+    valid = user_codes >= 0
+    user_codes = user_codes[valid]
+    n_users = len(user_ids)
     
-    user_features = []
-    user_ids = []
+    # Feature 1: Verbosity (Avg length of turn), from the lengths stored at segmentation
+    if 'length' in user_df.columns:
+        lengths = user_df['length'].to_numpy()[valid]
+    else:
+        lengths = user_df['content'].astype(str)[valid].str.len().to_numpy()
+    turn_counts = np.bincount(user_codes, minlength=n_users)
+    total_len = np.bincount(user_codes, weights=lengths, minlength=n_users)
+    avg_len = total_len / np.maximum(turn_counts, 1)
     
-    for uid, group in user_groups:
-        full_text = " ".join(group['content'].astype(str))
-        
-        # Feature 1: Verbosity (Avg length of turn)
-        avg_len = group['content'].str.len().mean()
-        
-        # Feature 2: Complexity (Unique words / Total words)
-        words = full_text.split()
-        complexity = len(set(words)) / len(words) if words else 0
-        
-        # Feature 3: Review/Refinement (Mentions of 'change', 'wrong')
-        refinement_keywords = ['change', 'wrong', 'mistake', 'revise', 'no', 'update']
-        refinement_score = sum(full_text.lower().count(k) for k in refinement_keywords)
-        
-        # Feature 4: Technical Terms (proxy for technical role)
-        tech_keywords = ['code', 'python', 'sql', 'data', 'function', 'api']
-        tech_score = sum(full_text.lower().count(k) for k in tech_keywords)
-        
-        user_features.append([avg_len, complexity, refinement_score, tech_score])
-        user_ids.append(uid)
-        
-    if not user_features:
-        return None, None, None, None
-        
-    X = np.array(user_features)
+    # Feature 2: Complexity (Unique words / Total words), from (user, term id) pairs
+    if store is None:
+        store = token_store.build_store(df_turns)
+    word_codes, word_counts = token_store.row_token_ids(store, user_rows[valid])
+    word_users = np.repeat(user_codes, word_counts).astype(np.int64)
+    word_codes = word_codes.astype(np.int64)
+    vocab_size = max(len(store['vocabulary']), 1)
+    total_words = np.bincount(word_users, minlength=n_users)
+    unique_pairs = np.unique(word_users * vocab_size + word_codes)
+    unique_words = np.bincount(unique_pairs // vocab_size, minlength=n_users)
+    complexity = np.divide(unique_words, total_words, out=np.zeros(n_users), where=total_words > 0)
+    
+    # Features 3/4: Refinement + Technical Terms, from the shared keyword hit matrix
+    if hits is None:
+        hits = compute_keyword_hits(df_turns)
+    refinement_score = np.bincount(user_codes, weights=hits['refinement'].to_numpy()[valid], minlength=n_users)
+    tech_score = np.bincount(user_codes, weights=hits['tech'].to_numpy()[valid], minlength=n_users)
     
-    # Clustering
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    labels = kmeans.fit_predict(X)
+    X = np.column_stack([avg_len, complexity, refinement_score, tech_score])
+    return list(user_ids), X
+
+@instrumentation.timed
+def analyze_maturity_clusters(df_turns, n_clusters=3, hits=None, max_k=8, store=None):
+    """
+    Segments users based on their interaction patterns.
+    With n_clusters='auto', k=2..max_k are swept on the same feature matrix
+    (clustering.sweep_k) and the sweep's fit of the k with the best silhouette is
+    used as is (saved, with the sweep's metrics); the sweep table is returned in the
+    metrics dict under 'k_sweep'.
+    """
+    import clustering
+    user_ids, X = extract_user_features(df_turns, hits=hits, store=store)
+    if n_clusters != 'auto':
+        return cluster_user_features(user_ids, X, n_clusters=n_clusters)
+    if len(X) < 3:
+        return None, None, None, None
+    sweep, fits = clustering.sweep_k(X, range(2, max_k + 1))
+    fit = fits[clustering.pick_k(sweep)]
+    model, coords = clustering.model_from_fit(X, FEATURE_NAMES, fit['centers'])
+    cluster_data, centroids, feature_names, metrics = clustered_users(user_ids, X, model, fit['labels'], coords,
+                                                                      dict(fit['metrics']))
+    metrics['k_sweep'] = sweep
+    return cluster_data, centroids, feature_names, metrics
+
+@instrumentation.timed
+def cluster_user_features(user_ids, X, n_clusters=3, engine=None, scale=False, model_path=None):
+    """
+    Clusters precomputed user feature rows (see extract_user_features).
+    engine: 'kmeans' or 'minibatch' (default clustering.ENGINE, see clustering.py).
+    The fitted model is saved to model_path (default clustering.MODEL_PATH) so that
+    new users can be assigned with assign_clusters.
+    Returns (cluster_data, centroids, feature_names, validity metrics dict from
+    validation.validate_clusters).
+    """
+    if len(X) == 0:
+        return None, None, None, None
+    import clustering
+    import validation
     
-    # Validation: Silhouette Score
-    score = silhouette_score(X, labels)
+    # Clustering + Dimensionality Reduction for Visualization (2D)
+    model, labels, coords = clustering.fit_model(X, FEATURE_NAMES, n_clusters=n_clusters, engine=engine, scale=scale)
     
-    # Dimensionality Reduction for Visualization (2D)
-    pca = PCA(n_components=2)
-    coords = pca.fit_transform(X)
+    # Validation: sampled Silhouette Score (+ CI), Davies-Bouldin, Calinski-Harabasz,
+    # on the (scaled) features the model was fitted on
+    metrics = validation.validate_clusters(clustering.scale_features(model, X), labels)
+    return clustered_users(user_ids, X, model, labels, coords, metrics, model_path)
+
+def clustered_users(user_ids, X, model, labels, coords, metrics, model_path=None):
+    """
+    Saves a fitted model (see cluster_user_features) and returns its
+    (cluster_data, centroids, feature_names, metrics).
+    """
+    import clustering
+    try:
+        clustering.save_model(model, model_path)
+    except OSError as e:
+        print(f"Could not save clustering model: {e}")
     
     cluster_data = pd.DataFrame({
         'transcript_id': user_ids,
@@ -165,4 +301,137 @@ def analyze_maturity_clusters(df_turns, n_clusters=3):
         'tech_score': X[:, 3]
     })
     
-    return cluster_data, kmeans.cluster_centers_, ["Avg Length", "Complexity", "Refinement", "Tech Score"], score
+    return cluster_data, clustering.centroids(model), FEATURE_NAMES, metrics
+
+@instrumentation.timed
+def cluster_feature_chunks(id_chunks, feature_chunks, n_clusters=3, scale=False, model_path=None, seed=42):
+    """
+    Out-of-core cluster_user_features (minibatch engine) for feature rows that arrive
+    in chunks, e.g. from streaming mode: the model is fitted with
+    clustering.fit_model_chunks and every chunk is assigned and projected on its own,
+    so the rows are never stacked. The validity metrics are estimated on a random
+    sample of validation.SAMPLE_SIZE users.
+
+    Args:
+        id_chunks (list): user ids of every chunk (see extract_user_features).
+        feature_chunks (list): the matching feature matrices.
+    """
+    n = sum(len(X) for X in feature_chunks)
+    if n == 0:
+        return None, None, None, None
+    import clustering
+    import validation
+
+    model = clustering.fit_model_chunks(lambda: iter(feature_chunks), FEATURE_NAMES, n_clusters, scale=scale)
+    try:
+        clustering.save_model(model, model_path)
+    except OSError as e:
+        print(f"Could not save clustering model: {e}")
+
+    sample = np.sort(np.random.default_rng(seed).choice(n, size=min(n, validation.SAMPLE_SIZE), replace=False))
+    parts, sample_X, sample_labels = [], [], []
+    offset = 0
+    for user_ids, X in zip(id_chunks, feature_chunks):
+        labels = clustering.predict(model, X)
+        coords = clustering.project(model, X).reshape(-1, 2)
+        parts.append(pd.DataFrame({
+            'transcript_id': list(user_ids),
+            'cluster': labels,
+            'x': coords[:, 0],
+            'y': coords[:, 1],
+            'avg_len': X[:, 0],
+            'complexity': X[:, 1],
+            'refinement': X[:, 2],
+            'tech_score': X[:, 3]
+        }))
+        rows = sample[(sample >= offset) & (sample < offset + len(X))] - offset
+        sample_X.append(X[rows])
+        sample_labels.append(labels[rows])
+        offset += len(X)
+    metrics = validation.validate_clusters(clustering.scale_features(model, np.vstack(sample_X)),
+                                           np.concatenate(sample_labels), population=n)
+    return pd.concat(parts, ignore_index=True), clustering.centroids(model), FEATURE_NAMES, metrics
+
+# Corrections in a transcript's turns (any role), counted for the deep-dive samples
+REFINEMENT_PATTERN = 'no|change|wrong|better'
+
+@instrumentation.timed
+def cluster_profiles(df_turns, cluster_data, n_samples=5, seed=42):
+    """
+    Per-cluster statistics from one grouped aggregation over the cluster assignments
+    (cluster_data from analyze_maturity_clusters), plus representative transcripts.
+
+    Args:
+        n_samples (int): Transcripts sampled per cluster (fewer if the cluster is smaller).
+        seed (int): Seed of the sampling RNG, so the same transcripts come back every run.
+
+    Returns:
+        (profiles, samples): DataFrames with one row per cluster (users, avg_turns,
+        avg_len, complexity, refinement, tech_score: means over the cluster's users)
+        and one row per sampled transcript (cluster, transcript_id, turns,
+        refinements, intent: its first user message).
+    """
+    # Turns per transcript, from the transcript index (see turn_table.py), built once
+    index = turn_table.transcript_index(df_turns)
+    turn_counts = turn_table.transcript_reduce(df_turns, None, how='count', index=index)
+    users = cluster_data.assign(turns=cluster_data['transcript_id'].map(turn_counts).fillna(0).to_numpy())
+    profiles = users.groupby('cluster').agg(
+        users=('transcript_id', 'size'), avg_turns=('turns', 'mean'), avg_len=('avg_len', 'mean'),
+        complexity=('complexity', 'mean'), refinement=('refinement', 'mean'), tech_score=('tech_score', 'mean'))
+
+    rng = np.random.default_rng(seed)
+    picked = []
+    for cluster, group in users.sort_values('transcript_id', kind='stable').groupby('cluster', sort=True):
+        rows = rng.choice(len(group), size=min(n_samples, len(group)), replace=False)
+        picked.append(group.iloc[rows][['cluster', 'transcript_id', 'turns']])
+    samples = pd.concat(picked, ignore_index=True) if picked else pd.DataFrame(
+        columns=['cluster', 'transcript_id', 'turns'])
+
+    # Each sampled transcript's turns, by hash lookup in the transcript index
+    refinements, intents = [], []
+    for transcript_id in samples['transcript_id']:
+        turns = turn_table.get_transcript(df_turns, transcript_id, index=index)
+        refinements.append(int(turns['content'].str.contains(REFINEMENT_PATTERN, case=False).sum()))
+        user_content = turns['content'].iloc[turn_table.role_rows(turns, 'user')].dropna()
+        intents.append(user_content.iloc[0] if len(user_content) else np.nan)
+    samples['refinements'] = np.array(refinements, dtype=int)
+    samples['intent'] = np.array(intents, dtype=object)
+    samples['turns'] = samples['turns'].astype(int)
+    return profiles, samples
+
+def persona_stats(profiles, cluster=1):
+    """
+    Figures of the persona card for one cluster: its average prompt length and
+    refinement hits per user against all users / the other clusters.
+    Returns None if the cluster does not exist.
+    """
+    if profiles is None or cluster not in profiles.index:
+        return None
+    row, others = profiles.loc[cluster], profiles.drop(index=cluster)
+    weight = profiles['users']
+    return {
+        'cluster': int(cluster),
+        'users': int(row['users']),
+        'avg_len': float(row['avg_len']),
+        'avg_len_all': float((profiles['avg_len'] * weight).sum() / weight.sum()),
+        'refinement': float(row['refinement']),
+        'refinement_others': float((others['refinement'] * others['users']).sum() / max(others['users'].sum(), 1)),
+    }
+
+def assign_clusters(df_turns, model=None, hits=None):
+    """
+    Assigns the users of df_turns to the clusters of a saved model (no refit).
+    Returns a DataFrame with transcript_id, cluster, x, y (None if no model is saved).
+    """
+    import clustering
+    model = model or clustering.load_model()
+    if model is None:
+        return None
+    user_ids, X = extract_user_features(df_turns, hits=hits)
+    coords = clustering.project(model, X).reshape(-1, 2)
+    return pd.DataFrame({
+        'transcript_id': user_ids,
+        'cluster': clustering.predict(model, X) if len(X) else np.array([], dtype=int),
+        'x': coords[:, 0],
+        'y': coords[:, 1],
+    })
@@ -0,0 +1,293 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, MiniBatchKMeans, kmeans_plusplus
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+import figure_render
+import task_graph
+import validation
+
+# Clustering engines for the maturity clusters.
+#   kmeans    - full-batch KMeans + PCA over the whole feature matrix (the original method)
+#   minibatch - MiniBatchKMeans + IncrementalPCA fitted chunk by chunk with partial_fit,
+#               so the feature rows can come from a stream and never be stacked
+# A fitted model is a dict of plain arrays (scaler, centroids, PCA projection). It is
+# saved as .npz, and new users are assigned with predict() instead of a refit.
+ENGINES = ('kmeans', 'minibatch')
+ENGINE = os.environ.get("CLUSTER_ENGINE", "kmeans")
+MODEL_PATH = os.environ.get("CLUSTER_MODEL_PATH", os.path.join("cache", "cluster_model.npz"))
+
+# Rows per partial_fit call of the minibatch engine
+BATCH_SIZE = 4096
+
+def make_model(engine, feature_names, centers, pca_components, pca_mean, scaler_mean=None, scaler_scale=None):
+    n_features = centers.shape[1]
+    return {
+        'engine': engine,
+        'feature_names': list(feature_names),
+        # Identity scaling when the features were clustered unscaled
+        'scaler_mean': np.zeros(n_features) if scaler_mean is None else np.asarray(scaler_mean, dtype=float),
+        'scaler_scale': np.ones(n_features) if scaler_scale is None else np.asarray(scaler_scale, dtype=float),
+        'centers': np.asarray(centers, dtype=float),
+        'pca_components': np.asarray(pca_components, dtype=float),
+        'pca_mean': np.asarray(pca_mean, dtype=float),
+    }
+
+def fit_model(X, feature_names, n_clusters=3, engine=None, scale=False):
+    """
+    Fits a clustering model on an in-memory feature matrix.
+
+    Returns:
+        tuple: (model, labels, coords) with coords the 2D PCA projection of X.
+    """
+    engine = engine or ENGINE
+    if engine == 'minibatch':
+        make_chunks = lambda: (X[i:i + BATCH_SIZE] for i in range(0, len(X), BATCH_SIZE))
+        model = fit_model_chunks(make_chunks, feature_names, n_clusters, scale=scale)
+        return model, predict(model, X), project(model, X)
+    if engine != 'kmeans':
+        raise ValueError(f"Unknown clustering engine '{engine}' (expected one of {ENGINES})")
+
+    scaler = StandardScaler().fit(X) if scale else None
+    Xs = scaler.transform(X) if scale else X
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    labels = kmeans.fit_predict(Xs)
+    pca = PCA(n_components=2)
+    coords = pca.fit_transform(Xs)
+    model = make_model(engine, feature_names, kmeans.cluster_centers_, pca.components_, pca.mean_,
+                       scaler.mean_ if scale else None, scaler.scale_ if scale else None)
+    return model, labels, coords
+
+def rebatch(chunks, batch_size):
+    """
+    Regroups feature chunks of any size into batches of batch_size rows (partial_fit
+    needs a minimum number of rows per call); the last batch may be smaller. The
+    batches, and thus the fit, do not depend on how the rows were chunked.
+    """
+    buffer, n_rows = [], 0
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        buffer.append(chunk)
+        n_rows += len(chunk)
+        if n_rows >= batch_size:
+            rows = np.vstack(buffer)
+            n_full = len(rows) - len(rows) % batch_size
+            for start in range(0, n_full, batch_size):
+                yield rows[start:start + batch_size]
+            buffer = [rows[n_full:]] if n_full < len(rows) else []
+            n_rows = len(rows) - n_full
+    if buffer:
+        yield np.vstack(buffer)
+
+def fit_model_chunks(make_chunks, feature_names, n_clusters=3, scale=False, batch_size=None):
+    """
+    Fits the minibatch engine out of core.
+
+    Args:
+        make_chunks (callable): Returns a fresh iterable of feature chunks (arrays with
+            one row per user), e.g. re-reading a stream. It is called twice when
+            scale=True (scaler pass, then clustering pass), otherwise once.
+    """
+    batch_size = max(batch_size or BATCH_SIZE, n_clusters, 2)
+    scaler = None
+    if scale:
+        scaler = StandardScaler()
+        for batch in rebatch(make_chunks(), batch_size):
+            scaler.partial_fit(batch)
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=batch_size)
+    pca = IncrementalPCA(n_components=2)
+    pending = None
+    for batch in rebatch(make_chunks(), batch_size):
+        if scaler is not None:
+            batch = scaler.transform(batch)
+        # A short tail batch is folded into the previous one (partial_fit minimums)
+        if pending is not None and len(batch) < batch_size:
+            batch = np.vstack([pending, batch])
+        elif pending is not None:
+            kmeans.partial_fit(pending)
+            pca.partial_fit(pending)
+        pending = batch
+    if pending is None:
+        raise ValueError("No feature rows to cluster")
+    if len(pending) < max(n_clusters, 2):
+        raise ValueError(f"Need at least {max(n_clusters, 2)} users to cluster, got {len(pending)}")
+    kmeans.partial_fit(pending)
+    pca.partial_fit(pending)
+
+    return make_model('minibatch', feature_names, kmeans.cluster_centers_, pca.components_, pca.mean_,
+                      scaler.mean_ if scaler else None, scaler.scale_ if scaler else None)
+
+def scale_features(model, X):
+    return (np.asarray(X, dtype=float) - model['scaler_mean']) / model['scaler_scale']
+
+def predict(model, X):
+    """
+    Cluster of every feature row (nearest centroid).
+    """
+    Xs = scale_features(model, X)
+    distances = ((Xs[:, None, :] - model['centers'][None, :, :]) ** 2).sum(axis=2)
+    return distances.argmin(axis=1)
+
+def project(model, X):
+    """
+    2D PCA coordinates of feature rows.
+    """
+    return (scale_features(model, X) - model['pca_mean']) @ model['pca_components'].T
+
+def centroids(model):
+    """
+    Cluster centers in the original feature units.
+    """
+    return model['centers'] * model['scaler_scale'] + model['scaler_mean']
+
+def save_model(model, path=None):
+    path = path or MODEL_PATH
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, **{k: np.asarray(v) for k, v in model.items()})
+    os.replace(tmp_path, path)
+    return path
+
+def load_model(path=None):
+    """
+    Loads a saved model, or returns None if there is none.
+    """
+    path = path or MODEL_PATH
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        model = {k: data[k] for k in data.files}
+    model['engine'] = str(model['engine'])
+    model['feature_names'] = [str(f) for f in model['feature_names']]
+    return model
+
+def fit_k(X, k, init, engine='kmeans', sample_size=validation.SAMPLE_SIZE):
+    """
+    One k of a sweep: fits from the given initial centers and scores the labels.
+    """
+    if engine == 'minibatch':
+        model = MiniBatchKMeans(n_clusters=k, init=init, n_init=1, random_state=42, batch_size=BATCH_SIZE)
+    else:
+        model = KMeans(n_clusters=k, init=init, n_init=1, random_state=42)
+    labels = model.fit_predict(X)
+    metrics = validation.validate_clusters(X, labels, sample_size=sample_size)
+    row = {
+        'k': k,
+        'inertia': float(model.inertia_),
+        'silhouette': metrics['silhouette'],
+        'silhouette_ci_low': metrics['silhouette_ci'][0],
+        'silhouette_ci_high': metrics['silhouette_ci'][1],
+        'davies_bouldin': metrics['davies_bouldin'],
+        'calinski_harabasz': metrics['calinski_harabasz'],
+    }
+    return row, model.cluster_centers_, labels, metrics
+
+def sweep_k(X, k_values=range(2, 9), engine=None, max_workers=None, sample_size=validation.SAMPLE_SIZE):
+    """
+    Fits and scores every k in k_values on the same feature matrix, in parallel processes.
+
+    Every fit is warm-started from one shared k-means++ seeding for the largest k:
+    k-means++ picks centers one after the other, so its first k centers are a
+    k-means++ seeding for k. The seeding is computed once, and the fits stay
+    independent of each other.
+
+    Returns:
+        tuple: (sweep, fits) - sweep is a DataFrame with one row per k (inertia for
+            the elbow, sampled validity metrics), fits is {k: {'centers', 'labels',
+            'metrics'}} of the fitted models (see model_from_fit), so the chosen k
+            does not have to be fitted again.
+    """
+    engine = engine or ENGINE
+    k_values = sorted(k for k in set(k_values) if 2 <= k < len(X))
+    if not k_values:
+        return pd.DataFrame(columns=['k', 'inertia', 'silhouette', 'silhouette_ci_low', 'silhouette_ci_high',
+                                     'davies_bouldin', 'calinski_harabasz']), {}
+    X = np.asarray(X, dtype=float)
+    seeds, _ = kmeans_plusplus(X, n_clusters=max(k_values), random_state=42)
+    max_workers = task_graph.pool_size(max_workers)
+
+    jobs = [(X, k, seeds[:k], engine, sample_size) for k in k_values]
+    if max_workers <= 1:
+        results = [fit_k(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+            results = list(pool.map(fit_k, *zip(*jobs)))
+    fits = {k: {'centers': centers, 'labels': labels, 'metrics': metrics}
+            for k, (_, centers, labels, metrics) in zip(k_values, results)}
+    return pd.DataFrame([row for row, _, _, _ in results]), fits
+
+def model_from_fit(X, feature_names, centers, engine=None):
+    """
+    Model for centers fitted on the unscaled rows X (e.g. a sweep_k fit), with the
+    2D PCA projection fitted on X.
+
+    Returns:
+        tuple: (model, coords) with coords the 2D PCA projection of X.
+    """
+    pca = PCA(n_components=2)
+    coords = pca.fit_transform(X)
+    return make_model(engine or ENGINE, feature_names, centers, pca.components_, pca.mean_), coords
+
+def pick_k(sweep):
+    """
+    k with the highest silhouette; ties go to the smaller k.
+    """
+    best = sweep.sort_values(['silhouette', 'k'], ascending=[False, True], kind='stable')
+    return int(best['k'].iloc[0])
+
+def draw_k_sweep(data, style):
+    """
+    Elbow (inertia) and silhouette (with CI) per k, side by side (figure kind
+    'k_sweep', see figure_render.py). data: {'sweep': DataFrame, 'chosen_k': int or None}
+    """
+    import matplotlib.pyplot as plt
+    sweep, chosen_k = data['sweep'], data.get('chosen_k')
+    fig, (ax_elbow, ax_sil) = plt.subplots(1, 2, figsize=(12, 4.5))
+    ax_elbow.plot(sweep['k'], sweep['inertia'], marker='o')
+    ax_elbow.set_title("Elbow: Inertia per k")
+    ax_elbow.set_xlabel("k")
+    ax_elbow.set_ylabel("Inertia")
+
+    ax_sil.errorbar(sweep['k'], sweep['silhouette'],
+                    yerr=[sweep['silhouette'] - sweep['silhouette_ci_low'], sweep['silhouette_ci_high'] - sweep['silhouette']],
+                    marker='o', capsize=4)
+    ax_sil.set_title("Silhouette per k")
+    ax_sil.set_xlabel("k")
+    ax_sil.set_ylabel("Silhouette Score")
+    if chosen_k is not None:
+        for ax in (ax_elbow, ax_sil):
+            ax.axvline(chosen_k, color='gray', linestyle='--', alpha=0.7)
+
+    fig.tight_layout()
+    return fig
+
+def k_sweep_figure(sweep, output_file="k_sweep.png", chosen_k=None):
+    return figure_render.figure('k_sweep', output_file, {'sweep': sweep, 'chosen_k': chosen_k})
+
+def plot_k_sweep(sweep, output_file="k_sweep.png", chosen_k=None):
+    """
+    Elbow and silhouette plot of a sweep_k result (see draw_k_sweep).
+    """
+    return figure_render.render_figure(k_sweep_figure(sweep, output_file, chosen_k))
+
+def draw_clusters(data, style):
+    """
+    Scatter plot of the users on the first two PCA components, colored by cluster
+    (figure kind 'maturity_clusters'). data: {'points': DataFrame (x, y, cluster)}
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(10, 6))
+    sns.scatterplot(data=data['points'], x='x', y='y', hue='cluster', palette='viridis', style='cluster', s=100)
+    plt.title("AI Maturity Clusters (User Segmentation)")
+    plt.xlabel("PCA Component 1")
+    plt.ylabel("PCA Component 2")
+    plt.legend(title='Cluster')
+    return fig
+
+def clusters_figure(cluster_df, output_file="maturity_clusters.png"):
+    return figure_render.figure('maturity_clusters', output_file, {'points': cluster_df[['x', 'y', 'cluster']]})
@@ -1,73 +1,208 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import data_loader
-import preprocessor
-import analysis
+import figure_render
+import instrumentation
+import task_graph
+import turn_cache
+import term_index
+import token_store
 
-def run_comparative_analysis():
+DEFAULT_SPLITS = {
+    'Workforce': 'workforce',
+    'Creatives': 'creatives',
+    'Scientists': 'scientists'
+}
+
+# Per-split pipeline: loading (cache read or download) runs on threads, segmentation
+# and term counting on processes, and only the merge into the shared term index
+# happens here. Wall time grows with the slowest split, not with the number of splits.
+
+def resolve_source(source):
+    """
+    A split name or a local split file (e.g. data/lawyers.parquet) -> (split, data_dir).
+    """
+    if os.path.isfile(source):
+        name, ext = os.path.splitext(os.path.basename(source))
+        if ext in data_loader.LOCAL_EXTENSIONS:
+            return name, os.path.dirname(source) or "."
+    return source, None
+
+def fetch_split(split, data_dir=None):
+    """
+    I/O part of the per-split pipeline: ('cached', turn cache path) on warm runs,
+    otherwise ('raw', raw DataFrame) or None if the split cannot be loaded.
+    """
+    path = turn_cache.cache_path(split, data_dir)
+    if os.path.exists(path):
+        print(f"Using cached turns for split '{split}': {path}")
+        return 'cached', path
+    df = data_loader.load_data(split=split, data_dir=data_dir)
+    if df is None:
+        return None
+    return 'raw', df
+
+def count_split(split, data_dir, kind, payload, known_transcripts):
+    """
+    CPU part of the per-split pipeline (runs in a worker process): segments a raw split
+    (and caches its turns), then counts the terms of the user turns not indexed yet
+    from the split's token store.
+    """
+    if kind == 'cached':
+        df_turns = turn_cache.read_turns(payload)
+    elif kind == 'raw':
+        df_turns = turn_cache.segment_and_cache(payload, split, data_dir)
+    else:
+        df_turns = payload
+    if df_turns is None or df_turns.empty:
+        return None
+    rows, transcripts = term_index.new_user_rows(None, split, df_turns, known_transcripts)
+    if len(rows) == 0:
+        return {'counts': None, 'terms': [], 'transcripts': transcripts}
+    counts, terms = term_index.count_terms(token_store.get_store(split, df_turns, data_dir), rows)
+    return {'counts': counts, 'terms': terms, 'transcripts': transcripts}
+
+@instrumentation.timed
+def run_comparative_analysis(tfidf_index=None, splits=None, preloaded=None, max_workers=None):
     """
     Loads data for workforce, creative (creatives), and scientific (scientists) splits,
     calculates top TF-IDF terms for each, and generates a grouped bar chart.
+    All splits go into one term index (see term_index.py) and share one IDF, so scores
+    are comparable across professions. Pass the index used by main() to reuse the
+    splits it already indexed.
+
+    Args:
+        splits (list/dict): Split names or local split files to compare, or
+            {label: split or file} (default: DEFAULT_SPLITS).
+        preloaded (dict): {split: df_turns} already held by the caller; these are
+            not loaded again.
+        max_workers (int): Processes for segmentation/counting (default:
+            task_graph.pool_size(), 1 = counted in this process; the splits
+            are fetched on threads either way).
     Returns:
         pd.DataFrame: Combined top terms data.
         str: Path to the generated plot.
     """
-    splits = {
-        'Workforce': 'workforce',
-        'Creatives': 'creatives',
-        'Scientists': 'scientists'
-    }
+    if splits is None:
+        splits = DEFAULT_SPLITS
+    if not isinstance(splits, dict):
+        splits = {resolve_source(s)[0].capitalize(): s for s in splits}
+    preloaded = preloaded or {}
+    max_workers = task_graph.pool_size(max_workers)
     
-    combined_data = []
+    if tfidf_index is None:
+        tfidf_index = term_index.open_index()
 
     print("\n--- Starting Comparative Analysis ---")
     
-    for label, split_name in splits.items():
-        print(f"Processing {label} ({split_name})...")
-        df = data_loader.load_data(split=split_name)
-        
-        if df is None or df.empty:
+    sources = {label: resolve_source(source) for label, source in splits.items()}
+    # Splits whose data changed since they were indexed are counted from scratch
+    source_keys = {label: turn_cache.cache_key(*src) for label, src in sources.items()}
+    for label, (split_name, _) in sources.items():
+        term_index.sync_split(tfidf_index, split_name, source_keys[label])
+    
+    def known(split_name):
+        entry = tfidf_index['splits'].get(split_name)
+        return set(entry['transcripts']) if entry else set()
+    
+    # Splits the caller already holds are counted right here; the others are
+    # fetched on threads and handed to the process pool as soon as they arrive
+    batches = {}
+    for label, (split_name, data_dir) in sources.items():
+        if split_name in preloaded:
+            print(f"Processing {label} ({split_name}, preloaded)...")
+            batches[label] = count_split(split_name, data_dir, 'turns', preloaded[split_name], known(split_name))
+    to_fetch = {label: src for label, src in sources.items() if label not in batches}
+    
+    if to_fetch:
+        # Fetching is I/O and always runs on threads (they do not count against the
+        # process share); with a single process the splits are counted here as they arrive
+        cpu_pool = ProcessPoolExecutor(max_workers=min(max_workers, len(to_fetch))) if max_workers > 1 else None
+        try:
+            with ThreadPoolExecutor(max_workers=len(to_fetch)) as io_pool:
+                fetches = {io_pool.submit(fetch_split, *src): label for label, src in to_fetch.items()}
+                counting = {}
+                for future in as_completed(fetches):
+                    label = fetches[future]
+                    split_name, data_dir = to_fetch[label]
+                    print(f"Processing {label} ({split_name})...")
+                    fetched = future.result()
+                    if fetched is None:
+                        batches[label] = None
+                    elif cpu_pool is None:
+                        batches[label] = count_split(split_name, data_dir, *fetched, known(split_name))
+                    else:
+                        counting[label] = cpu_pool.submit(count_split, split_name, data_dir, *fetched, known(split_name))
+                for label, future in counting.items():
+                    batches[label] = future.result()
+        finally:
+            if cpu_pool is not None:
+                cpu_pool.shutdown()
+    
+    # Merge in the order the splits were given, so the index layout is deterministic
+    available = {}
+    for label, (split_name, _) in sources.items():
+        batch = batches.get(label)
+        if batch is None:
             print(f"Skipping {label}: Data not found.")
             continue
-            
-        # Segment
-        df_turns = preprocessor.process_dataframe(df)
+        if batch['counts'] is not None:
+            term_index.add_counts(tfidf_index, split_name, batch['counts'], batch['terms'], batch['transcripts'],
+                                  save=False, source=source_keys[label])
+        available[label] = split_name
+    if available:
+        term_index.save_index(tfidf_index)
         
+    if not available:
+        return None, None
+    
+    # One IDF over every profession, so the scores below can be compared
+    idf_splits = list(available.values())
+    
+    combined_data = []
+    for label, split_name in available.items():
         # Get Top Terms
-        top_terms = analysis.analyze_topics_tfidf(df_turns, top_n=10)
+        top_terms = term_index.top_terms(tfidf_index, [split_name], top_n=10, idf_splits=idf_splits)
         
         # Add to list
         top_terms['Category'] = label
         combined_data.append(top_terms)
         
-    if not combined_data:
-        return None, None
-        
     all_terms = pd.concat(combined_data)
     
     # Visualization: Grouped Bar Chart
-    # We want to compare the rank or score of specific terms across categories.
-    # However, different categories have different top terms.
-    # We'll take the UNION of the top 5 terms from each category and plot their scores across all categories.
-    
+    # We want to compare the score of specific terms across categories.
+    # We take the UNION of the top 5 terms from each category and score every one of
+    # them in every category - the index has the counts for terms outside a split's
+    # top 10, so no term is missing from the chart.
     top_5_per_cat = all_terms.groupby('Category').head(5)['term'].unique()
-    target_terms = list(set(top_5_per_cat))
+    target_terms = sorted(set(top_5_per_cat))
+    
+    chart_data = []
+    for label, split_name in available.items():
+        scores = term_index.score_terms(tfidf_index, [split_name], target_terms, idf_splits=idf_splits)
+        scores['Category'] = label
+        chart_data.append(scores)
+    chart_data = pd.concat(chart_data)
     
-    # Filter all_terms to only include these target terms
-    # But wait, we need scores for these terms even if they are NOT in the top 10 of other categories.
-    # This would require re-running TF-IDF for specific terms, which is complex.
-    # SIMPLIFICATION: We will just plot the Top 5 unique terms from each, and if a term is missing in a category, it just won't show or we treat as 0 (not ideal).
-    # Better approach for visualization: "Top Terms by Profession" - 3 subplots.
+    output_file = figure_render.render_figure(
+        figure_render.figure('comparative_topics', "output/comparative_topics.png", {'chart_data': chart_data}))
     
-    plt.figure(figsize=(15, 6))
-    sns.barplot(data=all_terms, x='term', y='rank', hue='Category') # rank here is actually score/tfidf sum
+    return all_terms, output_file
+
+def draw_comparative_topics(data, style):
+    """
+    Grouped bar chart of the chart terms' scores per profession (figure kind
+    'comparative_topics', see figure_render.py).
+    """
+    # Plotting libraries are only loaded once there is a chart to draw
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig = plt.figure(figsize=(15, 6))
+    sns.barplot(data=data['chart_data'], x='term', y='rank', hue='Category') # rank here is actually score/tfidf sum
     plt.title("Top Topic Keywords by Profession")
     plt.xticks(rotation=45)
     plt.ylabel("TF-IDF Score")
     plt.tight_layout()
-    output_file = "output/comparative_topics.png"
-    plt.savefig(output_file, dpi=300)
-    plt.close()
-    
-    return all_terms, output_file
+    return fig
@@ -0,0 +1,186 @@
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import token_store
+
+# Global window co-occurrence over a whole corpus (vs. the per-target counters of
+# inverted_index.cooccurrence). Built from the token store's id arrays:
+#   counts[a, b] - times term b occurs within window_size tokens of an occurrence of
+#                  term a in the same turn (symmetric; row a equals the counter
+#                  inverted_index.cooccurrence gives for target a)
+# One shifted comparison per offset 1..window_size produces every pair at once, so
+# the matrix for all terms is built in a few vectorized passes.
+# The matrix is cached next to the split's token store (same cache key).
+
+# Bump when the layout changes (stored inside the file).
+MATRIX_VERSION = 1
+
+def build_matrix(store, window_size=5, user_only=True, term_mask=None):
+    """
+    Sparse (n_terms x n_terms) co-occurrence counts.
+
+    Args:
+        store (dict): Token store (see token_store.py).
+        window_size (int): Tokens on each side that count as context.
+        user_only (bool): Only count user turns (as the semantic network does).
+        term_mask (np.ndarray): Optional bool mask of the vocabulary; pairs with an
+            excluded term are dropped (they still take up window positions).
+    """
+    n_terms = len(store['vocabulary'])
+    n_turns = len(store['turn_offsets']) - 1
+    rows = np.flatnonzero(store['is_user']) if user_only else np.arange(n_turns)
+    ids, lengths = token_store.row_token_ids(store, rows)
+    turn_of = np.repeat(np.arange(len(lengths)), lengths)
+    keep = np.ones(len(ids), dtype=bool) if term_mask is None else term_mask[ids]
+
+    counts = sp.csr_matrix((n_terms, n_terms), dtype=np.int64)
+    for offset in range(1, window_size + 1):
+        if offset >= len(ids):
+            break
+        valid = (turn_of[:-offset] == turn_of[offset:]) & keep[:-offset] & keep[offset:]
+        left, right = ids[:-offset][valid], ids[offset:][valid]
+        # Both directions: b is in the window of a and a in the window of b
+        pairs = sp.csr_matrix((np.ones(2 * len(left), dtype=np.int64),
+                               (np.concatenate([left, right]), np.concatenate([right, left]))),
+                              shape=(n_terms, n_terms))
+        counts = counts + pairs
+    counts.sum_duplicates()
+    return counts
+
+def content_term_mask(vocabulary, stop_words=(), min_length=4):
+    """
+    Terms kept by the semantic network filter: no stop words, at least min_length characters.
+    """
+    return np.fromiter((len(t) >= min_length and t not in stop_words for t in vocabulary),
+                       dtype=bool, count=len(vocabulary))
+
+def ppmi(counts, alpha=0.75, min_count=1):
+    """
+    Positive pointwise mutual information of a co-occurrence matrix:
+        max(0, log(P(a, b) / (P(a) * P_alpha(b))))
+    with the context distribution smoothed by alpha (1 = unsmoothed), computed on
+    the stored entries only. Pairs seen fewer than min_count times are dropped.
+    """
+    counts = sp.csr_matrix(counts, dtype=np.float64)
+    if min_count > 1:
+        counts.data[counts.data < min_count] = 0
+        counts.eliminate_zeros()
+    total = counts.sum()
+    if total == 0:
+        return sp.csr_matrix(counts.shape, dtype=np.float32)
+    row_p = np.asarray(counts.sum(axis=1)).ravel() / total
+    context = np.asarray(counts.sum(axis=0)).ravel() ** alpha
+    col_p = context / context.sum()
+
+    coo = counts.tocoo()
+    pmi = np.log(coo.data / total / (row_p[coo.row] * col_p[coo.col]))
+    positive = pmi > 0
+    return sp.csr_matrix((pmi[positive].astype(np.float32), (coo.row[positive], coo.col[positive])),
+                         shape=counts.shape)
+
+def top_neighbors(matrix, vocabulary, word, k=10, term_ids=None):
+    """
+    The k strongest neighbours of a word in a counts or PPMI matrix, as a DataFrame
+    (term, weight). Ties keep vocabulary order.
+    """
+    term_ids = term_ids or {term: i for i, term in enumerate(vocabulary)}
+    term = term_ids.get(word)
+    if term is None:
+        return pd.DataFrame({'term': [], 'weight': []})
+    row = matrix.getrow(term)
+    cols, weights = row.indices, row.data
+    mask = (cols != term) & (weights > 0)
+    cols, weights = cols[mask], weights[mask]
+    best = np.lexsort((cols, -weights))[:k]
+    return pd.DataFrame({'term': np.asarray(vocabulary, dtype=object)[cols[best]], 'weight': weights[best]})
+
+def neighbor_edges(matrix, vocabulary, terms=None, k=5):
+    """
+    Edge table (source, target, weight) of the top-k neighbours of every term in
+    `terms` (default: all terms with a neighbour), for corpus-wide semantic maps.
+    Each undirected edge appears once, with the larger of its two weights.
+    """
+    matrix = sp.csr_matrix(matrix)
+    matrix.setdiag(0)
+    matrix.eliminate_zeros()
+    rows = np.arange(matrix.shape[0]) if terms is None else np.asarray(terms, dtype=np.int64)
+    sources, targets, weights = [], [], []
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    for r in rows:
+        start, end = indptr[r], indptr[r + 1]
+        if start == end:
+            continue
+        row_cols, row_data = indices[start:end], data[start:end]
+        best = np.lexsort((row_cols, -row_data))[:k]
+        sources.append(np.full(len(best), r))
+        targets.append(row_cols[best])
+        weights.append(row_data[best])
+    if not sources:
+        return pd.DataFrame({'source': [], 'target': [], 'weight': []})
+    a, b, w = np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
+    edges = pd.DataFrame({'low': np.minimum(a, b), 'high': np.maximum(a, b), 'weight': w})
+    edges = edges.groupby(['low', 'high'], sort=True, as_index=False)['weight'].max()
+    vocabulary = np.asarray(vocabulary, dtype=object)
+    return pd.DataFrame({
+        'source': vocabulary[edges['low'].to_numpy()],
+        'target': vocabulary[edges['high'].to_numpy()],
+        'weight': edges['weight'].to_numpy(),
+    }).sort_values('weight', ascending=False, kind='stable').reset_index(drop=True)
+
+def frequent_terms(store, n=1000, term_mask=None, user_only=True):
+    """
+    Ids of the n most frequent terms (optionally only among term_mask), e.g. the
+    nodes of a semantic map.
+    """
+    rows = np.flatnonzero(store['is_user']) if user_only else np.arange(len(store['turn_offsets']) - 1)
+    ids, _ = token_store.row_token_ids(store, rows)
+    freq = np.bincount(ids, minlength=len(store['vocabulary']))
+    if term_mask is not None:
+        freq = np.where(term_mask, freq, 0)
+    order = np.lexsort((np.arange(len(freq)), -freq))
+    return order[:n][freq[order[:n]] > 0]
+
+def save_matrix(counts, path, window_size, user_only, n_tokens):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    counts = sp.csr_matrix(counts)
+    np.savez(tmp_path, version=MATRIX_VERSION, window_size=window_size, user_only=user_only, n_tokens=n_tokens,
+             shape=np.array(counts.shape), indptr=counts.indptr, indices=counts.indices, data=counts.data)
+    os.replace(tmp_path, path)
+
+def load_matrix(path, window_size, user_only, n_terms, n_tokens):
+    """
+    Loads saved counts, or returns None if they were built differently (version,
+    window, roles) or from another token store.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['version']) != MATRIX_VERSION or int(data['window_size']) != window_size \
+                or bool(data['user_only']) != user_only or int(data['n_tokens']) != n_tokens \
+                or tuple(data['shape']) != (n_terms, n_terms):
+            return None
+        return sp.csr_matrix((data['data'], data['indices'], data['indptr']), shape=(n_terms, n_terms))
+
+def matrix_path(split, data_dir=None):
+    """
+    The matrix is stored next to the split's token store and shares its cache key.
+    """
+    return token_store.store_path(split, data_dir)[:-len(".tokens.npz")] + ".cooc.npz"
+
+def get_matrix(split, df_turns, window_size=5, user_only=True, data_dir=None, store=None):
+    """
+    Returns the persisted (unfiltered) co-occurrence counts of a split, building
+    (and saving) them if needed. df_turns must be the split's turns from turn_cache.get_turns.
+    """
+    store = store or token_store.get_store(split, df_turns, data_dir)
+    path = matrix_path(split, data_dir)
+    if os.path.exists(path):
+        counts = load_matrix(path, window_size, user_only, len(store['vocabulary']), len(store['token_ids']))
+        if counts is not None:
+            return counts
+    counts = build_matrix(store, window_size, user_only)
+    try:
+        save_matrix(counts, path, window_size, user_only, len(store['token_ids']))
+    except OSError as e:
+        print(f"Could not write co-occurrence matrix: {e}")
+    return counts
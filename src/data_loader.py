@@ -1,27 +1,172 @@
-from datasets import load_dataset
+import functools
+import json
+import re
+import time
 import pandas as pd
 import os
 
-def load_data(split='workforce'):
+DATASET_NAME = "Anthropic/AnthropicInterviewer"
+# Optional dataset revision (commit sha, branch or tag) to load from Hugging Face.
+# Unset: the latest revision, resolved on the Hub for the cache keys (see dataset_revision).
+DATASET_REVISION = os.environ.get("INTERVIEWER_DATASET_REVISION")
+
+# Last resolved commit sha of each requested revision, so cache keys do not depend on
+# the network: it is reused for REVISION_TTL seconds, and indefinitely when offline.
+REVISION_FILE = os.environ.get("DATASET_REVISION_FILE", os.path.join("cache", "dataset_revision.json"))
+REVISION_TTL = int(os.environ.get("DATASET_REVISION_TTL", 24 * 3600))
+
+UNRESOLVED = "unresolved"
+
+# Optional folder with local copies of the splits (<split>.parquet or <split>.jsonl).
+# When a file for the requested split exists there, it is used instead of Hugging Face,
+# so the whole pipeline can run offline.
+DATA_DIR = os.environ.get("INTERVIEWER_DATA_DIR")
+
+LOCAL_EXTENSIONS = ('.parquet', '.jsonl', '.json')
+
+def find_local_split(split, data_dir=None):
+    """
+    Returns the path of a local file for the split, or None if there is none.
+    """
+    data_dir = data_dir or DATA_DIR
+    if not data_dir:
+        return None
+    for ext in LOCAL_EXTENSIONS:
+        path = os.path.join(data_dir, f"{split}{ext}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def read_local_file(path):
+    """
+    Reads a local parquet/JSONL export of a split into a DataFrame.
+    """
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    return pd.read_json(path, lines=path.endswith('.jsonl'))
+
+def read_revisions(path=None):
+    """
+    Returns the persisted {revision: {'sha': ..., 'resolved_at': ...}} mapping (empty if none).
+    """
+    try:
+        with open(path or REVISION_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_revision(revision, sha, path=None):
+    """
+    Records the commit sha a revision resolved to (atomically, via a temp file).
+    """
+    path = path or REVISION_FILE
+    revisions = read_revisions(path)
+    revisions[revision] = {'sha': sha, 'resolved_at': time.time()}
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(revisions, f, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Could not record the dataset revision: {e}")
+
+@functools.lru_cache(maxsize=None)
+def dataset_revision():
+    """
+    Commit sha of the dataset revision load_data reads from Hugging Face, or None if it
+    was never resolved. A pinned sha is used as is; otherwise the sha recorded in
+    REVISION_FILE is reused while it is younger than REVISION_TTL, and looked up on the
+    Hub after that. Offline, the last recorded sha is reused whatever its age.
+    """
+    if DATASET_REVISION and re.fullmatch(r"[0-9a-f]{40}", DATASET_REVISION):
+        return DATASET_REVISION
+    revision = f"{DATASET_NAME}@{DATASET_REVISION or 'main'}"
+    recorded = read_revisions().get(revision)
+    if recorded and time.time() - recorded['resolved_at'] < REVISION_TTL:
+        return recorded['sha']
+    try:
+        from huggingface_hub import HfApi
+        sha = HfApi().dataset_info(DATASET_NAME, revision=DATASET_REVISION).sha
+    except Exception as e:
+        print(f"Could not resolve the revision of {DATASET_NAME}: {e}")
+        return recorded['sha'] if recorded else None
+    write_revision(revision, sha)
+    return sha
+
+def source_resolved(split, data_dir=None):
+    """
+    True if source_fingerprint identifies the split's data: always for local files,
+    for Hugging Face splits only once the dataset revision has been resolved.
+    """
+    return find_local_split(split, data_dir) is not None or dataset_revision() is not None
+
+def source_fingerprint(split, data_dir=None):
+    """
+    Identifies the raw data behind a split (used as part of cache keys).
+    Local files are identified by path, size and modification time, Hugging Face
+    splits by the dataset revision ('unresolved' if it never could be looked up).
+    """
+    path = find_local_split(split, data_dir)
+    if path is None:
+        return f"hf:{DATASET_NAME}@{dataset_revision() or UNRESOLVED}:{split}"
+    stat = os.stat(path)
+    return f"file:{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+
+def load_data(split='workforce', data_dir=None):
     """
     Loads the Anthropic Interviewer dataset.
-    
+
     Args:
         split (str): The dataset split to load (e.g., 'workforce', 'creatives', 'scientists').
-        
+        data_dir (str): Optional folder with local split files (defaults to INTERVIEWER_DATA_DIR).
+
     Returns:
         pd.DataFrame: The loaded data as a Pandas DataFrame.
     """
     print(f"Loading dataset split: {split}...")
     try:
-        dataset = load_dataset("Anthropic/AnthropicInterviewer", split=split)
-        df = dataset.to_pandas()
+        path = find_local_split(split, data_dir)
+        if path is not None:
+            df = read_local_file(path)
+        else:
+            # Only the Hugging Face path needs `datasets` (slow to import)
+            from datasets import load_dataset
+            dataset = load_dataset(DATASET_NAME, split=split, revision=DATASET_REVISION)
+            df = dataset.to_pandas()
         print(f"Successfully loaded {len(df)} rows.")
         return df
     except Exception as e:
         print(f"Error loading dataset: {e}")
         return None
 
+def iter_batches(split='workforce', batch_size=10000, data_dir=None):
+    """
+    Streams a split as DataFrame chunks of at most batch_size transcripts,
+    so the whole split never has to fit in memory.
+
+    Local parquet files are read as Arrow record batches, JSONL files in line chunks,
+    and Hugging Face splits through datasets' streaming mode.
+    """
+    path = find_local_split(split, data_dir)
+    if path is None:
+        from datasets import load_dataset
+        dataset = load_dataset(DATASET_NAME, split=split, revision=DATASET_REVISION, streaming=True)
+        for batch in dataset.iter(batch_size=batch_size):
+            yield pd.DataFrame(batch)
+    elif path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield record_batch.to_pandas()
+    elif path.endswith('.jsonl'):
+        with pd.read_json(path, lines=True, chunksize=batch_size) as reader:
+            for chunk in reader:
+                yield chunk
+    else:
+        # Plain JSON arrays cannot be read incrementally
+        df = read_local_file(path)
+        for start in range(0, len(df), batch_size):
+            yield df.iloc[start:start + batch_size]
+
 if __name__ == "__main__":
     # Test loading
     df = load_data()
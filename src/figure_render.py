@@ -0,0 +1,155 @@
+import hashlib
+import importlib
+import os
+import pickle
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import stage_cache
+import task_graph
+
+# Rendering of the report images from figure specs:
+#   {'kind': plot kind (key of KINDS), 'output': image file,
+#    'data': what the plot shows (DataFrames, graphs, numbers), 'style': options}
+# A kind names a draw function draw(data, style) -> matplotlib Figure; the renderer
+# saves and closes the figure (dpi and bbox_inches come from the style).
+#
+# Rendered images are content addressed: a figure's hash covers its kind, data and
+# style, the source of the module drawing it (and of the local modules it imports)
+# and the matplotlib version. Images are kept under CACHE_DIR/<hash>.<ext> and
+# copied to their output file, so a figure whose content did not change (e.g. the
+# persona card of unchanged clusters) is never drawn again.
+# Figures that do need drawing are rendered on a process pool with the Agg backend.
+CACHE_DIR = os.environ.get("FIGURE_CACHE_DIR", os.path.join("cache", "figures"))
+MAX_MB = float(os.environ.get("FIGURE_CACHE_MAX_MB", "256"))
+
+# Bump when the rendering changes in a way the hash does not cover.
+RENDER_VERSION = 1
+
+# Plot kinds: {kind: (module, draw function)}
+KINDS = {
+    'semantic_network': ('semantic_analysis', 'draw_network'),
+    'semantic_map': ('semantic_analysis', 'draw_semantic_map'),
+    'maturity_clusters': ('clustering', 'draw_clusters'),
+    'k_sweep': ('clustering', 'draw_k_sweep'),
+    'comparative_topics': ('comparative_analysis', 'draw_comparative_topics'),
+    'portfolio_comparison': ('portfolio_visuals', 'draw_comparative_chart'),
+    'persona_card': ('portfolio_visuals', 'draw_persona_card'),
+}
+
+def figure(kind, output, data=None, **style):
+    """
+    A figure spec (see above). Style defaults: dpi=300, bbox_inches=None.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown plot kind '{kind}' (known: {', '.join(KINDS)})")
+    return {'kind': kind, 'output': output, 'data': data or {}, 'style': {'dpi': 300, 'bbox_inches': None, **style}}
+
+def code_digest(module):
+    """
+    Hash of a draw module and the local modules it imports (see stage_cache.py).
+    """
+    source = stage_cache.module_source(module)
+    h = hashlib.sha256(source.encode("utf-8"))
+    for name in stage_cache.import_closure(source):
+        h.update(stage_cache.module_source(name).encode("utf-8"))
+    return h.hexdigest()
+
+def figure_hash(spec):
+    import matplotlib
+    h = hashlib.sha256(f"v{RENDER_VERSION}:{spec['kind']}:{matplotlib.__version__}".encode())
+    h.update(code_digest(KINDS[spec['kind']][0]).encode())
+    h.update(pickle.dumps((spec['data'], sorted(spec['style'].items())), protocol=4))
+    return h.hexdigest()[:24]
+
+def cached_path(spec, key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, key + os.path.splitext(spec['output'])[1])
+
+def init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def draw(spec, path):
+    """
+    Draws a figure and saves it to path (atomically).
+    """
+    import matplotlib.pyplot as plt
+    module, function = KINDS[spec['kind']]
+    fig = getattr(importlib.import_module(module), function)(spec['data'], spec['style'])
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{os.getpid()}{ext}"
+    try:
+        fig.savefig(tmp_path, dpi=spec['style']['dpi'], bbox_inches=spec['style']['bbox_inches'])
+    finally:
+        plt.close(fig)
+    os.replace(tmp_path, path)
+    return path
+
+def render_figures(specs, max_workers=None, cache_dir=None):
+    """
+    Renders figure specs (None entries are skipped) and returns their output files
+    in the same order (None for skipped specs). Unchanged figures are copied from
+    the cache; the others are drawn on a process pool (task_graph.pool_size(max_workers):
+    inside a stage worker only its share of the workers; a single figure is drawn in
+    this process).
+    """
+    keys = [figure_hash(spec) if spec else None for spec in specs]
+    todo = {}
+    for spec, key in zip(specs, keys):
+        if spec and key not in todo and not os.path.exists(cached_path(spec, key, cache_dir)):
+            todo[key] = spec
+    max_workers = min(task_graph.pool_size(max_workers), len(todo))
+    if max_workers <= 1:
+        for key, spec in todo.items():
+            draw(spec, cached_path(spec, key, cache_dir))
+    else:
+        # Imported once here: forked workers inherit it instead of importing it again
+        import matplotlib.pyplot
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker) as pool:
+            futures = [pool.submit(draw, spec, cached_path(spec, key, cache_dir)) for key, spec in todo.items()]
+            for future in futures:
+                future.result()
+
+    outputs = []
+    for spec, key in zip(specs, keys):
+        if not spec:
+            outputs.append(None)
+            continue
+        path = cached_path(spec, key, cache_dir)
+        os.makedirs(os.path.dirname(spec['output']) or ".", exist_ok=True)
+        shutil.copyfile(path, spec['output'])
+        # Mark as recently used (for eviction)
+        os.utime(path)
+        outputs.append(spec['output'])
+    if todo:
+        evict(cache_dir=cache_dir)
+    return outputs
+
+def render_figure(spec, cache_dir=None):
+    """
+    Renders one figure spec (see render_figures) and returns its output file.
+    """
+    return render_figures([spec], max_workers=1, cache_dir=cache_dir)[0]
+
+def evict(max_mb=None, cache_dir=None):
+    """
+    Removes least recently used images until the cache is at most max_mb.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = (MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = [(os.path.getmtime(p), p, os.path.getsize(p))
+               for p in (os.path.join(cache_dir, f) for f in os.listdir(cache_dir)) if os.path.isfile(p)]
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, path, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+    return removed
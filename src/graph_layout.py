@@ -0,0 +1,236 @@
+import hashlib
+import os
+import numpy as np
+import scipy.sparse as sp
+
+# Graph layouts for the semantic network images.
+#   spring - networkx spring_layout (pure Python, O(n^2) per iteration): the look of
+#            the small ego graphs, used up to SPRING_MAX_NODES nodes
+#   force  - vectorized Fruchterman-Reingold started from a spectral layout. Repulsion
+#            is exact (in row chunks) up to EXACT_MAX_NODES nodes; above that it is
+#            approximated Barnes-Hut style on a hierarchy of grids: nodes in the same
+#            or adjacent cells repel exactly, farther cells act through their centre
+#            of mass (see repulsion_tree). Each iteration is O(n log n).
+# Layouts are cached on disk, keyed by the graph structure (nodes in order, edges,
+# weights) and the layout parameters, so re-rendering an unchanged graph is free.
+CACHE_DIR = os.environ.get("LAYOUT_CACHE_DIR", os.path.join("cache", "layouts"))
+
+# Bump when a layout algorithm changes.
+LAYOUT_VERSION = 1
+
+SPRING_MAX_NODES = 100
+EXACT_MAX_NODES = 300
+MAX_DEPTH = 8
+# Upper bound for one block of pairwise node/cell differences
+MAX_CHUNK_ELEMENTS = 4 * 1024 * 1024
+
+def graph_arrays(G):
+    """
+    Nodes (in G's order) and edge arrays (rows, cols, weights) of a networkx graph.
+    """
+    nodes = list(G.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+    edges = list(G.edges(data='weight', default=1))
+    rows = np.fromiter((position[u] for u, _, _ in edges), dtype=np.int64, count=len(edges))
+    cols = np.fromiter((position[v] for _, v, _ in edges), dtype=np.int64, count=len(edges))
+    weights = np.fromiter((w for _, _, w in edges), dtype=float, count=len(edges))
+    return nodes, rows, cols, weights
+
+def layout_key(nodes, rows, cols, weights, params):
+    h = hashlib.sha256(f"v{LAYOUT_VERSION}:{params!r}".encode())
+    h.update("\n".join(map(str, nodes)).encode("utf-8"))
+    for array in (rows, cols, weights):
+        h.update(np.ascontiguousarray(array).tobytes())
+    return h.hexdigest()[:24]
+
+def spectral_layout(n, rows, cols, weights, seed=42):
+    """
+    Start positions from the two leading non-trivial eigenvectors of the normalized
+    adjacency matrix (random positions if the graph is too small or eigsh fails).
+    """
+    rng = np.random.default_rng(seed)
+    if n < 4 or len(rows) == 0:
+        return rng.random((n, 2))
+    from scipy.sparse.linalg import ArpackNoConvergence, eigsh
+    adjacency = sp.csr_matrix((np.concatenate([weights, weights]),
+                               (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n, n))
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    scale = sp.diags(1 / np.sqrt(np.maximum(degree, 1e-12)))
+    try:
+        _, vectors = eigsh(scale @ adjacency @ scale, k=3, which='LA', v0=rng.random(n))
+    except (ArpackNoConvergence, ValueError):
+        return rng.random((n, 2))
+    pos = vectors[:, :2] + rng.normal(scale=1e-3, size=(n, 2))
+    return pos
+
+def repulsion_exact(pos, k):
+    """
+    Fruchterman-Reingold repulsion (k^2 / d) between all node pairs.
+    """
+    n = len(pos)
+    x, y = pos[:, 0], pos[:, 1]
+    disp = np.zeros_like(pos)
+    chunk = max(1, MAX_CHUNK_ELEMENTS // max(n, 1))
+    for start in range(0, n, chunk):
+        dx = x[start:start + chunk, None] - x[None, :]
+        dy = y[start:start + chunk, None] - y[None, :]
+        force = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+        disp[start:start + chunk, 0] = (dx * force).sum(axis=1)
+        disp[start:start + chunk, 1] = (dy * force).sum(axis=1)
+    return disp
+
+def cell_centers(pos, cx, cy, cells_per_side):
+    """
+    Occupied cells of a grid level: a (cells_per_side^2) table of their positions
+    (-1 for empty cells), masses and centres of mass.
+    """
+    ids, members = np.unique(cx * cells_per_side + cy, return_inverse=True)
+    lookup = np.full(cells_per_side * cells_per_side, -1, dtype=np.int64)
+    lookup[ids] = np.arange(len(ids))
+    mass = np.bincount(members).astype(float)
+    centers = np.column_stack([np.bincount(members, weights=pos[:, d]) / mass for d in range(2)])
+    return lookup, mass, centers
+
+def repulsion_tree(pos, k, depth):
+    """
+    Barnes-Hut style repulsion on a hierarchy of grids (a quadtree cut at a fixed
+    depth). On level l (2^l cells per side) a node interacts with the centre of mass
+    of every cell that is a child of its parent's neighbourhood but not adjacent to
+    its own cell - far cells are thus always summarized at the coarsest level that
+    keeps them at least one cell width away. Nodes in the same or adjacent cells of
+    the finest level repel exactly.
+    """
+    n = len(pos)
+    low = pos.min(axis=0)
+    side = 1 << depth
+    size = max(float((pos.max(axis=0) - low).max()), 1e-9) / side
+    fine_x, fine_y = np.minimum(((pos - low) / size).astype(np.int64), side - 1).T
+    disp = np.zeros_like(pos)
+
+    # Far field, level by level
+    for level in range(2, depth + 1):
+        cells_per_side = 1 << level
+        cx, cy = fine_x >> (depth - level), fine_y >> (depth - level)
+        lookup, mass, centers = cell_centers(pos, cx, cy, cells_per_side)
+        weight = mass * k * k
+        base_x, base_y = 2 * ((cx >> 1) - 1), 2 * ((cy >> 1) - 1)
+        for a in range(6):
+            tx = base_x + a
+            for b in range(6):
+                ty = base_y + b
+                valid = (tx >= 0) & (tx < cells_per_side) & (ty >= 0) & (ty < cells_per_side) \
+                    & ((np.abs(tx - cx) > 1) | (np.abs(ty - cy) > 1))
+                found = lookup[np.where(valid, tx * cells_per_side + ty, 0)]
+                i = np.flatnonzero(valid & (found >= 0))
+                cell = found[i]
+                dx, dy = pos[i, 0] - centers[cell, 0], pos[i, 1] - centers[cell, 1]
+                force = weight[cell] / np.maximum(dx * dx + dy * dy, 1e-9)
+                disp[i, 0] += dx * force
+                disp[i, 1] += dy * force
+
+    # Near field: exact pairs with the nodes of the finest 3x3 neighbourhood
+    lookup, mass, _ = cell_centers(pos, fine_x, fine_y, side)
+    cell = fine_x * side + fine_y
+    order = np.argsort(cell, kind='stable')
+    cell_start = np.concatenate([[0], np.cumsum(mass.astype(np.int64))])
+    for step_x in (-1, 0, 1):
+        for step_y in (-1, 0, 1):
+            ncx, ncy = fine_x + step_x, fine_y + step_y
+            valid = (ncx >= 0) & (ncx < side) & (ncy >= 0) & (ncy < side)
+            found = lookup[np.where(valid, ncx * side + ncy, 0)]
+            i = np.flatnonzero(valid & (found >= 0))
+            neighbour = found[i]
+            counts = mass[neighbour].astype(np.int64)
+            starts = cell_start[neighbour]
+            # Members of each node's neighbour cell, without a Python loop over nodes
+            shift = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+            j = order[np.arange(int(counts.sum())) + shift]
+            i = np.repeat(i, counts)
+            other = i != j
+            i, j = i[other], j[other]
+            dx, dy = pos[i, 0] - pos[j, 0], pos[i, 1] - pos[j, 1]
+            force = k * k / np.maximum(dx * dx + dy * dy, 1e-9)
+            disp[:, 0] += np.bincount(i, weights=dx * force, minlength=n)
+            disp[:, 1] += np.bincount(i, weights=dy * force, minlength=n)
+    return disp
+
+def tree_depth(n):
+    """
+    Levels of the repulsion grid hierarchy: about 2-4 nodes per finest cell on
+    average, at most 256 cells per side.
+    """
+    return int(min(MAX_DEPTH, max(2, round(np.log2(n) / 2) + 1)))
+
+def force_layout(n, rows, cols, weights, iterations=50, seed=42, init=None):
+    """
+    Vectorized Fruchterman-Reingold layout in the unit square.
+
+    Args:
+        n (int): Number of nodes.
+        rows, cols, weights (np.ndarray): Edges (node positions) and their weights.
+        iterations (int): Force iterations (the step size cools linearly to 0).
+        init (np.ndarray): Start positions (default: spectral_layout).
+    """
+    if n == 0:
+        return np.zeros((0, 2))
+    pos = spectral_layout(n, rows, cols, weights, seed) if init is None else np.asarray(init, dtype=float)
+    pos = (pos - pos.min(axis=0)) / np.maximum(np.ptp(pos, axis=0), 1e-9)
+    if n == 1:
+        return pos
+    k = np.sqrt(1.0 / n)
+    w = weights / weights.max() if len(weights) else weights
+    depth = tree_depth(n)
+    temperature = 0.1
+    for step in range(iterations):
+        if n <= EXACT_MAX_NODES:
+            disp = repulsion_exact(pos, k)
+        else:
+            disp = repulsion_tree(pos, k, depth)
+        # Attraction along edges: d^2 / k, scaled by the relative edge weight
+        dx, dy = pos[rows, 0] - pos[cols, 0], pos[rows, 1] - pos[cols, 1]
+        pull = np.sqrt(dx * dx + dy * dy) * w / k
+        for d, delta in enumerate((dx, dy)):
+            disp[:, d] -= np.bincount(rows, weights=delta * pull, minlength=n)
+            disp[:, d] += np.bincount(cols, weights=delta * pull, minlength=n)
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        step_size = temperature * (1 - step / iterations)
+        pos += disp * (np.minimum(length, step_size) / length)[:, None]
+    return pos
+
+def spring_layout(G, seed, **kwargs):
+    import networkx as nx
+    pos = nx.spring_layout(G, seed=seed, **kwargs)
+    return np.array([pos[node] for node in G.nodes()])
+
+def layout(G, engine='auto', iterations=50, seed=42, spring=None, cache_dir=None):
+    """
+    {node: (x, y)} for a networkx graph, from the layout cache when possible.
+
+    Args:
+        engine (str): 'spring', 'force' or 'auto' (spring up to SPRING_MAX_NODES nodes).
+        iterations (int): Iterations of the force engine.
+        spring (dict): networkx spring_layout arguments for the spring engine (k, iterations).
+    """
+    nodes, rows, cols, weights = graph_arrays(G)
+    if engine == 'auto':
+        engine = 'spring' if len(nodes) <= SPRING_MAX_NODES else 'force'
+    spring = spring or {}
+    params = (engine, seed, sorted(spring.items()) if engine == 'spring' else iterations)
+    path = os.path.join(cache_dir or CACHE_DIR, layout_key(nodes, rows, cols, weights, params) + ".npy")
+    if os.path.exists(path):
+        pos = np.load(path, allow_pickle=False)
+        if pos.shape == (len(nodes), 2):
+            return dict(zip(nodes, pos))
+
+    if engine == 'spring':
+        pos = spring_layout(G, seed, **spring)
+    else:
+        pos = force_layout(len(nodes), rows, cols, weights, iterations, seed)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, pos)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not cache graph layout: {e}")
+    return dict(zip(nodes, pos))
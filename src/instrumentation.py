@@ -0,0 +1,241 @@
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Lightweight run instrumentation.
+# Every measured block (a report stage, or an analysis function decorated with @timed)
+# adds a record to RECORDS: wall time, CPU time, rows in/out, peak RSS and, optionally,
+# the tracemalloc peak inside it. Records are appended to a JSONL run log and
+# summarised in the report's "Run Profile" table.
+# The OS only keeps the process's lifetime RSS high-water mark. On Linux it can be
+# reset (/proc/self/clear_refs), so peak_rss_mb is the block's own peak; elsewhere it
+# is None and only process_peak_rss_mb (the lifetime peak at the end of the block) is kept.
+# Stages wrap their (lazy) imports in importing(), which adds up their time as the
+# stage's import_s.
+RUN_LOG = os.environ.get("RUN_LOG", os.path.join("output", "run_log.jsonl"))
+# tracemalloc makes Python allocations several times slower, so it is opt-in
+TRACEMALLOC = os.environ.get("INSTRUMENT_TRACEMALLOC") == "1"
+# Profile every stage with cProfile and keep the slowest one's stats
+PROFILE_STAGES = os.environ.get("PROFILE_STAGES") == "1"
+PROFILE_DIR = os.path.join("output", "profiles")
+
+RECORDS = []
+# Records of the blocks being measured, innermost last
+_open_records = []
+
+# Highest RSS high-water mark seen before a reset
+_process_peak = 0.0
+
+def peak_rss_mb():
+    """
+    High-water mark of this process's resident memory since it started or since the
+    last reset_peak_rss() (ru_maxrss is KB on Linux, bytes on macOS), None if unknown.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        # Windows reports the peak working set
+        peak = getattr(psutil.Process().memory_info(), 'peak_wset', None)
+        return peak / (1024 * 1024) if peak is not None else None
+    return None
+
+def reset_peak_rss():
+    """
+    Resets the RSS high-water mark to the current RSS (Linux only). Returns whether it did.
+    """
+    global _process_peak
+    peak = peak_rss_mb()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    _process_peak = max(_process_peak, peak or 0.0)
+    return True
+
+def count_rows(value):
+    """
+    Rows of a result: len() of DataFrames/lists/dicts, of the first element of tuples.
+    """
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series, list, dict)):
+        return len(value)
+    return None
+
+@contextmanager
+def measure(name, kind='stage', rows_in=None):
+    """
+    Measures the enclosed block. The yielded record can be updated, e.g. with
+    record['rows_out'] = len(result).
+    """
+    stage = current_stage()
+    record = {'name': name, 'kind': kind, 'stage': name if kind == 'stage' else stage and stage['name'],
+              'rows_in': rows_in, 'rows_out': None, 'pid': os.getpid()}
+    if kind == 'stage':
+        record['import_s'] = 0.0
+    # Blocks being measured keep the peak so far; nested blocks are folded in at their end
+    peak = peak_rss_mb()
+    for outer in _open_records:
+        if outer['_peak'] is not None:
+            outer['_peak'] = max(outer['_peak'], peak or 0.0)
+    record['_peak'] = 0.0 if reset_peak_rss() else None
+    _open_records.append(record)
+    tracing = TRACEMALLOC and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = time.perf_counter() - wall
+        record['cpu_s'] = time.process_time() - cpu
+        peak = peak_rss_mb()
+        own_peak = record.pop('_peak')
+        record['peak_rss_mb'] = max(own_peak, peak) if own_peak is not None and peak is not None else None
+        record['process_peak_rss_mb'] = max(_process_peak, peak) if peak is not None else None
+        if tracing:
+            record['tracemalloc_peak_mb'] = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        _open_records.pop()
+        for outer in _open_records:
+            if outer['_peak'] is not None:
+                outer['_peak'] = max(outer['_peak'], record['peak_rss_mb'] or 0.0)
+        RECORDS.append(record)
+
+def current_stage():
+    """
+    Record of the innermost stage being measured, or None.
+    """
+    return next((r for r in reversed(_open_records) if r['kind'] == 'stage'), None)
+
+@contextmanager
+def importing():
+    """
+    Wraps a stage's imports; their wall time is added to the stage's import_s.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage = current_stage()
+        if stage is not None:
+            stage['import_s'] += time.perf_counter() - start
+
+def timed(func):
+    """
+    Decorator for analysis functions: records one 'function' entry per call, with
+    rows_in = len of the first argument (usually df_turns) and rows_out = rows of the result.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with measure(func.__name__, kind='function', rows_in=count_rows(args[0]) if args else None) as record:
+            result = func(*args, **kwargs)
+            record['rows_out'] = count_rows(result)
+        return result
+    return wrapper
+
+def run_stage(name, func, df_turns, inputs):
+    """
+    Runs one report stage (see task_graph.py) under measurement.
+    Returns (result, records made during the stage), so that records made in worker
+    processes get back to the main process.
+    """
+    start = len(RECORDS)
+    profiler = cProfile.Profile() if PROFILE_STAGES else None
+    with measure(name, kind='stage', rows_in=len(df_turns)) as record:
+        if profiler:
+            profiler.enable()
+        result = func(df_turns, inputs)
+        if profiler:
+            profiler.disable()
+        record['rows_out'] = result.get('rows_out') if isinstance(result, dict) else None
+    if profiler:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        record['profile'] = os.path.join(PROFILE_DIR, f"{name}.prof")
+        profiler.dump_stats(record['profile'])
+    records = RECORDS[start:]
+    del RECORDS[start:]
+    return result, records
+
+def keep_slowest_profile(records):
+    """
+    Keeps the cProfile dump of the slowest stage (and prints its top entries), removes the others.
+    """
+    profiled = [r for r in records if r.get('profile')]
+    if not profiled:
+        return None
+    slowest = max(profiled, key=lambda r: r['wall_s'])
+    for r in profiled:
+        if r is not slowest and os.path.exists(r['profile']):
+            os.remove(r['profile'])
+    import pstats
+    print(f"\n[Profile of slowest stage '{slowest['name']}' ({slowest['wall_s']:.2f}s): {slowest['profile']}]")
+    pstats.Stats(slowest['profile']).sort_stats('cumulative').print_stats(25)
+    return slowest['profile']
+
+def write_run_log(records, path=None, run_id=None):
+    """
+    Appends the records of one run to the JSONL run log.
+    """
+    path = path or RUN_LOG
+    run_id = run_id or time.strftime("%Y%m%dT%H%M%S")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps({'run_id': run_id, **record}) + "\n")
+    return path
+
+def profile_table(records):
+    """
+    Markdown lines of the "Run Profile" report section: one row per stage, then the
+    instrumented analysis functions.
+    """
+    def rows(kind):
+        table = pd.DataFrame([r for r in records if r['kind'] == kind])
+        if table.empty:
+            return table
+        columns = ['stage', 'name', 'wall_s', 'cpu_s', 'rows_in', 'rows_out', 'peak_rss_mb', 'process_peak_rss_mb']
+        if kind == 'stage':
+            columns.insert(4, 'import_s')
+        if 'tracemalloc_peak_mb' in table:
+            columns.append('tracemalloc_peak_mb')
+        table = table[columns if kind == 'function' else columns[1:]].copy()
+        for column in ['rows_in', 'rows_out']:
+            table[column] = table[column].map(lambda v: "" if pd.isna(v) else str(int(v)))
+        return table
+
+    lines = ["\n## 10. Run Profile"]
+    lines.append("Wall/CPU time, rows in/out and peak memory per stage (stages may overlap when run in parallel). "
+                 "`peak_rss_mb` is the block's own RSS peak (Linux only), `process_peak_rss_mb` the "
+                 "peak of its process since it started.")
+    startup = [r for r in records if r['kind'] == 'imports']
+    if startup:
+        lines.append(f"- **Startup imports**: {startup[0]['wall_s']:.2f}s (stage imports are in `import_s`)\n")
+    cached = [r['name'] for r in records if r['kind'] == 'cached']
+    if cached:
+        lines.append(f"- **Unchanged stages (from the stage cache)**: {', '.join(cached)}\n")
+    stages = rows('stage')
+    if not stages.empty:
+        lines.append(stages.to_markdown(index=False, floatfmt=".2f"))
+    functions = rows('function')
+    if not functions.empty:
+        lines.append("\n**Instrumented analysis functions:**")
+        lines.append(functions.to_markdown(index=False, floatfmt=".3f"))
+    return lines
@@ -0,0 +1,156 @@
+import os
+from collections import Counter
+import numpy as np
+import token_store
+
+# Positional inverted index over the turns of a corpus (all roles), built on the
+# split's token store (see token_store.py) plus:
+#   order        - token positions sorted by term id (the postings lists, back to back)
+#   term_ptr     - start of each term's postings in `order` (n_terms + 1 entries)
+# Co-occurrence windows and KWIC lookups only touch the postings of the queried words
+# instead of rescanning every turn.
+
+# Bump when the layout changes (stored inside the file).
+INDEX_VERSION = 2
+
+def build_index(store):
+    """
+    Adds the postings lists to a token store.
+    """
+    order = np.argsort(store['token_ids'], kind='stable').astype(np.int32)
+    term_ptr = np.zeros(len(store['vocabulary']) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(store['token_ids'], minlength=len(store['vocabulary'])), out=term_ptr[1:])
+    return dict(store, order=order, term_ptr=term_ptr)
+
+def save_index(index, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    np.savez(tmp_path, version=INDEX_VERSION, order=index['order'], term_ptr=index['term_ptr'])
+    os.replace(tmp_path, path)
+
+def load_index(path, store):
+    """
+    Loads saved postings for a store, or returns None if they were written by
+    another INDEX_VERSION or do not fit the store.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['version']) != INDEX_VERSION:
+            return None
+        order, term_ptr = data['order'], data['term_ptr']
+    if len(order) != len(store['token_ids']) or len(term_ptr) != len(store['vocabulary']) + 1:
+        return None
+    return dict(store, order=order, term_ptr=term_ptr)
+
+def index_path(split, data_dir=None):
+    """
+    The index is stored next to the split's cached turns and shares their cache key.
+    """
+    return token_store.store_path(split, data_dir)[:-len(".tokens.npz")] + ".postings.npz"
+
+def fingerprint(split, data_dir=None):
+    """
+    Identifies the saved postings of a split (version, size, modification time), or
+    None if there are none. Part of the stage cache keys.
+    """
+    path = index_path(split, data_dir)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f"v{INDEX_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_index(split, df_turns, data_dir=None, store=None):
+    """
+    Returns the persisted index of a split, building (and saving) it if needed.
+    df_turns must be the split's turns from turn_cache.get_turns.
+    """
+    store = store or token_store.get_store(split, df_turns, data_dir)
+    path = index_path(split, data_dir)
+    if os.path.exists(path):
+        index = load_index(path, store)
+        if index is not None:
+            return index
+    index = build_index(store)
+    try:
+        save_index(index, path)
+    except OSError as e:
+        print(f"Could not write inverted index: {e}")
+    return index
+
+def postings(index, word):
+    """
+    Occurrences of a word: (global token positions, turn ids).
+    """
+    term = index['term_ids'].get(word)
+    if term is None:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty
+    positions = index['order'][index['term_ptr'][term]:index['term_ptr'][term + 1]].astype(np.int64)
+    turns = np.searchsorted(index['turn_offsets'], positions, side='right') - 1
+    return positions, turns
+
+def cooccurrence(index, target_word, window_size=5, stop_words=(), min_length=4, user_only=True):
+    """
+    Counts (target_word, neighbor) pairs inside the window around each occurrence of
+    target_word, reading only the target's postings. Same counts as
+    semantic_analysis.count_cooccurrence.
+    """
+    positions, turns = postings(index, target_word)
+    if user_only:
+        keep = index['is_user'][turns]
+        positions, turns = positions[keep], turns[keep]
+    if len(positions) == 0:
+        return Counter()
+
+    turn_start = index['turn_offsets'][turns]
+    turn_end = index['turn_offsets'][turns + 1]
+    offsets = np.concatenate([np.arange(-window_size, 0), np.arange(1, window_size + 1)])
+    neighbors = positions[:, None] + offsets[None, :]
+    inside = (neighbors >= turn_start[:, None]) & (neighbors < turn_end[:, None])
+    neighbor_ids = index['token_ids'][neighbors[inside]]
+
+    # Insert pairs in first-seen order (as a left-to-right scan would), so that
+    # most_common() breaks ties the same way as count_cooccurrence
+    vocabulary = index['vocabulary']
+    terms, first_seen, counts = np.unique(neighbor_ids, return_index=True, return_counts=True)
+    co_occurrence = Counter()
+    for i in np.argsort(first_seen):
+        neighbor, count = vocabulary[terms[i]], counts[i]
+        # Filter: Stop words and short words
+        if neighbor in stop_words or len(neighbor) < min_length:
+            continue
+        co_occurrence[tuple(sorted((target_word, neighbor)))] += int(count)
+    return co_occurrence
+
+def turns_containing(index, word):
+    """
+    Sorted ids of turns whose tokens contain `word` as a substring.
+    """
+    matches = [i for i, term in enumerate(index['vocabulary']) if word in term]
+    if not matches:
+        return np.array([], dtype=np.int64)
+    ptr = index['term_ptr']
+    positions = np.concatenate([index['order'][ptr[t]:ptr[t + 1]] for t in matches]).astype(np.int64)
+    return np.unique(np.searchsorted(index['turn_offsets'], positions, side='right') - 1)
+
+def kwic_turns(index, df_turns, word1, word2, limit=5):
+    """
+    Positions (in df_turns) of the first `limit` turns whose lowercased text contains
+    both words, as in check_kwic. Candidates come from the vocabulary/postings and are
+    confirmed on the raw text. Words with punctuation or spaces fall back to a scan.
+    """
+    word1, word2 = word1.lower(), word2.lower()
+    if not (word1.isalnum() and word2.isalnum()):
+        lowered = df_turns['content'].str.lower()
+        both = lowered.str.contains(word1) & lowered.str.contains(word2)
+        return np.flatnonzero(both.to_numpy())[:limit]
+
+    candidates = np.intersect1d(turns_containing(index, word1), turns_containing(index, word2))
+    contents = df_turns['content']
+    found = []
+    for turn in candidates:
+        text = contents.iat[turn].lower()
+        if word1 in text and word2 in text:
+            found.append(turn)
+            if len(found) == limit:
+                break
+    return np.array(found, dtype=np.int64)
@@ -0,0 +1,124 @@
+import functools
+import json
+import os
+import re
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Keyword families used by the rule-based classifiers in analysis.py.
+# Every family can be overridden from a JSON file ({"family": ["kw", ...]}),
+# see load_keyword_families.
+DEFAULT_KEYWORD_FAMILIES = {
+    # analyze_interactions
+    'delegation': ['automate', 'write this code', 'generate', 'draft'],
+    'collaboration': ['revise', 'change', 'update', 'not quite', 'better way'],
+    'foundation': ['starting point', 'template', 'idea', 'inspiration'],
+    # analyze_trust_issues
+    'error': ['wrong', 'incorrect', 'hallucinat', 'error', 'mistake', 'false'],
+    # analyze_future_outlook
+    'future': ['career', 'skill', 'future', 'replace', 'job', 'learn'],
+    # analyze_maturity_clusters
+    'refinement': ['change', 'wrong', 'mistake', 'revise', 'no', 'update'],
+    'tech': ['code', 'python', 'sql', 'data', 'function', 'api'],
+}
+
+KEYWORDS_CONFIG = os.environ.get("KEYWORDS_CONFIG", os.path.join("config", "keywords.json"))
+
+def load_keyword_families(path=None):
+    """
+    Returns the keyword families, with any family found in the JSON config
+    (default: config/keywords.json or $KEYWORDS_CONFIG) replacing the built-in list.
+    """
+    families = {name: list(keywords) for name, keywords in DEFAULT_KEYWORD_FAMILIES.items()}
+    path = path or KEYWORDS_CONFIG
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            families.update(json.load(f))
+    return families
+
+def can_overlap(a, b):
+    """
+    True if occurrences of two different keywords can overlap in a text.
+    """
+    if a in b or b in a:
+        return True
+    return any(b.startswith(a[i:]) for i in range(1, len(a))) or \
+        any(a.startswith(b[i:]) for i in range(1, len(b)))
+
+def compile_matcher(families):
+    """
+    Compiles every keyword family into as few combined regexes (alternations) as possible.
+
+    Counting an alternation's matches equals the sum of the per-keyword str.count()
+    values only if no two of its keywords can overlap, so each family is split into
+    groups of mutually non-overlapping keywords (usually one or two).
+    """
+    compiled = []
+    for name, keywords in families.items():
+        groups = []
+        for k in dict.fromkeys(kw.lower() for kw in keywords):
+            for group in groups:
+                if not any(can_overlap(k, other) for other in group):
+                    group.append(k)
+                    break
+            else:
+                groups.append([k])
+        # Keywords listed twice in a family count twice, as with str.count
+        repeats = [kw.lower() for kw in keywords]
+        for k in dict.fromkeys(repeats):
+            groups.extend([[k]] * (repeats.count(k) - 1))
+        compiled.append({
+            'name': name,
+            'keywords': repeats,
+            'patterns': ["|".join(re.escape(k) for k in group) for group in groups],
+        })
+    return compiled
+
+@functools.lru_cache(maxsize=None)
+def lowercase_mismatches():
+    """
+    RE2 character class of the characters pc.utf8_lower lowercases differently
+    from str.lower: other Unicode versions, multi-character mappings ('İ') and the
+    context-dependent final sigma ('Σ'). Every cased character is below U+20000.
+    """
+    chars = [chr(c) for c in range(0x20000) if not 0xD800 <= c < 0xE000 and c != 0x0A]
+    lowered = pc.utf8_lower(pa.array(["\n".join(chars)], type=pa.large_string()))[0].as_py().split("\n")
+    differ = [c for c, low in zip(chars, lowered) if c.lower() != low] + ["\u03a3"]
+    return "[" + "".join(f"\\x{{{ord(c):x}}}" for c in differ) + "]"
+
+def family_hits(texts, families=None, matcher=None):
+    """
+    Hit counts per keyword family for every text: the sum of text.lower().count(k)
+    over the family's keywords.
+
+    The texts are lowercased once as an Arrow array and each family is counted with
+    combined-regex Arrow (RE2) kernels over the whole column, so there is no per-text
+    Python loop: one pass per group of keywords that cannot overlap (see
+    compile_matcher), usually one per family. The few texts with characters that
+    Arrow lowercases differently from str.lower (lowercase_mismatches) are counted
+    with str.lower().count instead.
+
+    Returns:
+        pd.DataFrame: one row per text (same index if texts is a Series), one column per family.
+    """
+    if matcher is None:
+        matcher = compile_matcher(families or load_keyword_families())
+    index = texts.index if isinstance(texts, pd.Series) else None
+    array = pa.array(texts, type=pa.large_string())
+    lowered = pc.utf8_lower(array)
+    # Only non-ASCII texts can contain such characters
+    candidates = np.flatnonzero(~pc.string_is_ascii(array).fill_null(True).to_numpy(zero_copy_only=False))
+    matches = pc.match_substring_regex(array.take(candidates), lowercase_mismatches()).fill_null(False)
+    mismatched = {i: array[i].as_py().lower() for i in candidates[matches.to_numpy(zero_copy_only=False)]}
+
+    columns = {}
+    for family in matcher:
+        counts = np.zeros(len(lowered), dtype=np.int32)
+        for pattern in family['patterns']:
+            counts += pc.count_substring_regex(lowered, pattern).to_numpy().astype(np.int32)
+        for i, text in mismatched.items():
+            counts[i] = sum(text.count(k) for k in family['keywords'])
+        columns[family['name']] = counts
+    return pd.DataFrame(columns, index=index)
@@ -1,207 +1,501 @@
-import semantic_analysis
-import data_loader
-import preprocessor
-import analysis
-import comparative_analysis
-import portfolio_visuals
-import matplotlib.pyplot as plt
-import pandas as pd
-import networkx as nx
-import seaborn as sns
-
-def main():
-    # 1. Load Data
-    print("--- 1. Loading Data ---")
-    silhouette_score = 0.0
-    cluster_df = None
-    df = data_loader.load_data(split='workforce')
-    if df is None:
-        print("Failed to load data.")
-        return
+import argparse
+import functools
+import os
+import turn_cache
+import task_graph
+import instrumentation
+import stage_cache
 
-    # 2. Preprocessing
-    print("\n--- 2. Preprocessing & Segmentation ---")
-    # Clean raw text if needed (optional stage)
-    # df['text'] = df['text'].apply(preprocessor.clean_text)
-    
-    # Segment into turns
-    df_turns = preprocessor.process_dataframe(df)
-    print(f"Total turns extracted: {len(df_turns)}")
-    print(df_turns['role'].value_counts())
-    
-    # 3. Analysis
-    print("\n--- 3. Running Analysis ---")
-    
-    report_lines = ["# Analysis Report: Anthropic Interviewer (Workforce Split)"]
-    
-    # 3.1 Topics
+# Number of maturity clusters: an integer, or "auto" to sweep k=2..8 and pick the best
+N_CLUSTERS = os.environ.get("CLUSTER_K", "3")
+# Seed of the deep-dive transcript sample (the same transcripts every run)
+SAMPLE_SEED = int(os.environ.get("SAMPLE_SEED", "42"))
+
+# Report stages. Each stage is func(df_turns, inputs) -> dict with the stage's
+# 'lines' (its report section) plus any result later stages need; inputs holds the
+# results of the stages it depends on (see task_graph.py). Stages may run in
+# separate processes, so they share data through their results or the on-disk
+# caches/indexes only. A stage may also return 'rows_out' (rows it produced) for
+# the Run Profile section (see instrumentation.py), 'files' (the images/models it
+# wrote, restored with its cached result, see stage_cache.py) and 'error' (it
+# failed and must not be cached).
+#
+# Analysis and plotting modules (scikit-learn, networkx, matplotlib, seaborn) are
+# imported inside the stages that use them, under instrumentation.importing(), so a
+# run of a few stages only loads what those stages need and the Run Profile shows
+# the import time of each stage.
+
+def stage_tokens(df_turns, inputs, split='workforce'):
+    # Shared tokenization (token store) + positional index (postings) for the
+    # semantic network and KWIC lookups, persisted next to the turn cache so
+    # later stages just load them
+    with instrumentation.importing():
+        import inverted_index
+    inverted_index.get_index(split, df_turns)
+    return {'lines': []}
+
+def stage_keyword_hits(df_turns, inputs, split='workforce'):
+    # Keyword hit matrix shared by the rule-based classifiers (3.2 - 3.4, 3.6). It is
+    # written next to the turn cache and memory-mapped by the stages that use it
+    # (keyword_hits below) instead of being pickled into each of them.
+    with instrumentation.importing():
+        import analysis
+    hits = analysis.compute_keyword_hits(df_turns)
+    path = turn_cache.derived_path(split, 'hits')
+    try:
+        digest = turn_cache.write_derived(hits, path)
+    except OSError as e:
+        print(f"Could not write keyword hits: {e}")
+        path = digest = None
+    return {'lines': [], 'path': path, 'digest': digest, 'rows_out': len(hits)}
+
+def keyword_hits(df_turns, inputs):
+    """
+    The hit matrix of the keyword_hits stage, memory-mapped from its file
+    (recomputed if the file is gone or was rewritten since).
+    """
+    result = inputs['keyword_hits']
+    hits = turn_cache.read_derived(result['path'], result['digest'])
+    if hits is None:
+        import analysis
+        hits = analysis.compute_keyword_hits(df_turns)
+    return hits
+
+def stage_topics(df_turns, inputs, split='workforce'):
     print("\n[Topic Modeling]")
-    top_terms = analysis.analyze_topics_tfidf(df_turns)
-    report_lines.append("\n## 1. Topic & Use Case Analysis")
-    report_lines.append("Top TF-IDF Terms in User Prompts (Potential Tasks):")
-    report_lines.append(top_terms.to_markdown(index=False))
-    
-    # 3.2 Interactions
+    with instrumentation.importing():
+        import analysis
+        import term_index
+        import token_store
+    # Term counts are kept in a persistent index shared with the comparative analysis
+    tfidf_index = term_index.open_index()
+    store = token_store.get_store(split, df_turns)
+    top_terms = analysis.analyze_topics_tfidf(df_turns, index=tfidf_index, split=split, store=store)
+    lines = ["\n## 1. Topic & Use Case Analysis"]
+    lines.append("Top TF-IDF Terms in User Prompts (Potential Tasks):")
+    lines.append(top_terms.to_markdown(index=False))
+    return {'lines': lines, 'rows_out': len(top_terms)}
+
+def stage_interactions(df_turns, inputs, split='workforce'):
     print("\n[Interaction Patterns]")
-    interaction_stats = analysis.analyze_interactions(df_turns)
-    report_lines.append("\n## 2. Interaction Patterns")
-    report_lines.append("| interaction_type | count |")
-    report_lines.append("| --- | --- |")
+    with instrumentation.importing():
+        import analysis
+    interaction_stats = analysis.analyze_interactions(df_turns, hits=keyword_hits(df_turns, inputs))
+    lines = ["\n## 2. Interaction Patterns"]
+    lines.append("| interaction_type | count |")
+    lines.append("| --- | --- |")
     for k, v in interaction_stats.items():
-        report_lines.append(f"| {k} | {v} |")
-    
-    # 3.3 Trust
+        lines.append(f"| {k} | {v} |")
+    return {'lines': lines}
+
+def stage_trust(df_turns, inputs, split='workforce'):
     print("\n[Trust & Limitations]")
-    error_count, total = analysis.analyze_trust_issues(df_turns)
-    report_lines.append("\n## 3. Trust & Limitations")
-    report_lines.append(f"- **Total User Turns Analyzed**: {total}")
-    report_lines.append(f"- **Turns with Error/Hallucination Keywords**: {error_count}")
-    report_lines.append(f"- **Percentage**: {error_count/total*100:.2f}%")
-    future_mentions = analysis.analyze_future_outlook(df_turns)
-    report_lines.append("\n## 4. Future Outlook & Skills")
-    report_lines.append(f"Found {len(future_mentions)} mentions regarding career/skills/future.")
-    report_lines.append("\n### Sample Quotes (First 10):")
+    with instrumentation.importing():
+        import analysis
+    error_count, total = analysis.analyze_trust_issues(df_turns, hits=keyword_hits(df_turns, inputs))
+    lines = ["\n## 3. Trust & Limitations"]
+    lines.append(f"- **Total User Turns Analyzed**: {total}")
+    lines.append(f"- **Turns with Error/Hallucination Keywords**: {error_count}")
+    lines.append(f"- **Percentage**: {error_count/total*100:.2f}%")
+    return {'lines': lines}
+
+def stage_future(df_turns, inputs, split='workforce'):
+    with instrumentation.importing():
+        import analysis
+    future_mentions = analysis.analyze_future_outlook(df_turns, hits=keyword_hits(df_turns, inputs))
+    lines = ["\n## 4. Future Outlook & Skills"]
+    lines.append(f"Found {len(future_mentions)} mentions regarding career/skills/future.")
+    lines.append("\n### Sample Quotes (First 10):")
     for m in future_mentions[:10]:
         clean_m = m.replace('\n', ' ').strip()
-        report_lines.append(f"- > \"{clean_m}\"")
+        lines.append(f"- > \"{clean_m}\"")
+    return {'lines': lines}
 
+def stage_network(df_turns, inputs, split='workforce'):
     # --- ADVANCED ANALYSIS ---
     print("\n[Advanced Analysis]")
-    report_lines.append("\n## 5. Advanced Analysis (Diagnostic & Predictive)")
+    with instrumentation.importing():
+        import cooccurrence_matrix
+        import figure_render
+        import inverted_index
+        import semantic_analysis
+    lines = ["\n## 5. Advanced Analysis (Diagnostic & Predictive)"]
     
     # 3.5 Semantic Network
     print("Running Semantic Network Analysis...")
-    target_word = "satisfied" # User requested
-    
-    # Updated to use the new module
-    G = semantic_analysis.analyze_semantic_network(df_turns, target_word=target_word)
-    
-    # Visualization is now handled by the module
-    output_img = semantic_analysis.visualize_network(G, target_word, "output/semantic_network.png")
-    
-    report_lines.append(f"\n### 5.1 Semantic Network Analysis")
-    report_lines.append(f"Generated network graph centered around **'{target_word}'**.")
-    report_lines.append(f"![Semantic Network]({output_img})")
+    target_words = ["satisfied", "frustrated"] # User requested
+    postings_index = inverted_index.get_index(split, df_turns)
     
-    # --- Tambahan Data Kuantitatif ---
-    top_edges = semantic_analysis.get_top_connections(G, top_n=10)
-    print(f"\n[Top 10 Strongest Connections with '{target_word}']")
-    print(top_edges.to_string(index=False))
+    # Updated to use the new module: all target words share one pass over the corpus
+    graphs, network_edges = semantic_analysis.analyze_semantic_networks(df_turns, target_words, index=postings_index)
     
-    report_lines.append(top_edges.to_markdown(index=False))
+    # Visualization is now handled by the module (one image per target word); the
+    # images are rendered together with the semantic map at the end
+    figures = [semantic_analysis.network_figure(graphs[w], w, f"output/semantic_network_{split}_{w}.png") for w in target_words]
+    output_imgs = {w: spec['output'] for w, spec in zip(target_words, figures)}
     
+    lines.append(f"\n### 5.1 Semantic Network Analysis")
+    lines.append(f"Generated network graphs centered around {', '.join(f'**{w!r}**' for w in target_words)}.")
+    for target_word in target_words:
+        lines.append(f"\n#### '{target_word}'")
+        lines.append(f"![Semantic Network: {target_word}]({output_imgs[target_word]})")
+        
+        # --- Tambahan Data Kuantitatif ---
+        top_edges = network_edges[network_edges['Target'] == target_word].drop(columns='Target').head(10)
+        print(f"\n[Top 10 Strongest Connections with '{target_word}']")
+        print(top_edges.to_string(index=False))
+        
+        lines.append(top_edges.to_markdown(index=False))
+
+    # Corpus-wide map: every term against every term (global co-occurrence matrix)
+    counts = cooccurrence_matrix.get_matrix(split, df_turns, store=postings_index)
+    neighbours, map_edges = semantic_analysis.analyze_semantic_map(postings_index, target_words, counts=counts)
+    map_file = "output/semantic_map_edges.csv"
+    map_edges.to_csv(map_file, index=False)
+    lines.append(f"\n#### Corpus-wide Neighbours (PPMI)")
+    lines.append("Strongest associations of each word across the whole vocabulary (window co-occurrence, PPMI-weighted, pairs seen 3+ times).")
+    lines.append(neighbours.to_markdown(index=False, floatfmt=".3f"))
+    n_nodes = len(set(map_edges['source']) | set(map_edges['target']))
+    figures.append(semantic_analysis.semantic_map_figure(map_edges, "output/semantic_map.png"))
+    *_, map_img = figure_render.render_figures(figures)
+    lines.append(f"\nSemantic map of the most frequent terms ({n_nodes} nodes, {len(map_edges)} edges, top-5 neighbours each): `{map_file}`")
+    lines.append(f"![Semantic Map]({map_img})")
+    return {'lines': lines, 'rows_out': len(network_edges), 'files': list(output_imgs.values()) + [map_file, map_img]}
+
+def stage_clusters(df_turns, inputs, split='workforce'):
     # 3.6 Maturity Clusters
     print("Running Maturity Clustering...")
+    with instrumentation.importing():
+        import analysis
+        import clustering
+        import figure_render
+        import token_store
+        import pandas as pd
+    lines = []
+    files = []
+    error = None
+    persona = None
+    n_clusters = N_CLUSTERS if N_CLUSTERS == 'auto' else int(N_CLUSTERS)
     try:
-        cluster_df, centroids, feature_names, silhouette_score = analysis.analyze_maturity_clusters(df_turns, n_clusters=3)
+        store = token_store.get_store(split, df_turns)
+        cluster_df, centroids, feature_names, cluster_validity = analysis.analyze_maturity_clusters(
+            df_turns, n_clusters=n_clusters, hits=keyword_hits(df_turns, inputs), store=store)
     except Exception as e:
         print(f"Maturity clustering failed: {e}")
         cluster_df = None
-        silhouette_score = 0.0
+        cluster_validity = None
+        error = str(e)
     
     if cluster_df is not None:
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=cluster_df, x='x', y='y', hue='cluster', palette='viridis', style='cluster', s=100)
-        plt.title("AI Maturity Clusters (User Segmentation)")
-        plt.xlabel("PCA Component 1")
-        plt.ylabel("PCA Component 2")
-        plt.legend(title='Cluster')
-        plt.savefig("output/maturity_clusters.png", dpi=300)
-        plt.close()
+        figures = [clustering.clusters_figure(cluster_df, "output/maturity_clusters.png")]
+        files = ["output/maturity_clusters.png", clustering.MODEL_PATH]
         
-        report_lines.append(f"\n### 5.2 AI Maturity Matrix (Clustering)")
-        report_lines.append("Performed K-Means clustering (k=3) based on verbosity, complexity, refinement frequency, and technical terms.")
-        report_lines.append("![Maturity Clusters](maturity_clusters.png)")
+        lines.append(f"\n### 5.2 AI Maturity Matrix (Clustering)")
+        lines.append(f"Performed K-Means clustering (k={len(centroids)}) based on verbosity, complexity, refinement frequency, and technical terms.")
+        lines.append("![Maturity Clusters](maturity_clusters.png)")
+        
+        # k chosen automatically: show the sweep behind the choice
+        if 'k_sweep' in cluster_validity:
+            sweep = cluster_validity.pop('k_sweep')
+            figures.append(clustering.k_sweep_figure(sweep, "output/k_sweep.png", chosen_k=len(centroids)))
+            sweep_img = figures[-1]['output']
+            files.append(sweep_img)
+            lines.append(f"\n**k Selection:** k={len(centroids)} has the highest (sampled) silhouette among k={sweep['k'].min()}..{sweep['k'].max()}.")
+            lines.append(f"![k Sweep]({sweep_img})")
+            lines.append(sweep.to_markdown(index=False, floatfmt=("g", ".1f", ".3f", ".3f", ".3f", ".3f", ".1f")))
         
         # Describe clusters using centroids
-        report_lines.append("\n**Cluster Centroids (Average Feature Values):**")
+        lines.append("\n**Cluster Centroids (Average Feature Values):**")
         df_centroids = pd.DataFrame(centroids, columns=feature_names)
-        report_lines.append(df_centroids.to_markdown())
+        lines.append(df_centroids.to_markdown())
+        
+        # Per-cluster statistics and sampled transcripts, in one aggregation; they
+        # feed both the deep dive below and the persona card (stage_portfolio)
+        profiles, samples = analysis.cluster_profiles(df_turns, cluster_df, n_samples=5, seed=SAMPLE_SEED)
+        persona = analysis.persona_stats(profiles, cluster=1)
+        lines.append("\n**Cluster Profiles (Means per User):**")
+        lines.append(profiles.rename(columns={
+            'users': 'Users', 'avg_turns': 'Turns', 'avg_len': 'Avg Length', 'complexity': 'Complexity',
+            'refinement': 'Refinement', 'tech_score': 'Tech Score'}).to_markdown(
+            floatfmt=("g", "g", ".1f", ".0f", ".3f", ".1f", ".1f")))
+        figure_render.render_figures(figures)
 
         # --- DEEP DIVE: CLUSTER 1 (POWER USERS) ---
         print("\n[Deep Dive: Cluster 1 - The 'Power Users']")
-        report_lines.append(f"\n## 6. Deep Dive: Cluster 1 (The 'Skeptical Power Users')")
-        report_lines.append("Analyzing the 'High Technical / High Refinement' group to understand their behavior.")
-        
-        power_users = cluster_df[cluster_df['cluster'] == 1]['transcript_id'].unique()
-        import random
-        # Sample 5 users, or less if not enough
-        sample_size = min(5, len(power_users))
-        sample_ids = random.sample(list(power_users), sample_size)
+        lines.append(f"\n## 6. Deep Dive: Cluster 1 (The 'Skeptical Power Users')")
+        lines.append("Analyzing the 'High Technical / High Refinement' group to understand their behavior.")
         
-        report_lines.append(f"\n### Persona Profile: The Architect")
-        report_lines.append(f"> **Archetype**: Users who tend to write long, complex prompts and frequently correct the AI until they get exactly what they want.")
+        lines.append(f"\n### Persona Profile: The Architect")
+        lines.append(f"> **Archetype**: Users who tend to write long, complex prompts and frequently correct the AI until they get exactly what they want.")
         
-        for i, tid in enumerate(sample_ids, 1):
-            report_lines.append(f"\n#### Sample Case {i} (Transcript ID: `{tid}`)")
-            subset = df_turns[df_turns['transcript_id'] == tid]
-            user_msgs = subset[subset['role'] == 'user']['content'].tolist()
-            if user_msgs:
-                first_msg = user_msgs[0].strip()
+        # Up to 5 sampled users of the cluster (seeded, see analysis.cluster_profiles)
+        power_samples = samples[samples['cluster'] == 1]
+        for i, sample in enumerate(power_samples.itertuples(index=False), 1):
+            lines.append(f"\n#### Sample Case {i} (Transcript ID: `{sample.transcript_id}`)")
+            if isinstance(sample.intent, str):
+                first_msg = sample.intent.strip()
                 preview = first_msg[:300] + "..." if len(first_msg) > 300 else first_msg
-                report_lines.append(f"**User Intent**: \"{preview}\"")
-                report_lines.append(f"- **Total Turns**: {len(subset)}")
-                report_lines.append(f"- **Refinement Count**: {subset['content'].str.contains('no|change|wrong|better', case=False).sum()}")
+                lines.append(f"**User Intent**: \"{preview}\"")
+                lines.append(f"- **Total Turns**: {sample.turns}")
+                lines.append(f"- **Refinement Count**: {sample.refinements}")
+    return {'lines': lines, 'cluster_validity': cluster_validity, 'persona': persona,
+            'rows_out': len(cluster_df) if cluster_df is not None else 0,
+            'files': [f for f in files if os.path.exists(f)], 'error': error}
 
+def stage_comparative(df_turns, inputs, split='workforce'):
     # --- COMPARATIVE ANALYSIS ---
     print("\n[Comparative Analysis]")
+    with instrumentation.importing():
+        import comparative_analysis
+    lines = []
     comp_df = None
+    files = []
+    error = None
     try:
-        comp_df, comp_img = comparative_analysis.run_comparative_analysis()
+        # The analysed split was already added to the term index by stage_topics;
+        # its turns are passed in so that it is not loaded again
+        comp_df, comp_img = comparative_analysis.run_comparative_analysis(preloaded={split: df_turns})
         if comp_df is not None:
-             report_lines.append(f"\n## 7. Comparative Analysis (Workforce vs Creatives vs Scientists)")
-             report_lines.append("Comparison of top themes across different user professions.")
-             report_lines.append(f"![Comparative Topics]({comp_img})")
-             report_lines.append("\n**Top Topics Data:**")
-             report_lines.append(comp_df.to_markdown(index=False))
+             lines.append(f"\n## 7. Comparative Analysis (Workforce vs Creatives vs Scientists)")
+             lines.append("Comparison of top themes across different user professions.")
+             lines.append(f"![Comparative Topics]({comp_img})")
+             files.append(comp_img)
+             lines.append("\n**Top Topics Data:**")
+             lines.append(comp_df.to_markdown(index=False))
     except Exception as e:
         print(f"comparative analysis failed: {e}")
+        error = str(e)
+    return {'lines': lines, 'comp_df': comp_df, 'rows_out': len(comp_df) if comp_df is not None else 0,
+            'files': files, 'error': error}
 
+def stage_validation(df_turns, inputs, split='workforce'):
     # --- MODEL VALIDATION ---
     print("\n[Model Validation]")
+    with instrumentation.importing():
+        import inverted_index
+        import semantic_analysis
     
-    # Check if silhouette_score is defined (it should be if clustering ran)
-    if 'silhouette_score' not in locals() or silhouette_score is None:
-        silhouette_score = 0.0
-
-    print(f"Silhouette Score: {silhouette_score:.3f}")
+    # Validity metrics are only there if clustering ran
+    cluster_validity = inputs['clusters']['cluster_validity']
+    if cluster_validity is not None and cluster_validity['sample_size']:
+        print(f"Silhouette Score: {cluster_validity['silhouette']:.3f}")
     
     # 2. Semantic Accuracy
-    kwic_samples = semantic_analysis.check_kwic(df_turns, "satisfied", "results", limit=2)
+    postings_index = inverted_index.get_index(split, df_turns)
+    kwic_samples = semantic_analysis.check_kwic(df_turns, "satisfied", "results", limit=2, index=postings_index)
     
-    report_lines.append(f"\n## 8. Model Validation Strategy")
-    report_lines.append(f"### 8.1 Clustering Validity")
-    report_lines.append(f"- **Silhouette Score**: `{silhouette_score:.3f}`")
-    report_lines.append(f"> *Interpretation*: A score above 0.3 indicates fair structure with natural overlap.")
+    lines = [f"\n## 8. Model Validation Strategy"]
+    lines.append(f"### 8.1 Clustering Validity")
+    if cluster_validity is None:
+        lines.append("- Clustering did not run, no validity metrics.")
+    elif cluster_validity['sample_size'] == 0:
+        reason = "one cluster" if cluster_validity['n_clusters'] < 2 else "one cluster per user"
+        lines.append(f"- **Silhouette Score**: undefined ({reason})")
+    else:
+        low, high = cluster_validity['silhouette_ci']
+        if cluster_validity['sample_size'] < cluster_validity['n']:
+            sampled = (f"estimated from {cluster_validity['sample_size']} of {cluster_validity['n']} users, "
+                       f"{cluster_validity['confidence']:.0%} CI `{low:.3f}` - `{high:.3f}`")
+        else:
+            sampled = f"exact, all {cluster_validity['n']} users"
+        lines.append(f"- **Silhouette Score**: `{cluster_validity['silhouette']:.3f}` ({sampled})")
+        if cluster_validity['davies_bouldin'] is not None:
+            lines.append(f"- **Davies-Bouldin Index**: `{cluster_validity['davies_bouldin']:.3f}` (lower is better)")
+            lines.append(f"- **Calinski-Harabasz Index**: `{cluster_validity['calinski_harabasz']:.1f}` (higher is better)")
+        lines.append(f"> *Interpretation*: A silhouette above 0.3 indicates fair structure with natural overlap.")
     
-    report_lines.append(f"\n### 8.2 Semantic Accuracy (KWIC)")
-    report_lines.append(f"Verified context for connection **'satisfied' + 'results'**:")
+    lines.append(f"\n### 8.2 Semantic Accuracy (KWIC)")
+    lines.append(f"Verified context for connection **'satisfied' + 'results'**:")
     for sample in kwic_samples:
-        report_lines.append(f"- > \"{sample}\"")
+        lines.append(f"- > \"{sample}\"")
         
-    report_lines.append(f"\n### 8.3 Reliability")
-    report_lines.append(f"- **Reproducibility**: Parameter `random_state=42` enforced.")
+    lines.append(f"\n### 8.3 Reliability")
+    lines.append(f"- **Reproducibility**: Parameter `random_state=42` enforced.")
+    return {'lines': lines}
 
+def stage_portfolio(df_turns, inputs, split='workforce'):
     # --- KEY INSIGHTS (PORTFOLIO SLIDE) ---
     print("\n[Generating Portfolio Visuals]")
+    with instrumentation.importing():
+        import figure_render
+        import portfolio_visuals
     # 1. Comparative Chart
-    chart_file = portfolio_visuals.generate_comparative_chart(comp_df, "output/portfolio_comparison.png")
+    chart = portfolio_visuals.comparative_chart_figure(inputs['comparative']['comp_df'], "output/portfolio_comparison.png")
     
     # 2. Persona Card
-    # We pass dummy logic since the function just draws texts, but in a real scenario we'd pass stats
-    persona_file = portfolio_visuals.generate_persona_card(None, "output/portfolio_persona.png")
+    # Figures of Cluster 1 from the clustering stage (the study's figures if it failed)
+    persona = portfolio_visuals.persona_card_figure(inputs['clusters']['persona'], "output/portfolio_persona.png")
+    chart_file, persona_file = figure_render.render_figures([chart, persona])
     
-    report_lines.append(f"\n## 9. Key Insights (Portfolio Slide)")
-    report_lines.append("Visual summary for stakeholder presentation.")
+    lines = [f"\n## 9. Key Insights (Portfolio Slide)"]
+    lines.append("Visual summary for stakeholder presentation.")
     if chart_file:
-         report_lines.append(f"![Comparative Chart]({chart_file})")
+         lines.append(f"![Comparative Chart]({chart_file})")
     if persona_file:
-         report_lines.append(f"![Persona Card]({persona_file})")
+         lines.append(f"![Persona Card]({persona_file})")
+    return {'lines': lines, 'files': [f for f in (chart_file, persona_file) if f]}
+
+# Stage graph: {name: (func, dependencies)}. The report is assembled in this order,
+# whatever order the stages finish in.
+STAGES = {
+    'tokens': (stage_tokens, []),
+    'topics': (stage_topics, ['tokens']),
+    'keyword_hits': (stage_keyword_hits, []),
+    'interactions': (stage_interactions, ['keyword_hits']),
+    'trust': (stage_trust, ['keyword_hits']),
+    'future': (stage_future, ['keyword_hits']),
+    'network': (stage_network, ['tokens']),
+    'clusters': (stage_clusters, ['keyword_hits', 'tokens']),
+    # Updates the same term index as 'topics', so it waits for it
+    'comparative': (stage_comparative, ['topics']),
+    'validation': (stage_validation, ['clusters', 'tokens']),
+    'portfolio': (stage_portfolio, ['comparative', 'clusters']),
+}
+
+# Other names accepted by --stages
+STAGE_ALIASES = {
+    'tfidf': 'topics',
+    'keywords': 'keyword_hits',
+    'semantic': 'network',
+    'clustering': 'clusters',
+}
+
+REPORT_PATH = os.path.join("docs", "analysis_report_generated.md")
+
+def select_stages(names=None):
+    """
+    The requested stages (aliases allowed) plus everything they depend on, in STAGES order.
+    Raises ValueError for unknown names.
+    """
+    if not names:
+        return list(STAGES)
+    wanted = [STAGE_ALIASES.get(name, name) for name in names]
+    unknown = [name for name in wanted if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages: {unknown} (available: {', '.join(STAGES)})")
+    needed, todo = set(), list(wanted)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(STAGES[name][1])
+    return [name for name in STAGES if name in needed]
+
+def build_stages(split='workforce', names=None):
+    """
+    Task graph (see task_graph.py) of the selected stages, bound to one split.
+    """
+    return {name: (functools.partial(STAGES[name][0], split=split), STAGES[name][1])
+            for name in select_stages(names)}
 
-    with open("docs/analysis_report_generated.md", "w", encoding="utf-8") as f:
+def main(stages=None, split='workforce', output=REPORT_PATH, startup_import_s=None, refresh=False):
+    """
+    Runs the selected report stages (default: all) on one split and writes the report.
+    Stages whose code, parameters and input data did not change since a previous run
+    are taken from the stage cache (see stage_cache.py) unless refresh is set.
+    """
+    tasks = build_stages(split, stages)
+    if startup_import_s is not None:
+        print(f"Startup imports: {startup_import_s:.2f}s")
+        instrumentation.RECORDS.append({'name': 'startup imports', 'kind': 'imports', 'stage': None,
+                                        'wall_s': startup_import_s, 'pid': os.getpid()})
+
+    # 0. Memoized stages
+    with instrumentation.measure('stage cache') as record:
+        keys = stage_cache.task_keys(tasks, turn_cache.cache_key(split))
+        cached = {} if refresh else stage_cache.load_results(tasks, keys)
+        record['rows_out'] = len(cached)
+    for name in cached:
+        instrumentation.RECORDS.append({'name': name, 'kind': 'cached', 'stage': name, 'key': keys[name]})
+    if cached:
+        print(f"Stages unchanged since the last run (from cache): {', '.join(cached)}")
+    if len(cached) == len(tasks):
+        # Nothing to recompute: the turns are not even loaded
+        return write_report(tasks, cached, split, stages, output)
+
+    # 1. Load Data
+    print("--- 1. Loading Data ---")
+    # Load + segment in one step: warm runs memory-map the cached turns
+    # instead of downloading and segmenting again (see turn_cache.py).
+    # Clean raw text if needed (optional stage)
+    # df['text'] = df['text'].apply(preprocessor.clean_text)
+    with instrumentation.measure('load') as record:
+        df_turns = turn_cache.get_turns(split=split)
+        record['rows_out'] = len(df_turns) if df_turns is not None else 0
+    if df_turns is None:
+        print("Failed to load data.")
+        return
+
+    # 2. Preprocessing
+    print("\n--- 2. Preprocessing & Segmentation ---")
+    print(f"Total turns extracted: {len(df_turns)}")
+    print(df_turns['role'].value_counts())
+    
+    # 3. Analysis
+    # Independent stages run in parallel; workers memory-map the same turn cache file
+    print("\n--- 3. Running Analysis ---")
+    results = task_graph.run_tasks(tasks, df_turns, turns_path=turn_cache.cache_path(split), done=cached)
+    # Keyed on the indexes as the stages left them (the next run's keys, see stage_cache.py)
+    keys = stage_cache.task_keys(tasks, turn_cache.cache_key(split))
+    stage_cache.save_results(results, keys, skip=cached)
+    write_report(tasks, results, split, stages, output)
+
+def write_report(tasks, results, split, stages, output):
+    """
+    Assembles the report from the stage results (in STAGES order) plus the Run Profile.
+    """
+    # Sections of the requested stages only (their dependencies ran, but are not reported)
+    requested = set(tasks) if not stages else {STAGE_ALIASES.get(name, name) for name in stages}
+    report_lines = [f"# Analysis Report: Anthropic Interviewer ({split.title()} Split)"]
+    for name in tasks:
+        if name in requested:
+            report_lines.extend(results[name]['lines'])
+
+    # Run Profile: per-stage timings/memory, also appended to the JSONL run log
+    records = instrumentation.RECORDS
+    report_lines.extend(instrumentation.profile_table(records))
+    print(f"Run log: {instrumentation.write_run_log(records)}")
+    instrumentation.keep_slowest_profile(records)
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
         f.write("\n".join(report_lines))
     
-    print("\n--- Analysis Complete. Report saved to analysis_report_generated.md ---")
+    print(f"\n--- Analysis Complete. Report saved to {output} ---")
+
+def cli(argv=None, startup_import_s=None):
+    """
+    Command line entry point (python -m src ... / python src/main.py ...).
+    Without a command, all stages are run on the workforce split.
+    """
+    parser = argparse.ArgumentParser(prog="python -m src", description="Anthropic Interviewer analysis")
+    commands = parser.add_subparsers(dest="command")
+    run = commands.add_parser("run", help="run report stages")
+    run.add_argument("--stages", default=None,
+                     help="comma-separated stages (default: all); dependencies are added automatically")
+    run.add_argument("--split", default="workforce", help="dataset split to analyse")
+    run.add_argument("--output", default=REPORT_PATH, help="report file")
+    run.add_argument("--refresh", action="store_true", help="recompute every stage instead of using the stage cache")
+    commands.add_parser("stages", help="list the stages and their dependencies")
+    args = parser.parse_args(argv)
+
+    if args.command == "stages":
+        aliases = {}
+        for alias, name in STAGE_ALIASES.items():
+            aliases.setdefault(name, []).append(alias)
+        for name, (_, deps) in STAGES.items():
+            also = f" (alias: {', '.join(aliases[name])})" if name in aliases else ""
+            print(f"{name}{also} <- {', '.join(deps) or '-'}")
+        return
+    if args.command is None:
+        return main(startup_import_s=startup_import_s)
+
+    stages = [name.strip() for name in args.stages.split(",") if name.strip()] if args.stages else None
+    try:
+        select_stages(stages)
+    except ValueError as e:
+        parser.error(str(e))
+    main(stages=stages, split=args.split, output=args.output, startup_import_s=startup_import_s, refresh=args.refresh)
 
 if __name__ == "__main__":
-    main()
+    cli()
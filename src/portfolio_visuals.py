@@ -1,20 +1,38 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-import pandas as pd
+import figure_render
 
-def generate_comparative_chart(top_terms_df, output_file="portfolio_comparison.png"):
+# Portfolio slide images, drawn by figure_render.py (matplotlib and seaborn are
+# imported by the draw functions, in the rendering process).
+
+def comparative_chart_figure(top_terms_df, output_file="portfolio_comparison.png"):
     """
-    Generates a Horizontal Bar Chart comparing Top 3 Keywords across roles.
-    Input: top_terms_df (DataFrame with columns 'term', 'rank', 'Category')
+    Figure spec of the comparative chart, or None without data.
     """
     if top_terms_df is None or top_terms_df.empty:
         return None
         
     # Extract Top 3 Unique Keywords per Category
     # Logic: For each category, get top 3 terms based on 'rank' (score)
-    top_3 = top_terms_df.groupby('Category').apply(lambda x: x.nlargest(3, 'rank')).reset_index(drop=True)
-    
-    plt.figure(figsize=(10, 6))
+    # (stable sort: ties keep their order, as nlargest does)
+    top_3 = top_terms_df.sort_values(['Category', 'rank'], ascending=[True, False], kind='stable')
+    top_3 = top_3.groupby('Category').head(3).reset_index(drop=True)
+    return figure_render.figure('portfolio_comparison', output_file, {'top_3': top_3[['Category', 'term', 'rank']]},
+                                bbox_inches='tight')
+
+def generate_comparative_chart(top_terms_df, output_file="portfolio_comparison.png"):
+    """
+    Generates a Horizontal Bar Chart comparing Top 3 Keywords across roles.
+    Input: top_terms_df (DataFrame with columns 'term', 'rank', 'Category')
+    """
+    return figure_render.render_figure(comparative_chart_figure(top_terms_df, output_file))
+
+def draw_comparative_chart(data, style):
+    """
+    Figure kind 'portfolio_comparison' (see figure_render.py). data: {'top_3': DataFrame}
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    top_3 = data['top_3']
+    fig = plt.figure(figsize=(10, 6))
     
     # We want a grouped bar chart where y-axis is Category, x-axis is keywords?
     # No, user asked: Y Label = Workforce, Creatives... X Label = Top Keywords.
@@ -39,15 +57,49 @@ def generate_comparative_chart(top_terms_df, output_file="portfolio_comparison.p
     plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', title="Top Keywords")
     
     plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    return output_file
+    return fig
+
+def persona_card_figure(cluster_stats, output_file="portfolio_persona.png"):
+    return figure_render.figure('persona_card', output_file, {'texts': persona_texts(cluster_stats)}, bbox_inches='tight')
+
+def persona_texts(cluster_stats):
+    """
+    Metric texts of the card: {avg_len, avg_len_note, refinement, refinement_note}.
+    Without stats, the figures of the original study are shown.
+    """
+    if not cluster_stats:
+        return {'avg_len': "1,095 chars", 'avg_len_note': "(vs 522 avg)",
+                'refinement': "High (26x)", 'refinement_note': "(vs Low for others)"}
+    others = cluster_stats['refinement_others']
+    if others > 0:
+        ratio = cluster_stats['refinement'] / others
+        level = "High" if ratio >= 1.5 else "Low" if ratio <= 1 / 1.5 else "Similar"
+        ratio_text = f" ({ratio:.0f}x)" if ratio >= 10 else f" ({ratio:.1f}x)"
+    else:
+        # No ratio without refinements outside cluster 1 (0 vs 0 is no difference)
+        level, ratio_text = ("High" if cluster_stats['refinement'] > 0 else "Similar"), ""
+    return {
+        'avg_len': f"{cluster_stats['avg_len']:,.0f} chars",
+        'avg_len_note': f"(vs {cluster_stats['avg_len_all']:,.0f} avg)",
+        'refinement': f"{level}{ratio_text}",
+        'refinement_note': f"({cluster_stats['refinement']:.1f} vs {others:.1f} hits per user)",
+    }
 
 def generate_persona_card(cluster_stats, output_file="portfolio_persona.png"):
     """
     Generates a visual 'Persona Card' for Cluster 1 (The Architect).
-    cluster_stats: dict/list containing [avg_len, refinement_rate, ...]
+    cluster_stats: dict from analysis.persona_stats (avg_len, avg_len_all,
+    refinement, refinement_others), or None for the original study's figures.
+    A card whose figures did not change is copied from the figure cache.
+    """
+    return figure_render.render_figure(persona_card_figure(cluster_stats, output_file))
+
+def draw_persona_card(data, style):
     """
+    Figure kind 'persona_card' (see figure_render.py). data: {'texts': persona_texts(...)}
+    """
+    import matplotlib.pyplot as plt
+    texts = data['texts']
     # Create a blank figure
     fig, ax = plt.subplots(figsize=(8, 5))
     ax.set_facecolor('#f8f9fa') # Light gray bg
@@ -71,19 +123,16 @@ def generate_persona_card(cluster_stats, output_file="portfolio_persona.png"):
     # Metrics
     # Avg Length
     ax.text(0.25, 0.6, "AVG PROMPT LENGTH", transform=ax.transAxes, ha='center', fontsize=8, color='gray')
-    ax.text(0.25, 0.5, "1,095 chars", transform=ax.transAxes, ha='center', fontsize=18, fontweight='bold', color='#e74c3c')
-    ax.text(0.25, 0.42, "(vs 522 avg)", transform=ax.transAxes, ha='center', fontsize=8, color='gray')
+    ax.text(0.25, 0.5, texts['avg_len'], transform=ax.transAxes, ha='center', fontsize=18, fontweight='bold', color='#e74c3c')
+    ax.text(0.25, 0.42, texts['avg_len_note'], transform=ax.transAxes, ha='center', fontsize=8, color='gray')
     
     # Refinement
     ax.text(0.75, 0.6, "REFINEMENT RATE", transform=ax.transAxes, ha='center', fontsize=8, color='gray')
-    ax.text(0.75, 0.5, "High (26x)", transform=ax.transAxes, ha='center', fontsize=18, fontweight='bold', color='#2980b9')
-    ax.text(0.75, 0.42, "(vs Low for others)", transform=ax.transAxes, ha='center', fontsize=8, color='gray')
+    ax.text(0.75, 0.5, texts['refinement'], transform=ax.transAxes, ha='center', fontsize=18, fontweight='bold', color='#2980b9')
+    ax.text(0.75, 0.42, texts['refinement_note'], transform=ax.transAxes, ha='center', fontsize=8, color='gray')
     
     # Behavior Description
     ax.text(0.5, 0.25, '"Iterates constantly until output is perfect."', 
             transform=ax.transAxes, ha='center', va='center', 
             fontsize=12, style='italic', bbox=dict(facecolor='#ecf0f1', edgecolor='none', pad=10))
-            
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    return output_file
+    return fig
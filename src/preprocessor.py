@@ -1,18 +1,10 @@
+import functools
 import re
+import numpy as np
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-
-# Download necessary NLTK data (if not already present, handled in main usually, but safe to include)
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    nltk.download('punkt')
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+import pyarrow as pa
+import pyarrow.compute as pc
+from stopword_lists import SKLEARN_ENGLISH as ENGLISH_STOP_WORDS
 
 def clean_text(text):
     """
@@ -28,11 +20,132 @@ def clean_text(text):
     text = text.lower()
     return text
 
+# Characters tokenize_words drops
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+def tokenize_words(text):
+    """
+    Word tokenization used by the semantic network / KWIC tooling:
+    lowercase, drop punctuation, split on whitespace.
+    """
+    return PUNCTUATION.sub('', text.lower()).split()
+
+def is_tfidf_term(token):
+    """
+    TF-IDF keeps tokens of 2+ characters that are not English stop words
+    (the filtering TfidfVectorizer(stop_words='english') applies).
+    """
+    return len(token) > 1 and token not in ENGLISH_STOP_WORDS
+
+def tfidf_tokens(text):
+    """
+    Analyzer for the TF-IDF vectorizers, consistent with token_store.
+    """
+    return [t for t in tokenize_words(text) if is_tfidf_term(t)]
+
+def count_tokens(text):
+    """
+    Number of tokenize_words tokens of a text (lowercasing does not change the count).
+    """
+    return len(PUNCTUATION.sub('', text).split())
+
+# count_tokens over many strings at once, on their UTF-8 bytes: a token is a
+# whitespace-separated chunk with at least one word character. Every character is
+# WORD (re's \w), SPACE (str.isspace()) or OTHER (dropped by PUNCTUATION), read
+# from a table built with re itself so both always agree. Strings with characters
+# outside the BMP (emoji, rare scripts) are left to count_tokens.
+OTHER, WORD, SPACE = 0, 1, 2
+# UTF-8 bytes per batch in token_counts (bounds its temporary arrays)
+TOKEN_BATCH_BYTES = 1 << 24
+
+@functools.lru_cache(maxsize=None)
+def char_classes():
+    """
+    OTHER/WORD/SPACE class of every BMP code point (uint8 array).
+    """
+    chars = ''.join(map(chr, range(0x10000)))
+    word = re.sub(r'\w', chr(WORD), re.sub(r'\W', chr(OTHER), chars))
+    space = re.sub(r'\s', chr(SPACE), re.sub(r'\S', chr(OTHER), chars))
+    return np.frombuffer(word.encode('latin-1'), dtype=np.uint8) | np.frombuffer(space.encode('latin-1'), dtype=np.uint8)
+
+def token_counts(strings):
+    """
+    count_tokens of every string of an Arrow string array without nulls (as int64 array).
+    """
+    offset_type = np.int64 if pa.types.is_large_string(strings.type) else np.int32
+    offsets = np.frombuffer(strings.buffers()[1], dtype=offset_type)[strings.offset:strings.offset + len(strings) + 1]
+    if len(strings) == 0 or offsets[-1] == offsets[0]:
+        return np.zeros(len(strings), dtype=np.int64)
+    data = np.frombuffer(strings.buffers()[2], dtype=np.uint8)
+    counts = np.zeros(len(strings), dtype=np.int64)
+    start = 0
+    while start < len(strings):
+        end = max(start + 1, int(np.searchsorted(offsets, offsets[start] + TOKEN_BATCH_BYTES, side='right')) - 1)
+        counts[start:end] = utf8_token_counts(data[offsets[start]:offsets[end]], offsets[start:end + 1] - offsets[start])
+        start = end
+    rest = np.flatnonzero(counts < 0)
+    if len(rest):
+        counts[rest] = [count_tokens(text) for text in strings.take(rest).to_pylist()]
+    return counts
+
+def utf8_token_counts(data, offsets):
+    """
+    Tokens of the strings data[offsets[i]:offsets[i + 1]] of a UTF-8 byte array,
+    -1 for strings with characters outside the BMP.
+    """
+    classes = char_classes()
+    # ASCII bytes are their own code points; the bytes of other characters are set below
+    byte_class = classes[:0x100][data]
+    high = np.flatnonzero(data >= 0x80)
+    counts_unknown = np.zeros(0, dtype=np.int64)
+    if len(high):
+        lead = high[data[high] >= 0xC0]
+        b0 = data[lead].astype(np.int64)
+        b1 = data[lead + 1].astype(np.int64) & 0x3F
+        b2 = data[np.minimum(lead + 2, len(data) - 1)].astype(np.int64) & 0x3F
+        code = np.where(b0 < 0xE0, ((b0 & 0x1F) << 6) | b1, ((b0 & 0x0F) << 12) | (b1 << 6) | b2)
+        lead_class = classes[np.minimum(code, 0xFFFF)]
+        # Every byte of a character takes its class
+        byte_class[high] = lead_class[np.searchsorted(lead, high, side='right') - 1]
+        counts_unknown = np.searchsorted(offsets, lead[b0 >= 0xF0], side='right') - 1
+
+    # Chunks start at a non-space byte following whitespace or the start of a string
+    space = byte_class == SPACE
+    after_space = np.empty(len(data), dtype=bool)
+    after_space[0] = True
+    after_space[1:] = space[:-1]
+    after_space[offsets[:-1][offsets[:-1] < len(data)]] = True
+    starts = np.flatnonzero(after_space & ~space)
+    # Bytes between two chunk starts belong to the first chunk (or are whitespace)
+    has_word = np.logical_or.reduceat(byte_class == WORD, starts) if len(starts) else np.zeros(0, dtype=bool)
+    tokens_before = np.concatenate([[0], np.cumsum(has_word)])
+    counts = np.diff(tokens_before[np.searchsorted(starts, offsets)])
+    counts[counts_unknown] = -1
+    return counts
+
+# Columns of df_turns. Besides role/content/transcript_id, segmentation emits per turn:
+#   turn_id           - ordinal of the turn within its transcript (0, 1, ...)
+#   length            - characters of the content
+#   n_tokens          - tokenize_words tokens of the content
+#   prev_assistant_id - turn_id of the last assistant turn before it (-1 if none)
+#   byte_start/end    - UTF-8 byte offsets of the content in the original transcript
+TURN_META_COLUMNS = ['turn_id', 'length', 'n_tokens', 'prev_assistant_id', 'byte_start', 'byte_end']
+TURN_COLUMNS = ['role', 'content', 'transcript_id'] + TURN_META_COLUMNS
+
+def empty_turns():
+    """
+    df_turns without rows (string columns, int32 metadata).
+    """
+    return pd.DataFrame({column: pd.Series(dtype=np.int32 if column in TURN_META_COLUMNS else str)
+                         for column in TURN_COLUMNS})
+
 def segment_dialogue(transcript):
     """
     Parses a single transcript into turns.
     Assumes format 'User: ... Assistant: ...' or similar.
-    Returns a list of dicts: [{'role': 'user', 'content': '...'}, {'role': 'assistant', 'content': '...'}]
+    Returns a list of dicts: [{'role': 'user', 'content': '...', 'turn_id': 0, ...}, ...]
+    with the metadata of TURN_META_COLUMNS.
+    process_dataframe applies the same rules to whole columns; keep the two in sync.
     """
     if not isinstance(transcript, str):
         return []
@@ -47,24 +160,150 @@ def segment_dialogue(transcript):
     
     turns = []
     current_role = None
+    last_assistant = -1
+    byte_pos = 0
     
-    for part in parts:
-        part = part.strip()
+    for raw_part in parts:
+        part = raw_part.strip()
         if part == "User:":
             current_role = "user"
         elif part == "Assistant:":
             current_role = "assistant"
         elif part and current_role:
+            leading = raw_part[:len(raw_part) - len(raw_part.lstrip())]
+            byte_start = byte_pos + len(leading.encode("utf-8"))
             turns.append({
                 'role': current_role,
-                'content': part
+                'content': part,
+                'turn_id': len(turns),
+                'length': len(part),
+                'n_tokens': count_tokens(part),
+                'prev_assistant_id': last_assistant,
+                'byte_start': byte_start,
+                'byte_end': byte_start + len(part.encode("utf-8")),
             })
+            if current_role == "assistant":
+                last_assistant = len(turns) - 1
+        byte_pos += len(raw_part.encode("utf-8"))
             
     return turns
 
+# Speaker markers used by segment_dialogue, and the role each one opens.
+MARKER_PATTERN = r'(User:|Assistant:)'
+ROLE_MARKERS = {'User:': 'user', 'Assistant:': 'assistant'}
+
 def process_dataframe(df):
     """
     Applies segmentation to the entire dataframe.
+    Column-at-a-time version of segment_dialogue: every transcript is split on the
+    speaker markers at once, the pieces are exploded into one row each and the role
+    of each piece is carried forward from the last marker of the same transcript.
+    The turn metadata (TURN_META_COLUMNS) is derived from the same pieces as int32
+    columns. Produces the same turns as process_dataframe_iterrows.
+    """
+    if df.empty:
+        return empty_turns()
+
+    if 'text' in df.columns:
+        texts = df['text'].reset_index(drop=True).astype(object)
+        # Non-string transcripts (None/NaN) produce no turns, like segment_dialogue
+        texts = texts.where(texts.map(lambda t: isinstance(t, str)), '')
+    else:
+        texts = pd.Series('', index=range(len(df)), dtype=object)
+    if 'transcript_id' in df.columns:
+        transcript_ids = df['transcript_id'].to_numpy()
+    else:
+        transcript_ids = np.full(len(df), 'unknown', dtype=object)
+
+    raw_parts = texts.str.split(MARKER_PATTERN, regex=True).explode()
+    row = raw_parts.index.to_numpy()
+    raw_parts = raw_parts.reset_index(drop=True)
+    parts = raw_parts.str.strip()
+
+    # Byte offset of every piece in its transcript (pieces of a transcript are adjacent)
+    raw_bytes = utf8_lengths(as_arrow(raw_parts))
+    piece_start = np.cumsum(raw_bytes) - raw_bytes
+    piece_start -= np.repeat(piece_start[first_rows(row, len(texts))], np.bincount(row, minlength=len(texts)))
+
+    # Role opened by each marker piece (None for content pieces)
+    role = np.full(len(parts), None, dtype=object)
+    is_marker = np.zeros(len(parts), dtype=bool)
+    for marker, marker_role in ROLE_MARKERS.items():
+        hit = (parts == marker).to_numpy()
+        role[hit] = marker_role
+        is_marker |= hit
+
+    # Carry the last marker forward, but only within the same transcript
+    last_marker = pd.Series(np.arange(len(parts)), dtype=float).where(is_marker).ffill()
+    seen_marker = last_marker.notna().to_numpy()
+    last_marker = last_marker.fillna(0).to_numpy(dtype=np.int64)
+    has_role = seen_marker & (row[last_marker] == row)
+    role = role[last_marker]
+
+    keep = has_role & ~is_marker & (parts != '').to_numpy()
+    content = parts[keep]
+    role = role[keep]
+    row = row[keep]
+
+    # Ordinal within the transcript, and the last assistant turn strictly before each turn
+    position = np.arange(len(content))
+    first = np.repeat(first_rows(row, len(texts)), np.bincount(row, minlength=len(texts)))
+    turn_id = position - first
+    last_assistant = np.maximum.accumulate(np.where(role == 'assistant', position, -1))
+    previous = np.concatenate([[-1], last_assistant])[:-1]
+    prev_assistant_id = np.where(previous >= first, previous - first, -1)
+
+    # Lengths (Arrow kernels) and token counts over the UTF-8 buffer of the turns
+    leading = raw_bytes[keep] - utf8_lengths(as_arrow(raw_parts[keep].str.lstrip()))
+    byte_start = piece_start[keep] + leading
+    turns = as_arrow(content)
+    return pd.DataFrame({
+        'role': role,
+        'content': content.array,
+        'transcript_id': transcript_ids[row],
+        'turn_id': turn_id.astype(np.int32),
+        'length': pc.utf8_length(turns).to_numpy().astype(np.int32),
+        'n_tokens': token_counts(turns).astype(np.int32),
+        'prev_assistant_id': prev_assistant_id.astype(np.int32),
+        'byte_start': byte_start.astype(np.int32),
+        'byte_end': (byte_start + utf8_lengths(turns)).astype(np.int32),
+    })
+
+def as_arrow(strings):
+    """
+    Arrow string array of a Series or array of strings (Arrow-backed ones are not copied).
+    """
+    values = getattr(strings, 'array', strings)
+    if not hasattr(values, '__arrow_array__'):
+        return pa.array(np.asarray(values, dtype=object), type=pa.string())
+    array = pa.array(values)
+    return array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+
+def utf8_lengths(strings):
+    """
+    UTF-8 byte length of every string of an Arrow string array (as int64 array).
+    """
+    return pc.binary_length(strings).to_numpy().astype(np.int64)
+
+def first_rows(row, n_rows):
+    """
+    For sorted row numbers (one entry per piece/turn): position of the first entry of
+    every row 0..n_rows-1 (rows without entries get the position of the next one).
+    """
+    return np.searchsorted(row, np.arange(n_rows))
+
+def iter_turn_batches(batches):
+    """
+    Segments a stream of transcript chunks (see data_loader.iter_batches) one chunk
+    at a time, yielding a df_turns frame per chunk.
+    """
+    for batch in batches:
+        yield process_dataframe(batch)
+
+def process_dataframe_iterrows(df):
+    """
+    Reference row-by-row segmentation (one segment_dialogue call per transcript).
+    Kept to check process_dataframe against, see benchmarks/bench_segmentation.py.
     """
     all_turns = []
     
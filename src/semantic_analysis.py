@@ -1,27 +1,26 @@
-import networkx as nx
-import matplotlib.pyplot as plt
-import re
+import os
 from collections import Counter
-import nltk
-from nltk.corpus import stopwords
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+import cooccurrence_matrix
+import figure_render
+import graph_layout
+import instrumentation
+import preprocessor
+import inverted_index
+import stopword_lists
+import turn_table
 
-# Ensure nltk is ready
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+# Network images: raster (png, at NETWORK_IMAGE_DPI) or vector (svg, pdf) output
+NETWORK_IMAGE_FORMAT = os.environ.get("NETWORK_IMAGE_FORMAT", "png")
+NETWORK_IMAGE_DPI = int(os.environ.get("NETWORK_IMAGE_DPI", "300"))
 
-def analyze_semantic_network(df_turns, target_word="frustrated", window_size=5, top_n=30):
+def get_stop_words():
     """
-    Builds a co-occurrence graph centered around a target word.
+    NLTK English stop words plus the project's custom/interview-bias stops.
     """
-    user_turns = df_turns[df_turns['role'] == 'user']['content'].tolist()
-    
-    # Simple tokenization
-    texts = [re.sub(r'[^\w\s]', '', t.lower()).split() for t in user_turns]
-    
-    stop_words = set(stopwords.words('english'))
+    stop_words = set(stopword_lists.NLTK_ENGLISH)
     custom_stops = {
         'im', 'ive', 'dont', 'cant', 'user', 'assistant', 'model', 'claude', 'ai',
         'ill', 'id', 'thats', 'try', 'trying', 'got', 'getting', 'new', 'able', 'sure',
@@ -35,13 +34,35 @@ def analyze_semantic_network(df_turns, target_word="frustrated", window_size=5,
         'situation', 'example', 'share', 'time'
     }
     stop_words.update(custom_stops)
+    return stop_words
 
-    co_occurrence = Counter()
+def count_cooccurrence(df_turns, target_word="frustrated", window_size=5, stop_words=None):
+    """
+    Counts (target_word, neighbor) pairs inside the window around each occurrence
+    of target_word in user turns. Counters of different chunks can be added together.
+    """
+    return count_cooccurrence_many(df_turns, [target_word], window_size, stop_words)[target_word]
+
+def count_cooccurrence_many(df_turns, target_words, window_size=5, stop_words=None):
+    """
+    Same as count_cooccurrence for several target words at once: the user turns are
+    tokenized and scanned a single time. Returns {target_word: Counter}.
+    """
+    user_turns = turn_table.user_turns(df_turns)['content'].tolist()
+    
+    # Simple tokenization
+    texts = [preprocessor.tokenize_words(t) for t in user_turns]
+    
+    if stop_words is None:
+        stop_words = get_stop_words()
+
+    counters = {word: Counter() for word in target_words}
     
     for tokens in texts:
         for i, token in enumerate(tokens):
             # Check window around the token
-            if token == target_word: # Optimization
+            if token in counters: # Optimization
+                co_occurrence = counters[token]
                 start = max(0, i - window_size)
                 end = min(len(tokens), i + window_size + 1)
                 
@@ -56,6 +77,91 @@ def analyze_semantic_network(df_turns, target_word="frustrated", window_size=5,
                     pair = tuple(sorted((token, neighbor)))
                     co_occurrence[pair] += 1
                 
+    return counters
+
+@instrumentation.timed
+def analyze_semantic_network(df_turns, target_word="frustrated", window_size=5, top_n=30, index=None):
+    """
+    Builds a co-occurrence graph centered around a target word.
+    With a positional index of df_turns (see inverted_index.py) only the target's
+    postings are read instead of re-tokenizing every user turn.
+    """
+    graphs, _ = analyze_semantic_networks(df_turns, [target_word], window_size, top_n, index)
+    return graphs[target_word]
+
+@instrumentation.timed
+def analyze_semantic_networks(df_turns, target_words, window_size=5, top_n=30, index=None):
+    """
+    analyze_semantic_network for several target words, with all counters built in
+    one pass. Returns (graphs, edges): graphs = {word: graph} and edges the shared
+    edge table of all graphs (see network_edge_table).
+    """
+    target_words = list(dict.fromkeys(target_words))
+    if index is not None:
+        stop_words = get_stop_words()
+        counters = {w: inverted_index.cooccurrence(index, w, window_size, stop_words=stop_words) for w in target_words}
+    else:
+        counters = count_cooccurrence_many(df_turns, target_words, window_size)
+    graphs = {w: build_semantic_network(counters[w], w, top_n) for w in target_words}
+    return graphs, network_edge_table(graphs)
+
+@instrumentation.timed
+def analyze_semantic_map(index, target_words, counts=None, window_size=5, n_terms=1000, k=5, min_count=3):
+    """
+    Corpus-wide semantic associations from the global co-occurrence matrix (see
+    cooccurrence_matrix.py), PPMI-weighted, with the same stop word / length filter
+    as the ego networks.
+
+    Args:
+        index (dict): Token store or inverted index of the corpus.
+        target_words (list): Words whose strongest neighbours are listed.
+        counts (sp.csr_matrix): Precomputed co-occurrence counts (e.g. the persisted
+            cooccurrence_matrix.get_matrix); built from index if None.
+        n_terms (int): Nodes of the map: the most frequent content terms.
+        k (int): Neighbours per node.
+        min_count (int): Pairs seen fewer times are ignored (PPMI overrates rare pairs).
+
+    Returns:
+        (neighbours, map_edges): DataFrames (Target, Neighbour, PPMI) and (source, target, weight).
+    """
+    if counts is None:
+        counts = cooccurrence_matrix.build_matrix(index, window_size)
+    mask = cooccurrence_matrix.content_term_mask(index['vocabulary'], get_stop_words())
+    # Target words stay in, even when they are stop words themselves ('frustrated')
+    mask[[index['term_ids'][w] for w in target_words if w in index['term_ids']]] = True
+    keep = sp.diags(mask.astype(np.int64), dtype=np.int64)
+    weights = cooccurrence_matrix.ppmi(keep @ counts @ keep, min_count=min_count)
+
+    rows = []
+    for word in target_words:
+        top = cooccurrence_matrix.top_neighbors(weights, index['vocabulary'], word, k=k, term_ids=index['term_ids'])
+        rows.extend({'Target': word, 'Neighbour': t, 'PPMI': w} for t, w in zip(top['term'], top['weight']))
+    neighbours = pd.DataFrame(rows, columns=['Target', 'Neighbour', 'PPMI'])
+
+    nodes = cooccurrence_matrix.frequent_terms(index, n_terms, term_mask=mask)
+    map_edges = cooccurrence_matrix.neighbor_edges(weights[nodes][:, nodes], index['vocabulary'][nodes], k=k)
+    return neighbours, map_edges
+
+def network_edge_table(graphs):
+    """
+    One edge table for several target-word graphs: Target, Word 1, Word 2, Weight
+    (targets in input order, strongest edges first).
+    """
+    rows = []
+    for target, G in graphs.items():
+        for u, v, data in G.edges(data=True):
+            rows.append({'Target': target, 'Word 1': u, 'Word 2': v, 'Weight': data['weight']})
+    df_edges = pd.DataFrame(rows, columns=['Target', 'Word 1', 'Word 2', 'Weight'])
+    df_edges['Target'] = pd.Categorical(df_edges['Target'], categories=list(graphs))
+    df_edges = df_edges.sort_values(['Target', 'Weight'], ascending=[True, False], kind='stable')
+    df_edges['Target'] = df_edges['Target'].astype(str)
+    return df_edges.reset_index(drop=True)
+
+def build_semantic_network(co_occurrence, target_word="frustrated", top_n=30):
+    """
+    Turns (merged) co-occurrence counts into the graph around target_word.
+    """
+    import networkx as nx
     # Filter edges regarding target word
     # If target_word is provided, we prioritize edges connected to it, 
     # but we also want the general "context" of that word.
@@ -86,15 +192,30 @@ def analyze_semantic_network(df_turns, target_word="frustrated", window_size=5,
         
     return G
 
-def visualize_network(G, target_word, output_file="semantic_network.png"):
+def image_settings(output_file, image_format=None, dpi=None):
     """
-    Visualizes the semantic network graph.
+    Output file (extension switched to image_format) and dpi of a network image.
+    Defaults: NETWORK_IMAGE_FORMAT (png; svg/pdf for vector output) and NETWORK_IMAGE_DPI.
     """
-    plt.figure(figsize=(12, 12))
+    image_format = image_format or NETWORK_IMAGE_FORMAT
+    if image_format:
+        output_file = f"{os.path.splitext(output_file)[0]}.{image_format.lstrip('.')}"
+    return output_file, dpi or NETWORK_IMAGE_DPI
+
+def draw_network(data, style):
+    """
+    Draws a semantic network graph (figure kind 'semantic_network', see figure_render.py).
+    data: {'graph': networkx graph, 'target_word': str}
+    """
+    import matplotlib.pyplot as plt
+    import networkx as nx
+    G, target_word = data['graph'], data['target_word']
+    fig = plt.figure(figsize=(12, 12))
     
     # Gunakan k yang agak besar agar menyebar, tanpa pengaruh bobot pada posisi
     # User Request: k=3.5
-    pos = nx.spring_layout(G, k=15.0, iterations=200, seed=42)
+    # (spring layout for ego graphs, vectorized force layout for large ones; cached)
+    pos = graph_layout.layout(G, seed=42, spring={'k': 15.0, 'iterations': 200})
     
     # Hitung ketebalan garis dengan Batas Minimum
     edges = G.edges()
@@ -119,11 +240,77 @@ def visualize_network(G, target_word, output_file="semantic_network.png"):
     
     plt.title(f"Semantic Context: Why are users '{target_word}'?", fontsize=16)
     plt.axis('off')
-    
-    # Save file and close (Required for main.py integration)
-    plt.savefig(output_file, dpi=300, bbox_inches='tight')
-    plt.close()
-    return output_file
+    return fig
+
+def network_figure(G, target_word, output_file="semantic_network.png", image_format=None, dpi=None):
+    """
+    Figure spec of a semantic network image (see image_settings for the format).
+    """
+    output_file, dpi = image_settings(output_file, image_format, dpi)
+    return figure_render.figure('semantic_network', output_file, {'graph': G, 'target_word': target_word},
+                                dpi=dpi, bbox_inches='tight')
+
+def visualize_network(G, target_word, output_file="semantic_network.png", image_format=None, dpi=None):
+    """
+    Visualizes the semantic network graph. See image_settings for the output format.
+    """
+    return figure_render.render_figure(network_figure(G, target_word, output_file, image_format, dpi))
+
+def visualize_networks(graphs, output_file="semantic_network.png", image_format=None, dpi=None):
+    """
+    Visualizes the {target_word: graph} dict of analyze_semantic_networks: every graph
+    is saved as <output_file stem>_<word>.png (rendered in parallel). Returns {word: file}.
+    """
+    stem, ext = os.path.splitext(output_file)
+    specs = [network_figure(graph, word, f"{stem}_{word}{ext}", image_format, dpi) for word, graph in graphs.items()]
+    return dict(zip(graphs, figure_render.render_figures(specs)))
+
+def draw_semantic_map(data, style):
+    """
+    Draws a large semantic map (figure kind 'semantic_map') with the force layout.
+    Edges and nodes are drawn as two collections instead of one artist per element;
+    only the style['n_labels'] nodes with the highest weighted degree are labelled.
+    data: {'edges': DataFrame (source, target, weight), e.g. from analyze_semantic_map}
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    import networkx as nx
+
+    map_edges = data['edges']
+    G = nx.Graph()
+    G.add_weighted_edges_from(map_edges[['source', 'target', 'weight']].itertuples(index=False))
+    fig, ax = plt.subplots(figsize=(16, 16))
+    if G.number_of_nodes():
+        pos = graph_layout.layout(G, engine='force', seed=42)
+        nodes = list(G.nodes())
+        xy = np.array([pos[node] for node in nodes])
+        strength = np.array([G.degree(node, weight='weight') for node in nodes], dtype=float)
+        weights = map_edges['weight'].to_numpy(dtype=float)
+        segments = [(pos[u], pos[v]) for u, v in map_edges[['source', 'target']].itertuples(index=False)]
+        ax.add_collection(LineCollection(segments, linewidths=0.3 + 1.5 * weights / weights.max(),
+                                         colors='gray', alpha=0.3))
+        ax.scatter(xy[:, 0], xy[:, 1], s=10 + 190 * strength / strength.max(),
+                   c='#E6F3FF', edgecolors='#99CCFF', linewidths=0.5, zorder=2)
+        for i in np.argsort(-strength, kind='stable')[:style.get('n_labels', 80)]:
+            ax.annotate(str(nodes[i]), xy[i], fontsize=8, ha='center', va='center', zorder=3,
+                        bbox=dict(facecolor='white', edgecolor='none', alpha=0.6, pad=1))
+    ax.set_title(f"Semantic Map ({G.number_of_nodes()} terms, {G.number_of_edges()} connections)", fontsize=16)
+    ax.axis('off')
+    return fig
+
+def semantic_map_figure(map_edges, output_file="semantic_map.png", n_labels=80, image_format=None, dpi=None):
+    """
+    Figure spec of a semantic map image (see draw_semantic_map).
+    """
+    output_file, dpi = image_settings(output_file, image_format, dpi)
+    return figure_render.figure('semantic_map', output_file, {'edges': map_edges},
+                                dpi=dpi, bbox_inches='tight', n_labels=n_labels)
+
+def visualize_semantic_map(map_edges, output_file="semantic_map.png", n_labels=80, image_format=None, dpi=None):
+    """
+    Draws a semantic map (see draw_semantic_map) and returns the image file.
+    """
+    return figure_render.render_figure(semantic_map_figure(map_edges, output_file, n_labels, image_format, dpi))
 
 def get_top_connections(G, top_n=10):
     """
@@ -144,15 +331,20 @@ def get_top_connections(G, top_n=10):
     else:
         return pd.DataFrame(columns=['Word 1', 'Word 2', 'Weight'])
 
-def check_kwic(df, word1, word2, limit=5):
+@instrumentation.timed
+def check_kwic(df, word1, word2, limit=5, index=None):
     """
     Checks the Context (Key Word In Context) for two words to verify semantic relationship.
     Returns a list of strings (sentences/snippets).
+    With a positional index of df (see inverted_index.py) candidates come from postings lookups.
     """
-    matches = df[
-        df['content'].str.lower().str.contains(word1.lower()) & 
-        df['content'].str.lower().str.contains(word2.lower())
-    ]
+    if index is not None:
+        matches = df.iloc[inverted_index.kwic_turns(index, df, word1, word2, limit)]
+    else:
+        matches = df[
+            df['content'].str.lower().str.contains(word1.lower()) & 
+            df['content'].str.lower().str.contains(word2.lower())
+        ]
     
     snippets = []
     for text in matches['content'].head(limit):
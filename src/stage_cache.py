@@ -0,0 +1,314 @@
+import ast
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import re
+import shutil
+import types
+import task_graph
+import turn_cache
+
+# Content-addressed memoization of the report stages (main.STAGES).
+# A stage's key hashes everything its result depends on:
+#   - the input data: cache key of the split's turns (raw data + segmentation rules)
+#   - the code: source of the stage function and of the helpers of its module it
+#     calls (e.g. main.keyword_hits), and of every local module they import or
+#     reference, directly or through other modules (found by parsing the imports)
+#   - the parameters: the stage's bound arguments (split), the module-level settings
+#     the stage reads (e.g. main.N_CLUSTERS), the environment variables read by the
+#     modules in its import closure and the config files in MODULE_INPUTS
+#   - the persistent indexes it reads (MODULE_INPUTS): the term index, the split's
+#     token store and postings. Stages build these as they run, so results are saved
+#     under the keys computed after the run (see main.py): a warm run finds them, and
+#     a rebuilt or deleted index misses.
+#   - the keys of the stages it depends on
+# Editing a stop word in semantic_analysis.py therefore changes the keys of the
+# stages importing it (network, validation) and nothing else.
+#
+# An entry is a directory <stage>-<key>/ with the pickled result and copies of the
+# files the stage wrote (result['files']), which are restored on a hit. Entries are
+# evicted least recently used first once the cache exceeds MAX_MB.
+CACHE_DIR = os.environ.get("STAGE_CACHE_DIR", os.path.join("cache", "stages"))
+MAX_MB = float(os.environ.get("STAGE_CACHE_MAX_MB", "512"))
+
+# Bump when the entry layout changes.
+CACHE_VERSION = 1
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+ENV_PATTERN = re.compile(r"""environ\.get\(\s*["'](\w+)["']""")
+# Environment variables that do not change any result (parallelism, logging, caches)
+IGNORED_ENV = {'ANALYSIS_WORKERS', 'RUN_LOG', 'INSTRUMENT_TRACEMALLOC', 'PROFILE_STAGES',
+               'STAGE_CACHE_DIR', 'STAGE_CACHE_MAX_MB', 'TURN_CACHE_DIR', 'TERM_INDEX_DIR',
+               'LAYOUT_CACHE_DIR', 'FIGURE_CACHE_DIR', 'FIGURE_CACHE_MAX_MB'}
+
+# Modules whose imports are not followed by import_closure: they only import other
+# modules to compute keys (MODULE_INPUTS), e.g. when figure_render.py imports this one
+CLOSURE_EXCLUDED = {'stage_cache'}
+
+def keyword_config(split):
+    import keyword_matcher
+    return file_digest(keyword_matcher.KEYWORDS_CONFIG)
+
+def comparative_splits(split):
+    # The comparative analysis reads the other professions' splits as well
+    import comparative_analysis
+    return [turn_cache.cache_key(s) for s in comparative_analysis.DEFAULT_SPLITS.values()]
+
+def term_index_state(split):
+    import term_index
+    return term_index.fingerprint()
+
+def token_store_state(split):
+    import token_store
+    return token_store.fingerprint(split)
+
+def postings_state(split):
+    import inverted_index
+    return inverted_index.fingerprint(split)
+
+# Data a module reads besides the turns and its own source: {module: callable(split)}
+MODULE_INPUTS = {
+    'keyword_matcher': keyword_config,
+    'comparative_analysis': comparative_splits,
+    'term_index': term_index_state,
+    'token_store': token_store_state,
+    'inverted_index': postings_state,
+}
+
+def file_digest(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@functools.lru_cache(maxsize=None)
+def imported_names(source):
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    return names
+
+@functools.lru_cache(maxsize=None)
+def module_source(name):
+    """
+    Source of a module in src/, or None for anything else (stdlib, third party).
+    """
+    path = os.path.join(SRC_DIR, f"{name}.py")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+def import_closure(source):
+    """
+    Names of the local modules imported by source, directly or indirectly (the
+    imports of CLOSURE_EXCLUDED modules are not followed).
+    """
+    seen, todo = set(), list(imported_names(source))
+    while todo:
+        name = todo.pop()
+        if name in seen or module_source(name) is None:
+            continue
+        seen.add(name)
+        if name not in CLOSURE_EXCLUDED:
+            todo.extend(imported_names(module_source(name)))
+    return sorted(seen)
+
+def code_names(code):
+    """
+    Global names used by a code object and the code objects nested in it
+    (comprehensions, lambdas, inner functions).
+    """
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= code_names(const)
+    return names
+
+def referenced_code(func):
+    """
+    (helpers, modules): the functions of func's module that func calls, directly or
+    through each other, in call order, and the local modules they reference through
+    module-level names (imported modules or functions imported from them).
+    """
+    helpers, modules = [], set()
+    seen, todo = {func}, [func]
+    while todo:
+        current = todo.pop(0)
+        for name in sorted(code_names(current.__code__)):
+            value = current.__globals__.get(name)
+            if isinstance(value, types.ModuleType):
+                module = value.__name__
+            elif isinstance(value, types.FunctionType):
+                module = value.__module__
+            else:
+                continue
+            if module_source(module) is None:
+                continue
+            if module != func.__module__:
+                modules.add(module)
+            elif isinstance(value, types.FunctionType) and value not in seen:
+                seen.add(value)
+                helpers.append(value)
+                todo.append(value)
+    return helpers, sorted(modules)
+
+def settings_of(func):
+    """
+    Module-level settings (plain values) the function reads, e.g. main.N_CLUSTERS.
+    """
+    plain = (str, int, float, bool, type(None), tuple)
+    return {name: repr(func.__globals__[name]) for name in sorted(code_names(func.__code__))
+            if name in func.__globals__ and isinstance(func.__globals__[name], plain)}
+
+def code_fingerprint(func):
+    """
+    Hashable description of the code and settings a stage function depends on.
+    functools.partial objects contribute their bound arguments.
+    """
+    bound = {}
+    while isinstance(func, functools.partial):
+        bound.update(func.keywords)
+        func = func.func
+    source = inspect.getsource(func)
+    helpers, referenced = referenced_code(func)
+    helper_sources = {helper.__qualname__: inspect.getsource(helper) for helper in helpers}
+    modules = import_closure("\n".join([source, *helper_sources.values()]
+                                       + [f"import {name}" for name in referenced]))
+    env = {}
+    for name in modules:
+        for var in ENV_PATTERN.findall(module_source(name)):
+            if var not in IGNORED_ENV:
+                env[var] = os.environ.get(var)
+    settings = {}
+    for f in [func, *helpers]:
+        settings.update(settings_of(f))
+    return {
+        'function': f"{func.__module__}.{func.__qualname__}",
+        'source': source,
+        'helpers': helper_sources,
+        'bound': repr(sorted(bound.items())),
+        'settings': settings,
+        'modules': {name: hashlib.sha256(module_source(name).encode("utf-8")).hexdigest() for name in modules},
+        'env': env,
+        'inputs': {name: MODULE_INPUTS[name](bound.get('split')) for name in modules if name in MODULE_INPUTS},
+    }
+
+def task_keys(tasks, input_key):
+    """
+    {name: key} for a task graph (see task_graph.py) whose tasks all read the turns
+    identified by input_key (e.g. turn_cache.cache_key(split)).
+    """
+    task_graph.check_graph(tasks)
+    keys = {}
+    pending = list(tasks)
+    while pending:
+        for name in task_graph.ready_tasks(tasks, pending, keys):
+            func, deps = tasks[name]
+            h = hashlib.sha256(f"v{CACHE_VERSION}:{name}:{input_key}".encode())
+            h.update(json.dumps(code_fingerprint(func), sort_keys=True).encode("utf-8"))
+            for dep in deps:
+                h.update(keys[dep].encode())
+            keys[name] = h.hexdigest()[:16]
+            pending.remove(name)
+    return keys
+
+def entry_dir(name, key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f"{name}-{key}")
+
+def load(name, key, cache_dir=None):
+    """
+    Returns the cached result of a stage (restoring the files it wrote), or None.
+    """
+    path = entry_dir(name, key, cache_dir)
+    result_path = os.path.join(path, "result.pkl")
+    if not os.path.exists(result_path):
+        return None
+    try:
+        with open(result_path, "rb") as f:
+            result = pickle.load(f)
+        for i, file in enumerate(result.get('files', [])):
+            os.makedirs(os.path.dirname(file) or ".", exist_ok=True)
+            shutil.copy2(os.path.join(path, "files", f"{i}-{os.path.basename(file)}"), file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+        print(f"Ignoring unreadable stage cache entry {path}: {e}")
+        return None
+    # Mark as recently used (for eviction)
+    os.utime(result_path)
+    return result
+
+def save(name, key, result, cache_dir=None):
+    """
+    Stores a stage result and copies of the files it lists under 'files' (atomically).
+    """
+    path = entry_dir(name, key, cache_dir)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(os.path.join(tmp_path, "files"))
+    for i, file in enumerate(result.get('files', [])):
+        shutil.copy2(file, os.path.join(tmp_path, "files", f"{i}-{os.path.basename(file)}"))
+    with open(os.path.join(tmp_path, "result.pkl"), "wb") as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+def entry_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+def evict(max_mb=None, cache_dir=None):
+    """
+    Removes least recently used entries until the cache is at most max_mb.
+    Returns the names of the removed entries.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = (MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = []
+    for entry in os.listdir(cache_dir):
+        result_path = os.path.join(cache_dir, entry, "result.pkl")
+        if os.path.exists(result_path):
+            entries.append((os.path.getmtime(result_path), entry, entry_size(os.path.join(cache_dir, entry))))
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, entry, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(os.path.join(cache_dir, entry), ignore_errors=True)
+        total -= size
+        removed.append(entry)
+    return removed
+
+def load_results(tasks, keys, cache_dir=None):
+    """
+    {name: result} of every task found in the cache.
+    """
+    results = {}
+    for name in tasks:
+        result = load(name, keys[name], cache_dir)
+        if result is not None:
+            results[name] = result
+    return results
+
+def save_results(results, keys, skip=(), cache_dir=None):
+    """
+    Stores the results not in skip (those loaded from the cache) or marked with an
+    'error', then evicts.
+    """
+    for name, result in results.items():
+        if name in skip or result.get('error'):
+            continue
+        try:
+            save(name, keys[name], result, cache_dir)
+        except (OSError, pickle.PicklingError, TypeError) as e:
+            print(f"Could not cache stage '{name}': {e}")
+    removed = evict(cache_dir=cache_dir)
+    if removed:
+        print(f"Stage cache: evicted {len(removed)} entries")
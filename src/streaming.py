@@ -0,0 +1,171 @@
+import argparse
+from collections import Counter
+import numpy as np
+import pandas as pd
+import data_loader
+import preprocessor
+import analysis
+import clustering
+import semantic_analysis
+import turn_table
+
+# Streaming mode: the split is read and segmented chunk by chunk, and every analysis
+# keeps only a mergeable partial aggregate (counters, document frequencies,
+# per-transcript feature rows). Peak memory depends on batch_size, not corpus size.
+
+def iter_turns(split='workforce', batch_size=10000, data_dir=None):
+    """
+    Yields segmented df_turns chunks of a split (compact turn tables, see turn_table.py).
+    """
+    batches = data_loader.iter_batches(split, batch_size=batch_size, data_dir=data_dir)
+    return (turn_table.compact_turns(df_turns) for df_turns in preprocessor.iter_turn_batches(batches))
+
+def run_streaming_analysis(split='workforce', batch_size=10000, data_dir=None,
+                           target_word="satisfied", n_clusters=3, top_n=20, sample_limit=10,
+                           cluster_engine=None):
+    """
+    Runs the topic, interaction, trust, future-outlook, semantic-network and
+    clustering analyses over a streamed split.
+
+    TF-IDF needs the global vocabulary/IDF before scores can be summed, so the split
+    is streamed twice; every other aggregate is collected in the first pass.
+
+    Returns:
+        dict: results shaped like the in-memory functions' return values.
+    """
+    tfidf_stats = {'n_docs': 0, 'df': Counter(), 'tf': Counter()}
+    interaction_stats = {'delegation': 0, 'collaboration': 0, 'foundation': 0, 'total_user_turns': 0}
+    error_count, total = 0, 0
+    future_count, future_samples = 0, []
+    stop_words = semantic_analysis.get_stop_words()
+    co_occurrence = Counter()
+    id_chunks, feature_chunks = [], []
+    n_turns = 0
+
+    print(f"Streaming split '{split}' (pass 1/2)...")
+    for df_turns in iter_turns(split, batch_size, data_dir):
+        if df_turns.empty:
+            continue
+        n_turns += len(df_turns)
+        tfidf_stats = analysis.merge_tfidf_term_stats(tfidf_stats, analysis.tfidf_term_stats(df_turns))
+
+        hits = analysis.compute_keyword_hits(df_turns)
+        for k, v in analysis.analyze_interactions(df_turns, hits=hits).items():
+            interaction_stats[k] += v
+
+        chunk_errors, chunk_total = analysis.analyze_trust_issues(df_turns, hits=hits)
+        error_count += chunk_errors
+        total += chunk_total
+
+        mentions = analysis.analyze_future_outlook(df_turns, hits=hits)
+        future_count += len(mentions)
+        future_samples.extend(mentions[:max(0, sample_limit - len(future_samples))])
+
+        co_occurrence += semantic_analysis.count_cooccurrence(df_turns, target_word, stop_words=stop_words)
+
+        chunk_ids, chunk_X = analysis.extract_user_features(df_turns, hits=hits)
+        id_chunks.append(chunk_ids)
+        feature_chunks.append(chunk_X)
+        print(f"  ...{n_turns} turns processed")
+
+    vocabulary, idf = analysis.tfidf_vocabulary(tfidf_stats, max_features=100)
+    score_sums = np.zeros(len(vocabulary))
+    print(f"Streaming split '{split}' (pass 2/2)...")
+    for df_turns in iter_turns(split, batch_size, data_dir):
+        if not df_turns.empty:
+            score_sums += analysis.tfidf_score_sums(df_turns, vocabulary, idf)
+
+    try:
+        if (cluster_engine or clustering.ENGINE) == 'minibatch':
+            # Fitted and assigned chunk by chunk (partial_fit), the rows are never stacked
+            clusters = analysis.cluster_feature_chunks(id_chunks, feature_chunks, n_clusters=n_clusters)
+        else:
+            # Full-batch KMeans needs every feature row at once
+            user_ids = [user_id for chunk_ids in id_chunks for user_id in chunk_ids]
+            X = np.vstack(feature_chunks) if feature_chunks else np.empty((0, len(analysis.FEATURE_NAMES)))
+            clusters = analysis.cluster_user_features(user_ids, X, n_clusters=n_clusters, engine=cluster_engine)
+    except Exception as e:
+        print(f"Maturity clustering failed: {e}")
+        clusters = (None, None, None, None)
+
+    return {
+        'n_turns': n_turns,
+        'top_terms': analysis.rank_tfidf_terms(vocabulary, score_sums, top_n),
+        'interaction_stats': interaction_stats,
+        'trust': (error_count, total),
+        'future_count': future_count,
+        'future_samples': future_samples,
+        'network': semantic_analysis.build_semantic_network(co_occurrence, target_word),
+        'clusters': clusters,
+    }
+
+def build_report(results, split, target_word):
+    """
+    Markdown report for a streaming run (sections 1-5 of the full report).
+    """
+    report_lines = [f"# Analysis Report: Anthropic Interviewer ({split} split, streaming mode)"]
+    report_lines.append(f"\nTotal turns processed: {results['n_turns']}")
+
+    report_lines.append("\n## 1. Topic & Use Case Analysis")
+    report_lines.append("Top TF-IDF Terms in User Prompts (Potential Tasks):")
+    report_lines.append(results['top_terms'].to_markdown(index=False))
+
+    report_lines.append("\n## 2. Interaction Patterns")
+    report_lines.append("| interaction_type | count |")
+    report_lines.append("| --- | --- |")
+    for k, v in results['interaction_stats'].items():
+        report_lines.append(f"| {k} | {v} |")
+
+    error_count, total = results['trust']
+    report_lines.append("\n## 3. Trust & Limitations")
+    report_lines.append(f"- **Total User Turns Analyzed**: {total}")
+    report_lines.append(f"- **Turns with Error/Hallucination Keywords**: {error_count}")
+    if total:
+        report_lines.append(f"- **Percentage**: {error_count/total*100:.2f}%")
+
+    report_lines.append("\n## 4. Future Outlook & Skills")
+    report_lines.append(f"Found {results['future_count']} mentions regarding career/skills/future.")
+    report_lines.append(f"\n### Sample Quotes (First {len(results['future_samples'])}):")
+    for m in results['future_samples']:
+        clean_m = m.replace('\n', ' ').strip()
+        report_lines.append(f"- > \"{clean_m}\"")
+
+    report_lines.append("\n## 5. Advanced Analysis")
+    report_lines.append(f"\n### 5.1 Semantic Network Analysis ('{target_word}')")
+    report_lines.append(semantic_analysis.get_top_connections(results['network'], top_n=10).to_markdown(index=False))
+
+    cluster_df, centroids, feature_names, cluster_validity = results['clusters']
+    if cluster_df is not None:
+        report_lines.append("\n### 5.2 AI Maturity Matrix (Clustering)")
+        report_lines.append(f"Clustered {len(cluster_df)} users.")
+        low, high = cluster_validity['silhouette_ci']
+        if cluster_validity['sample_size'] == 0:
+            reason = "one cluster" if cluster_validity['n_clusters'] < 2 else "one cluster per user"
+            report_lines.append(f"- **Silhouette Score**: undefined ({reason})")
+        else:
+            report_lines.append(f"- **Silhouette Score**: `{cluster_validity['silhouette']:.3f}` "
+                                f"(CI `{low:.3f}` - `{high:.3f}`, {cluster_validity['sample_size']} sampled users)")
+        report_lines.append("\n**Cluster Centroids (Average Feature Values):**")
+        report_lines.append(pd.DataFrame(centroids, columns=feature_names).to_markdown())
+    return report_lines
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the analysis in streaming (chunked) mode.")
+    parser.add_argument("--split", default="workforce")
+    parser.add_argument("--batch-size", type=int, default=10000, help="transcripts per chunk")
+    parser.add_argument("--data-dir", default=None, help="folder with local <split>.parquet/.jsonl files")
+    parser.add_argument("--target-word", default="satisfied")
+    parser.add_argument("--cluster-engine", default=None, choices=clustering.ENGINES,
+                        help="'minibatch' fits MiniBatchKMeans/IncrementalPCA chunk by chunk")
+    parser.add_argument("--output", default="docs/analysis_report_streaming.md")
+    args = parser.parse_args()
+
+    results = run_streaming_analysis(args.split, args.batch_size, args.data_dir, target_word=args.target_word,
+                                     cluster_engine=args.cluster_engine)
+    report_lines = build_report(results, args.split, args.target_word)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("\n".join(report_lines))
+    print(f"\n--- Streaming analysis complete. Report saved to {args.output} ---")
+
+if __name__ == "__main__":
+    main()
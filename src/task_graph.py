@@ -0,0 +1,125 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import instrumentation
+import turn_cache
+
+# Minimal task-graph executor for the report stages.
+# A graph is {name: (func, [dependency names])}; every func is called as
+# func(df_turns, inputs) with inputs = {dependency name: its result}. Stages whose
+# dependencies are done run concurrently on a process pool.
+#
+# df_turns is never pickled to the workers: each worker memory-maps the split's
+# Arrow turn cache (turn_cache.read_turns). The content and the numeric columns stay
+# views of the mapped file, so all processes read the same pages; only the
+# categorical columns (codes + the transcript id lookup) are decoded per worker.
+# Large data shared between stages goes through files the same way (e.g. the keyword
+# hit matrix, see main.py), not through the pickled results.
+# Every task runs under instrumentation.run_stage; the records it makes (also in
+# the workers) end up in instrumentation.RECORDS of this process.
+#
+# Stages that start a pool of their own (comparative splits, k sweep, figures) size
+# it with pool_size: inside a worker they only get the task's share of MAX_WORKERS.
+# Shares are handed out when a task is submitted, from the workers not already
+# promised to running tasks, split evenly between the tasks submitted together
+# (at least 1 each). A stage that runs alone gets all of MAX_WORKERS, eleven ready
+# stages on eight CPUs get one each, so a run never starts more than about
+# MAX_WORKERS busy processes. Threads (e.g. for I/O) do not count against it.
+
+# Worker processes (default: one per CPU, 1 = run everything in-process)
+MAX_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", os.cpu_count() or 1))
+
+_worker_turns = None
+# Processes a pool started inside this worker may use (None outside workers)
+_worker_share = None
+
+def init_worker(turns_path):
+    global _worker_turns
+    _worker_turns = turn_cache.read_turns(turns_path)
+
+def pool_size(max_workers=None):
+    """
+    Size of a pool started by a stage: max_workers (default MAX_WORKERS), capped to
+    the running task's share of MAX_WORKERS inside a task-graph worker.
+    """
+    max_workers = max_workers or MAX_WORKERS
+    if _worker_share is not None:
+        max_workers = min(max_workers, _worker_share)
+    return max_workers
+
+def run_in_worker(name, func, inputs, share=1):
+    global _worker_share
+    _worker_share = share
+    return instrumentation.run_stage(name, func, _worker_turns, inputs)
+
+def split_shares(free, n):
+    """
+    free workers split between n tasks as evenly as possible, at least 1 each.
+    """
+    return [max(1, free // n + (1 if i < free % n else 0)) for i in range(n)]
+
+def ready_tasks(tasks, pending, results):
+    return [name for name in pending if all(dep in results for dep in tasks[name][1])]
+
+def check_graph(tasks):
+    """
+    Raises ValueError for unknown dependencies or cycles.
+    """
+    for name, (_, deps) in tasks.items():
+        missing = [d for d in deps if d not in tasks]
+        if missing:
+            raise ValueError(f"Task '{name}' depends on unknown tasks: {missing}")
+    done, pending = set(), list(tasks)
+    while pending:
+        ready = ready_tasks(tasks, pending, done)
+        if not ready:
+            raise ValueError(f"Dependency cycle between tasks: {pending}")
+        done.update(ready)
+        pending = [name for name in pending if name not in done]
+
+def run_tasks(tasks, df_turns, turns_path=None, max_workers=None, done=None):
+    """
+    Runs a task graph and returns {name: result}.
+
+    Args:
+        tasks (dict): {name: (func, [dependency names])}.
+        df_turns (pd.DataFrame): Turns passed to every task when run in-process.
+        turns_path (str): Arrow turn cache file the workers memory-map. Without it
+            (or with max_workers=1) the tasks run one by one in this process.
+        max_workers (int): Pool size (default MAX_WORKERS).
+        done (dict): Results already available (e.g. from stage_cache); these
+            tasks are not run again.
+    """
+    check_graph(tasks)
+    max_workers = max_workers or MAX_WORKERS
+    results = dict(done or {})
+    pending = [name for name in tasks if name not in results]
+
+    if max_workers <= 1 or turns_path is None or not os.path.exists(turns_path):
+        # Sequential fallback, in declaration order as far as dependencies allow
+        while pending:
+            name = ready_tasks(tasks, pending, results)[0]
+            func, deps = tasks[name]
+            results[name], records = instrumentation.run_stage(name, func, df_turns, {d: results[d] for d in deps})
+            instrumentation.RECORDS.extend(records)
+            pending.remove(name)
+        return results
+
+    running, shares = {}, {}
+    budget = max(MAX_WORKERS, max_workers)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(turns_path,)) as pool:
+        while pending or running:
+            # Only as many tasks as the pool runs at once get a share
+            ready = ready_tasks(tasks, pending, results)[:max(0, max_workers - len(running))]
+            if ready:
+                free = budget - sum(shares.values())
+                for name, share in zip(ready, split_shares(free, len(ready))):
+                    func, deps = tasks[name]
+                    future = pool.submit(run_in_worker, name, func, {d: results[d] for d in deps}, share)
+                    running[future], shares[future] = name, share
+                    pending.remove(name)
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                shares.pop(future)
+                results[running.pop(future)], records = future.result()
+                instrumentation.RECORDS.extend(records)
+    return results
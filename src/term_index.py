@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import token_store
+import turn_table
+import turn_cache
+
+# Persistent term-statistics index for TF-IDF.
+# For every split it stores the sparse term-count matrix of its user turns
+# (one row per turn) plus the transcript ids already indexed, over one shared
+# vocabulary. Each split also records the turn cache key of the data it was counted
+# from (turn_cache.cache_key: segmentation + source fingerprint); when the split's data
+# changes, its counts are dropped and the split is indexed again. TF-IDF rankings for any split or union of splits are computed from
+# these counts, so nothing is refitted and scores of different splits share one IDF.
+INDEX_DIR = os.environ.get("TERM_INDEX_DIR", os.path.join("cache", "term_index"))
+
+# Counts come from the split's token store (preprocessor.tokenize_words), restricted to
+# TF-IDF terms (preprocessor.is_tfidf_term), i.e. the same tokens as the vectorizers in
+# analysis.py. Bump ANALYZER_VERSION when changing it; the index is then rebuilt from scratch.
+ANALYZER_VERSION = 2
+
+def open_index(index_dir=None):
+    """
+    Loads the index from disk (or returns an empty one).
+    An index built with other segmentation rules or another analyzer is discarded.
+    """
+    index_dir = index_dir or INDEX_DIR
+    index = {
+        'dir': index_dir,
+        'segmentation': turn_cache.segmentation_hash(),
+        'analyzer': ANALYZER_VERSION,
+        'vocabulary': [],
+        'term_ids': {},
+        'splits': {},
+    }
+    meta_path = os.path.join(index_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return index
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get('segmentation') != index['segmentation'] or meta.get('analyzer') != ANALYZER_VERSION:
+        print("Term index is stale (segmentation/analyzer changed), rebuilding.")
+        return index
+
+    index['vocabulary'] = meta['vocabulary']
+    index['term_ids'] = {term: i for i, term in enumerate(index['vocabulary'])}
+    for split, info in meta['splits'].items():
+        index['splits'][split] = {
+            'counts': sp.load_npz(os.path.join(index_dir, info['file'])).tocsr(),
+            'transcripts': set(info['transcripts']),
+            'source': info.get('source'),
+        }
+    return index
+
+def sync_split(index, split, source):
+    """
+    Drops the counts of a split indexed from other data than `source`
+    (turn_cache.cache_key of the split), so that it is counted again.
+    """
+    entry = index['splits'].get(split)
+    if entry is not None and entry.get('source') != source:
+        print(f"Term index: data of split '{split}' changed, re-indexing it.")
+        del index['splits'][split]
+
+def fingerprint(index_dir=None):
+    """
+    Digest of the saved index (its meta.json lists every split, its data source and
+    indexed transcripts), or None if there is none. Part of the stage cache keys.
+    """
+    meta_path = os.path.join(index_dir or INDEX_DIR, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def save_index(index):
+    index_dir = index['dir']
+    os.makedirs(index_dir, exist_ok=True)
+    meta = {
+        'segmentation': index['segmentation'],
+        'analyzer': index['analyzer'],
+        'vocabulary': index['vocabulary'],
+        'splits': {},
+    }
+    for split, entry in index['splits'].items():
+        file_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in split) + ".npz"
+        sp.save_npz(os.path.join(index_dir, file_name), entry['counts'])
+        meta['splits'][split] = {'file': file_name, 'transcripts': sorted(map(str, entry['transcripts'])),
+                                 'source': entry.get('source')}
+    tmp_path = os.path.join(index_dir, "meta.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(index_dir, "meta.json"))
+
+def update_index(index, split, df_turns, save=True, store=None, data_dir=None):
+    """
+    Adds the user turns of transcripts not yet indexed for this split (all of them
+    if the split's data changed since it was indexed, see sync_split).
+    store: token store of df_turns (see token_store.py); built on the fly if omitted.
+    Returns the number of new user turns.
+    """
+    source = turn_cache.cache_key(split, data_dir)
+    sync_split(index, split, source)
+    rows, transcripts = new_user_rows(index, split, df_turns)
+    if len(rows) == 0:
+        return 0
+    store = store or token_store.build_store(df_turns)
+    local_counts, local_terms = count_terms(store, rows)
+    return add_counts(index, split, local_counts, local_terms, transcripts, save=save, source=source)
+
+def new_user_rows(index, split, df_turns, known_transcripts=None):
+    """
+    Positions (in df_turns) of the user turns whose transcripts are not indexed for
+    the split yet, plus the set of those transcript ids.
+    """
+    if known_transcripts is None:
+        entry = index['splits'].get(split)
+        known_transcripts = entry['transcripts'] if entry else set()
+    transcript_ids = df_turns['transcript_id'].astype(str)
+    new_rows = turn_table.role_mask(df_turns, 'user') & ~transcript_ids.isin(known_transcripts).to_numpy()
+    return np.flatnonzero(new_rows), set(transcript_ids[new_rows])
+
+def count_terms(store, rows):
+    """
+    Term counts of some turns of a token store over their own TF-IDF terms:
+    (csr matrix, terms). Independent of the index, so batches can be counted in
+    other processes.
+    """
+    counts = token_store.count_matrix(store, rows)
+    columns = np.flatnonzero(token_store.tfidf_term_mask(store) & (counts.getnnz(axis=0) > 0))
+    return counts[:, columns], list(store['vocabulary'][columns])
+
+def add_counts(index, split, local_counts, local_terms, transcripts, save=True, source=None):
+    """
+    Appends a batch counted by count_terms to a split. Returns the number of new rows.
+    source: turn_cache.cache_key of the split's data (see sync_split).
+    """
+    entry = index['splits'].setdefault(split, {'counts': sp.csr_matrix((0, 0), dtype=np.int64), 'transcripts': set(),
+                                               'source': source})
+    if local_counts.shape[0] == 0:
+        return 0
+
+    # Map the batch's own vocabulary onto the shared one (new terms are appended)
+    term_ids = index['term_ids']
+    for term in local_terms:
+        if term not in term_ids:
+            term_ids[term] = len(index['vocabulary'])
+            index['vocabulary'].append(term)
+    column_map = np.array([term_ids[t] for t in local_terms], dtype=np.int64)
+    local_counts = local_counts.tocoo()
+    n_terms = len(index['vocabulary'])
+    new_counts = sp.csr_matrix((local_counts.data, (local_counts.row, column_map[local_counts.col])),
+                               shape=(local_counts.shape[0], n_terms))
+
+    entry['counts'] = sp.vstack([resize_columns(entry['counts'], n_terms), new_counts]).tocsr()
+    entry['transcripts'].update(transcripts)
+    if save:
+        save_index(index)
+    return new_counts.shape[0]
+
+def resize_columns(counts, n_terms):
+    """
+    Pads a split's count matrix to the current vocabulary size.
+    """
+    counts = counts.tocsr()
+    return sp.csr_matrix((counts.data, counts.indices, counts.indptr), shape=(counts.shape[0], n_terms))
+
+def stacked_counts(index, splits):
+    n_terms = len(index['vocabulary'])
+    parts = [resize_columns(index['splits'][s]['counts'], n_terms) for s in splits if s in index['splits']]
+    if not parts:
+        return sp.csr_matrix((0, n_terms), dtype=np.int64)
+    return sp.vstack(parts).tocsr()
+
+def tfidf_scores(index, splits, idf_splits=None, max_features=None):
+    """
+    Summed TF-IDF score of every term over the user turns of `splits`.
+
+    Args:
+        splits (list): Splits whose turns are scored.
+        idf_splits (list): Splits the IDF is computed on (default: `splits`). Use the
+            same idf_splits for several queries to get comparable scores.
+        max_features (int): Restrict the vocabulary to the most frequent terms of
+            `splits` first, like TfidfVectorizer(max_features=...).
+
+    Returns:
+        pd.Series: score per term (only terms present in `splits`).
+    """
+    vocabulary = np.array(index['vocabulary'], dtype=object)
+    counts = stacked_counts(index, splits)
+    idf_counts = counts if idf_splits is None else stacked_counts(index, idf_splits)
+
+    term_totals = np.asarray(counts.sum(axis=0)).ravel()
+    columns = np.flatnonzero(term_totals)
+    # Alphabetical order, as in a fitted vectorizer (keeps tie-breaking identical)
+    columns = columns[np.argsort(vocabulary[columns])]
+    if max_features is not None and max_features < len(columns):
+        keep = (-term_totals[columns]).argsort()[:max_features]
+        columns = columns[np.sort(keep)]
+    if len(columns) == 0:
+        return pd.Series(dtype=float)
+
+    n_docs = idf_counts.shape[0]
+    doc_freq = np.asarray((idf_counts[:, columns] > 0).sum(axis=0)).ravel()
+    idf = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+
+    weighted = counts[:, columns].multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    sums = np.asarray(weighted.multiply(1 / norms[:, None]).sum(axis=0)).ravel()
+    return pd.Series(sums, index=vocabulary[columns])
+
+def top_terms(index, splits, top_n=20, idf_splits=None, max_features=None):
+    """
+    Top-N terms by summed TF-IDF for a split or union of splits
+    (same 'term'/'rank' table as analysis.analyze_topics_tfidf).
+    """
+    scores = tfidf_scores(index, splits, idf_splits=idf_splits, max_features=max_features)
+    ranking = pd.DataFrame({'term': scores.index, 'rank': scores.to_numpy()})
+    ranking = ranking.sort_values('rank', ascending=False)
+    return ranking.head(top_n)
+
+def score_terms(index, splits, terms, idf_splits=None):
+    """
+    TF-IDF scores of specific terms in a split (0 for terms that never occur there).
+    """
+    scores = tfidf_scores(index, splits, idf_splits=idf_splits)
+    return pd.DataFrame({'term': list(terms), 'rank': [float(scores.get(t, 0.0)) for t in terms]})
@@ -0,0 +1,139 @@
+import itertools
+import os
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import preprocessor
+import turn_cache
+import turn_table
+
+# Shared tokenization of a split: every turn is tokenized once (preprocessor.tokenize_words)
+# and stored as interned integer ids instead of lists of Python strings.
+#   vocabulary   - term strings, term id = position
+#   token_ids    - int32 term id of every token, turns concatenated in df_turns order
+#   turn_offsets - start of each turn in token_ids (n_turns + 1 entries), CSR style
+#   is_user      - True for user turns
+# The store is cached next to the split's turns (same cache key). The postings index,
+# the TF-IDF term counts and the complexity feature all read it instead of
+# re-tokenizing the text.
+
+# Bump when the tokenization or the layout changes (stored inside the file).
+STORE_VERSION = 1
+
+def build_store(df_turns):
+    """
+    Tokenizes every turn once and interns the tokens.
+    """
+    tokens = [preprocessor.tokenize_words(t) for t in df_turns['content'].astype(str)]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    all_tokens = np.fromiter(itertools.chain.from_iterable(tokens), dtype=object, count=int(lengths.sum()))
+    codes, vocabulary = pd.factorize(all_tokens)
+
+    turn_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=turn_offsets[1:])
+    return make_store(np.asarray(vocabulary, dtype=object), codes.astype(np.int32), turn_offsets,
+                      turn_table.role_mask(df_turns, 'user'), content_size(df_turns))
+
+def make_store(vocabulary, token_ids, turn_offsets, is_user, source_size):
+    return {
+        'vocabulary': vocabulary,
+        'term_ids': {term: i for i, term in enumerate(vocabulary)},
+        'token_ids': token_ids,
+        'turn_offsets': turn_offsets,
+        'is_user': is_user,
+        # Total characters of the tokenized turns, to recognise the matching df_turns
+        'source_size': source_size,
+    }
+
+def content_size(df_turns):
+    if 'length' in df_turns.columns:
+        return int(df_turns['length'].sum())
+    return int(df_turns['content'].astype(str).str.len().sum())
+
+def save_store(store, path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp.npz"
+    # Terms never contain whitespace, so the vocabulary is stored as one newline-joined blob
+    blob = "\n".join(store['vocabulary']).encode("utf-8")
+    np.savez(tmp_path, version=STORE_VERSION, vocabulary=np.frombuffer(blob, dtype=np.uint8),
+             n_terms=len(store['vocabulary']), token_ids=store['token_ids'],
+             turn_offsets=store['turn_offsets'], is_user=store['is_user'], source_size=store['source_size'])
+    os.replace(tmp_path, path)
+
+def load_store(path):
+    """
+    Loads a saved store, or returns None if it was written by another STORE_VERSION.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        if int(data['version']) != STORE_VERSION:
+            return None
+        terms = data['vocabulary'].tobytes().decode("utf-8").split("\n") if int(data['n_terms']) else []
+        return make_store(np.asarray(terms, dtype=object), data['token_ids'], data['turn_offsets'],
+                          data['is_user'], int(data['source_size']))
+
+def store_path(split, data_dir=None):
+    """
+    The store is kept next to the split's cached turns and shares their cache key.
+    """
+    return turn_cache.cache_path(split, data_dir)[:-len(".arrow")] + ".tokens.npz"
+
+def fingerprint(split, data_dir=None):
+    """
+    Identifies the saved store of a split (version, size, modification time), or
+    None if there is none. Part of the stage cache keys.
+    """
+    path = store_path(split, data_dir)
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return f"v{STORE_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_store(split, df_turns, data_dir=None):
+    """
+    Returns the persisted token store of a split, building (and saving) it if needed.
+    df_turns must be the split's turns from turn_cache.get_turns.
+    """
+    path = store_path(split, data_dir)
+    if os.path.exists(path):
+        store = load_store(path)
+        if store is not None and len(store['turn_offsets']) == len(df_turns) + 1 \
+                and store['source_size'] == content_size(df_turns):
+            return store
+    store = build_store(df_turns)
+    try:
+        save_store(store, path)
+    except OSError as e:
+        print(f"Could not write token store: {e}")
+    return store
+
+def row_token_ids(store, rows):
+    """
+    Token ids of the given turns, concatenated, plus the number of tokens of each turn.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = store['turn_offsets'][rows]
+    lengths = store['turn_offsets'][rows + 1] - starts
+    # Position of every selected token in token_ids, without a Python loop over turns
+    shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return store['token_ids'][np.arange(int(lengths.sum())) + shift], lengths
+
+def count_matrix(store, rows=None):
+    """
+    Sparse (turns x vocabulary) term-count matrix of the given turns (default: all).
+    """
+    if rows is None:
+        rows = np.arange(len(store['turn_offsets']) - 1)
+    ids, lengths = row_token_ids(store, rows)
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    counts = sp.csr_matrix((np.ones(len(ids), dtype=np.int64), ids, indptr),
+                           shape=(len(lengths), len(store['vocabulary'])))
+    counts.sum_duplicates()
+    return counts
+
+def tfidf_term_mask(store):
+    """
+    Vocabulary entries that count as TF-IDF terms (see preprocessor.is_tfidf_term).
+    """
+    return np.fromiter((preprocessor.is_tfidf_term(t) for t in store['vocabulary']), dtype=bool,
+                       count=len(store['vocabulary']))
@@ -0,0 +1,165 @@
+import hashlib
+import inspect
+import os
+import pandas as pd
+import pyarrow as pa
+import data_loader
+import preprocessor
+import turn_table
+
+# Segmented turns are stored as uncompressed Arrow IPC files so warm runs can
+# memory-map them instead of downloading and segmenting the split again.
+CACHE_DIR = os.environ.get("TURN_CACHE_DIR", os.path.join("cache", "turns"))
+
+# Bump when the on-disk layout changes.
+CACHE_VERSION = 3
+
+# Everything that decides how a transcript becomes turns. Editing any of these
+# functions changes the hash, so stale cache files are never read.
+SEGMENTATION_FUNCS = [preprocessor.segment_dialogue, preprocessor.process_dataframe, preprocessor.count_tokens,
+                      preprocessor.char_classes, preprocessor.token_counts, preprocessor.utf8_token_counts,
+                      preprocessor.utf8_lengths, preprocessor.first_rows, preprocessor.as_arrow,
+                      preprocessor.empty_turns]
+SEGMENTATION_PARAMS = [preprocessor.MARKER_PATTERN, preprocessor.ROLE_MARKERS, preprocessor.PUNCTUATION.pattern]
+
+def segmentation_hash():
+    """
+    Hash of the segmentation rules (source code of SEGMENTATION_FUNCS + SEGMENTATION_PARAMS).
+    """
+    h = hashlib.sha256(f"v{CACHE_VERSION}".encode())
+    h.update(repr(SEGMENTATION_PARAMS).encode("utf-8"))
+    for func in SEGMENTATION_FUNCS:
+        h.update(inspect.getsource(func).encode("utf-8"))
+    return h.hexdigest()
+
+def cache_key(split, data_dir=None):
+    """
+    Cache key for a split: segmentation rules + identity of the raw data.
+    """
+    h = hashlib.sha256(segmentation_hash().encode())
+    h.update(data_loader.source_fingerprint(split, data_dir).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+def cache_path(split, data_dir=None, cache_dir=None):
+    cache_dir = cache_dir or CACHE_DIR
+    safe_split = "".join(c if c.isalnum() or c in "-_" else "_" for c in split)
+    return os.path.join(cache_dir, f"{safe_split}-{cache_key(split, data_dir)}.arrow")
+
+def read_turns(path):
+    """
+    Memory-maps a cached turn file and returns it as a compact turn table
+    (see turn_table.py): role/transcript_id come back as categoricals, while the
+    content and the numeric columns stay (read-only) views of the mapped file.
+    """
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    strings = {pa.string(): turn_table.CONTENT_DTYPE, pa.large_string(): turn_table.CONTENT_DTYPE}
+    # split_blocks: one block per column, so numeric columns are not copied into a 2D block
+    return table.to_pandas(types_mapper=strings.get, split_blocks=True)
+
+def derived_path(split, name, data_dir=None, cache_dir=None):
+    """
+    Path of an Arrow table derived from a split's turns (e.g. keyword hits): same
+    key as the turns, removed together with them (see prune_stale).
+    """
+    return cache_path(split, data_dir, cache_dir)[:-len(".arrow")] + f".{name}.arrow"
+
+def table_digest(df):
+    """
+    Content hash of a DataFrame (values of all columns, not the index).
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    h = hashlib.sha256(",".join(map(str, df.columns)).encode("utf-8"))
+    h.update(row_hashes.tobytes())
+    return h.hexdigest()[:16]
+
+def write_derived(df, path):
+    """
+    Writes a derived table (see derived_path) and returns its digest, which
+    read_derived checks: the file may be rewritten by a later run.
+    """
+    digest = table_digest(df)
+    write_turns(df.reset_index(drop=True), path, metadata={'digest': digest})
+    return digest
+
+def read_derived(path, digest):
+    """
+    Memory-maps a derived table, or returns None if the file is missing or holds
+    other content than the one with this digest.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    with pa.memory_map(path, 'r') as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    if metadata.get(b'digest', b'').decode() != digest:
+        return None
+    return read_turns(path)
+
+def write_turns(df_turns, path, metadata=None):
+    """
+    Writes df_turns to an Arrow IPC file (atomically, via a temp file).
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if df_turns.empty and len(df_turns.columns) == 0:
+        df_turns = preprocessor.empty_turns()
+    table = pa.Table.from_pandas(df_turns, preserve_index=False)
+    if metadata:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def prune_stale(split, keep_path, cache_dir=None):
+    """
+    Removes cache files of the same split written under older keys.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    keep_name = os.path.basename(keep_path)
+    prefix = keep_name.rsplit("-", 1)[0] + "-"
+    for name in os.listdir(cache_dir):
+        key = name[len(prefix):].split(".", 1)[0]
+        stale = name.startswith(prefix) and "-" not in key and key != keep_name[len(prefix):].split(".", 1)[0]
+        # Also drops derived files sharing the key (token store, postings, co-occurrence, derived tables)
+        if stale and name.endswith((".arrow", ".tokens.npz", ".postings.npz", ".cooc.npz")):
+            os.remove(os.path.join(cache_dir, name))
+
+def get_turns(split='workforce', data_dir=None, refresh=False, cache_dir=None):
+    """
+    Returns the segmented turns of a split, using the on-disk cache when possible.
+
+    Args:
+        split (str): Dataset split name.
+        data_dir (str): Optional folder with local split files (see data_loader).
+        refresh (bool): Ignore any cached file and rebuild it.
+
+    Returns:
+        pd.DataFrame: df_turns with columns role, content, transcript_id and the turn
+            metadata of preprocessor.TURN_META_COLUMNS (None if loading failed).
+    """
+    path = cache_path(split, data_dir, cache_dir)
+    if not refresh and os.path.exists(path):
+        print(f"Using cached turns for split '{split}': {path}")
+        return read_turns(path)
+
+    df = data_loader.load_data(split=split, data_dir=data_dir)
+    if df is None:
+        return None
+    return segment_and_cache(df, split, data_dir, cache_dir)
+
+def segment_and_cache(df, split, data_dir=None, cache_dir=None):
+    """
+    Segments an already loaded split and writes its turns to the cache.
+    """
+    path = cache_path(split, data_dir, cache_dir)
+    df_turns = turn_table.compact_turns(preprocessor.process_dataframe(df))
+
+    try:
+        write_turns(df_turns, path)
+        # An unresolved key says nothing about which files are stale
+        if data_loader.source_resolved(split, data_dir):
+            prune_stale(split, path, cache_dir)
+    except OSError as e:
+        print(f"Could not write turn cache: {e}")
+    return df_turns
@@ -0,0 +1,144 @@
+import numpy as np
+import pandas as pd
+import preprocessor
+
+# Compact layout of df_turns (same columns, leaner dtypes):
+#   role          - categorical ('assistant', 'user'): 1 byte per turn
+#   transcript_id - categorical: integer codes + one lookup table of the ids
+#   content       - Arrow-backed strings (one buffer instead of a Python object per turn)
+#   turn metadata - int32 columns (turn_id, length, n_tokens, ..., see preprocessor.py)
+# Every analysis function takes the compact table or a plain one alike. Row positions of
+# a role come from the categorical codes (an integer comparison instead of the
+# df_turns['role'] == 'user' string comparison). The transcript index (rows grouped
+# into one contiguous range per transcript) replaces
+# df_turns[df_turns['transcript_id'] == tid] scans; callers doing several lookups
+# build it once with transcript_index() and pass it down as index=.
+
+ROLES = ['assistant', 'user']
+
+try:
+    # Arrow storage with NaN missing values (pandas' default 'str' dtype from 3.0 on)
+    CONTENT_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+except TypeError:
+    CONTENT_DTYPE = pd.StringDtype("pyarrow_numpy")
+
+def compact_turns(df_turns):
+    """
+    Converts df_turns (role, content, transcript_id, ...) to the compact layout.
+    """
+    df = df_turns.copy()
+    df['role'] = pd.Categorical(df['role'], categories=ROLES)
+    df['transcript_id'] = pd.Categorical(df['transcript_id'])
+    if df['content'].dtype != CONTENT_DTYPE:
+        df['content'] = df['content'].astype(CONTENT_DTYPE)
+    for column in preprocessor.TURN_META_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype(np.int32)
+    return df.reset_index(drop=True)
+
+def role_rows(df_turns, role='user'):
+    """
+    Positions of the turns of one role.
+    """
+    roles = df_turns['role']
+    if isinstance(roles.dtype, pd.CategoricalDtype):
+        # Compare the small integer codes instead of the strings
+        code = roles.cat.categories.get_indexer([role])[0]
+        if code < 0:
+            return np.array([], dtype=np.int64)
+        return np.flatnonzero(roles.cat.codes.to_numpy() == code)
+    return np.flatnonzero((roles == role).to_numpy())
+
+def role_mask(df_turns, role='user'):
+    mask = np.zeros(len(df_turns), dtype=bool)
+    mask[role_rows(df_turns, role)] = True
+    return mask
+
+def user_turns(df_turns):
+    """
+    View of the user turns (same as df_turns[df_turns['role'] == 'user']).
+    """
+    return df_turns.iloc[role_rows(df_turns, 'user')]
+
+def transcript_index(df_turns):
+    """
+    Rows of every transcript as contiguous ranges:
+        ids     - pd.Index of the transcript ids present (hash lookup)
+        order   - row positions sorted by transcript (stable: turn order is kept)
+        offsets - rows of ids[i] are order[offsets[i]:offsets[i + 1]]
+    Turns without a transcript id are left out. The index is only valid for the
+    table it was built from, as long as that table is not modified.
+    """
+    column = df_turns['transcript_id']
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes, categories = column.cat.codes.to_numpy(), column.cat.categories
+    else:
+        codes, categories = pd.factorize(column)
+    order = np.argsort(codes, kind='stable')
+    order = order[np.count_nonzero(codes < 0):]
+    counts = np.bincount(codes[order], minlength=len(categories))
+    present = counts > 0
+    return {
+        'ids': pd.Index(categories[present]),
+        'order': order,
+        'offsets': np.concatenate([[0], np.cumsum(counts[present])]).astype(np.int64),
+    }
+
+def transcript_rows(df_turns, transcript_ids, index=None):
+    """
+    Row positions of one transcript (a single id) or of several (a list, rows in
+    the order of the ids); unknown ids have no rows. index: transcript_index(df_turns),
+    built here if not given.
+    """
+    if index is None:
+        index = transcript_index(df_turns)
+    if np.ndim(transcript_ids) == 0:
+        transcript_ids = [transcript_ids]
+    slots = index['ids'].get_indexer(transcript_ids)
+    slots = slots[slots >= 0]
+    starts, ends = index['offsets'][slots], index['offsets'][slots + 1]
+    lengths = ends - starts
+    # Concatenated ranges without a Python loop over the transcripts
+    shift = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return index['order'][np.arange(int(lengths.sum())) + shift]
+
+def get_transcript(df_turns, transcript_id, index=None):
+    """
+    Turns of one transcript in order (same rows as
+    df_turns[df_turns['transcript_id'] == transcript_id]), by hash lookup in
+    index (transcript_index(df_turns), built here if not given).
+    """
+    if index is None:
+        index = transcript_index(df_turns)
+    try:
+        slot = index['ids'].get_loc(transcript_id)
+    except KeyError:
+        return df_turns.iloc[:0]
+    rows = index['order'][index['offsets'][slot]:index['offsets'][slot + 1]]
+    if rows[-1] - rows[0] == len(rows) - 1:
+        # Consecutive rows (as segmentation writes them): a slice, no gather
+        return df_turns.iloc[rows[0]:rows[-1] + 1]
+    return df_turns.iloc[rows]
+
+def transcript_reduce(df_turns, values, how='sum', index=None):
+    """
+    Per-transcript reduction of a per-turn array (same length as df_turns), as a
+    Series indexed by transcript id. how: 'sum', 'max', 'min', 'count' or 'first'.
+    index: transcript_index(df_turns), built here if not given.
+    """
+    if index is None:
+        index = transcript_index(df_turns)
+    starts = index['offsets'][:-1]
+    if how == 'count':
+        result = np.diff(index['offsets'])
+    else:
+        ordered = np.asarray(values)[index['order']]
+        if how == 'first':
+            result = ordered[starts]
+        elif how in ('sum', 'max', 'min'):
+            ufunc = {'sum': np.add, 'max': np.maximum, 'min': np.minimum}[how]
+            # Every range is non-empty, so reduceat reduces exactly the transcript's turns
+            result = ufunc.reduceat(ordered, starts) if len(starts) else ordered[:0]
+        else:
+            raise ValueError(f"Unknown reduction '{how}' (use sum, max, min, count or first)")
+    return pd.Series(result, index=index['ids'], name=how)
@@ -0,0 +1,113 @@
+import numpy as np
+from scipy.spatial.distance import cdist
+from scipy.stats import norm
+from sklearn.metrics import calinski_harabasz_score, davies_bouldin_score
+
+# Cluster validity metrics that stay cheap on large user populations.
+# The exact silhouette needs all n^2 pairwise distances. Here only a random sample of
+# points is scored, each one exactly (distances to every point, computed in row
+# chunks of bounded size), and the mean comes with a confidence interval.
+# Davies-Bouldin and Calinski-Harabasz only need distances to centroids: O(n * k).
+SAMPLE_SIZE = 2000
+CONFIDENCE = 0.95
+# Upper bound for one block of the distance matrix
+MAX_CHUNK_BYTES = 64 * 1024 * 1024
+
+def silhouette_values(X, labels, rows, max_chunk_bytes=MAX_CHUNK_BYTES):
+    """
+    Exact silhouette coefficient of the points X[rows] against all points of X.
+    Distances are computed for a few rows at a time, so memory stays below max_chunk_bytes.
+    """
+    X = np.asarray(X, dtype=float)
+    clusters, codes = np.unique(labels, return_inverse=True)
+    sizes = np.bincount(codes, minlength=len(clusters)).astype(float)
+    one_hot = np.zeros((len(X), len(clusters)))
+    one_hot[np.arange(len(X)), codes] = 1
+
+    chunk_rows = max(1, max_chunk_bytes // (8 * max(len(X), 1)))
+    values = np.empty(len(rows))
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        # Summed distance of every chunk point to each cluster
+        sums = cdist(X[chunk], X) @ one_hot
+        own = codes[chunk]
+        idx = np.arange(len(chunk))
+        own_size = sizes[own]
+        a = sums[idx, own] / np.maximum(own_size - 1, 1)
+        mean_other = sums / sizes
+        mean_other[idx, own] = np.inf
+        b = mean_other.min(axis=1)
+        s = (b - a) / np.maximum(a, b)
+        # Convention (as in sklearn): 0 for singleton clusters
+        s[(own_size == 1) | ~np.isfinite(s)] = 0
+        values[start:start + len(chunk)] = s
+    return values
+
+def sampled_silhouette(X, labels, sample_size=SAMPLE_SIZE, confidence=CONFIDENCE, random_state=42,
+                       max_chunk_bytes=MAX_CHUNK_BYTES, population=None):
+    """
+    Silhouette score estimated from a random sample of points (exact when the
+    population is not larger than sample_size).
+    With population=N, X itself is a random sample of N points (e.g. collected from
+    a stream): all of X is scored and the interval is the one for a sample of N.
+
+    Returns:
+        dict: score, ci_low, ci_high, sample_size, n.
+    """
+    n = len(X) if population is None else population
+    if population is not None or sample_size is None or sample_size >= n:
+        rows = np.arange(len(X))
+    else:
+        rows = np.sort(np.random.default_rng(random_state).choice(n, size=sample_size, replace=False))
+    values = silhouette_values(X, labels, rows, max_chunk_bytes)
+    score = float(values.mean())
+
+    # Normal interval for the mean, with finite-population correction (0 width if exact)
+    m = len(rows)
+    half_width = 0.0
+    if 1 < m < n:
+        z = norm.ppf(0.5 + confidence / 2)
+        half_width = float(z * values.std(ddof=1) / np.sqrt(m) * np.sqrt((n - m) / (n - 1)))
+    return {
+        'score': score,
+        'ci_low': score - half_width,
+        'ci_high': score + half_width,
+        'sample_size': m,
+        'n': n,
+    }
+
+def validate_clusters(X, labels, sample_size=SAMPLE_SIZE, confidence=CONFIDENCE, random_state=42, population=None):
+    """
+    Cluster validity report: sampled silhouette (with CI), Davies-Bouldin and
+    Calinski-Harabasz. The index-based metrics are None when there is only one cluster.
+    population: X is a random sample of that many points (see sampled_silhouette);
+    the indices are then estimated on the sample.
+
+    Returns:
+        dict: silhouette, silhouette_ci (low, high), sample_size, n, n_clusters,
+        confidence, davies_bouldin, calinski_harabasz. With fewer than 2 clusters (or
+        one cluster per point) the silhouette is undefined: sample_size is then 0.
+    """
+    n_clusters = len(np.unique(labels))
+    results = {
+        'silhouette': 0.0,
+        'silhouette_ci': (0.0, 0.0),
+        'sample_size': 0,
+        'n': len(X) if population is None else population,
+        'n_clusters': n_clusters,
+        'confidence': confidence,
+        'davies_bouldin': None,
+        'calinski_harabasz': None,
+    }
+    if n_clusters < 2 or n_clusters >= len(X):
+        return results
+
+    silhouette = sampled_silhouette(X, labels, sample_size, confidence, random_state, population=population)
+    results.update({
+        'silhouette': silhouette['score'],
+        'silhouette_ci': (silhouette['ci_low'], silhouette['ci_high']),
+        'sample_size': silhouette['sample_size'],
+        'davies_bouldin': float(davies_bouldin_score(X, labels)),
+        'calinski_harabasz': float(calinski_harabasz_score(X, labels)),
+    })
+    return results
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The analysis modules are flat files in src/ imported by bare name (like main.py does)
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
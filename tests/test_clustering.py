@@ -0,0 +1,34 @@
+import numpy as np
+import analysis
+import clustering
+
+def blobs(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = np.array([[0, 0, 0, 0], [8, 8, 0, 0], [0, 8, 8, 0], [8, 0, 0, 8]], dtype=float)
+    return centers[rng.integers(0, len(centers), n)] + rng.normal(size=(n, 4))
+
+def test_sweep_returns_the_fit_of_every_k():
+    X = blobs()
+    sweep, fits = clustering.sweep_k(X, range(2, 6), max_workers=1)
+    assert sorted(fits) == list(sweep['k']) == [2, 3, 4, 5]
+    for row in sweep.itertuples():
+        fit = fits[row.k]
+        assert fit['centers'].shape == (row.k, X.shape[1])
+        assert fit['metrics']['silhouette'] == row.silhouette
+        assert len(np.unique(fit['labels'])) == row.k
+
+def test_auto_k_reuses_the_sweep_fit(monkeypatch, tmp_path):
+    X = blobs()
+    user_ids = [f"u{i}" for i in range(len(X))]
+    monkeypatch.setattr(analysis, "extract_user_features", lambda df_turns, hits=None, store=None: (user_ids, X))
+    monkeypatch.setattr(clustering, "MODEL_PATH", str(tmp_path / "model.npz"))
+    monkeypatch.setattr(clustering, "fit_model", None)  # a refit would fail
+    cluster_data, centers, _, metrics = analysis.analyze_maturity_clusters(None, n_clusters='auto', max_k=5)
+
+    sweep = metrics['k_sweep']
+    chosen = sweep[sweep['k'] == clustering.pick_k(sweep)].iloc[0]
+    assert len(centers) == chosen['k'] == 4
+    assert metrics['silhouette'] == chosen['silhouette']
+    # The saved model assigns the users to the clusters reported
+    model = clustering.load_model()
+    assert np.array_equal(clustering.predict(model, X), cluster_data['cluster'].to_numpy())
@@ -0,0 +1,39 @@
+import warnings
+import numpy as np
+import cooccurrence_matrix
+import inverted_index
+import preprocessor
+import semantic_analysis
+import token_store
+from synthetic import make_transcripts
+
+def make_index(n_transcripts=60, seed=3):
+    df_turns = preprocessor.process_dataframe(make_transcripts(n_transcripts, seed=seed))
+    return inverted_index.build_index(token_store.build_store(df_turns))
+
+def test_matrix_rows_equal_postings_counters():
+    index = make_index()
+    for user_only in (True, False):
+        counts = cooccurrence_matrix.build_matrix(index, window_size=3, user_only=user_only).tocsr()
+        for term_id, word in enumerate(index['vocabulary']):
+            counter = inverted_index.cooccurrence(index, word, window_size=3, min_length=0, user_only=user_only)
+            row = counts[term_id]
+            expected = {tuple(sorted((word, index['vocabulary'][b]))): int(c)
+                        for b, c in zip(row.indices, row.data) if c}
+            assert dict(counter) == expected, word
+
+def test_term_mask_drops_pairs():
+    index = make_index(20)
+    mask = cooccurrence_matrix.content_term_mask(index['vocabulary'], min_length=5)
+    full = cooccurrence_matrix.build_matrix(index, window_size=2).toarray()
+    masked = cooccurrence_matrix.build_matrix(index, window_size=2, term_mask=mask).toarray()
+    assert not masked[~mask].any() and not masked[:, ~mask].any()
+    assert (masked <= full).all()
+
+def test_semantic_map_has_no_dtype_warning():
+    index = make_index(20)
+    word = index['vocabulary'][np.argmax(np.bincount(index['token_ids']))]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        neighbours, map_edges = semantic_analysis.analyze_semantic_map(index, [word], min_count=1)
+    assert set(neighbours['Target']) <= {word}
@@ -0,0 +1,74 @@
+import os
+import sys
+import types
+import pytest
+import data_loader
+import turn_cache
+from synthetic import make_transcripts
+
+SHA = "a" * 40
+
+@pytest.fixture
+def hub(monkeypatch, tmp_path):
+    """
+    Fake huggingface_hub whose dataset_info returns hub.sha, or fails when hub.online is False.
+    """
+    state = types.SimpleNamespace(sha=SHA, online=True, calls=0)
+
+    class HfApi:
+        def dataset_info(self, name, revision=None):
+            state.calls += 1
+            if not state.online:
+                raise ConnectionError("offline")
+            return types.SimpleNamespace(sha=state.sha)
+
+    monkeypatch.setitem(sys.modules, "huggingface_hub", types.SimpleNamespace(HfApi=HfApi))
+    monkeypatch.setattr(data_loader, "REVISION_FILE", str(tmp_path / "dataset_revision.json"))
+    monkeypatch.setattr(data_loader, "DATASET_REVISION", None)
+    monkeypatch.setattr(data_loader, "DATA_DIR", None)
+    data_loader.dataset_revision.cache_clear()
+    yield state
+    data_loader.dataset_revision.cache_clear()
+
+def fingerprint():
+    data_loader.dataset_revision.cache_clear()
+    return data_loader.source_fingerprint("workforce")
+
+def test_offline_reuses_last_resolved_sha(hub, monkeypatch):
+    online = fingerprint()
+    hub.online = False
+    monkeypatch.setattr(data_loader, "REVISION_TTL", 0)
+    assert fingerprint() == online
+
+def test_recorded_sha_skips_lookup_within_ttl(hub):
+    fingerprint()
+    hub.sha = "b" * 40
+    assert fingerprint().endswith(f"@{SHA}:workforce")
+    assert hub.calls == 1
+
+def test_expired_sha_is_resolved_again(hub, monkeypatch):
+    fingerprint()
+    hub.sha = "b" * 40
+    monkeypatch.setattr(data_loader, "REVISION_TTL", 0)
+    assert fingerprint().endswith(f"@{'b' * 40}:workforce")
+
+def test_pinned_sha_needs_no_lookup(hub, monkeypatch):
+    monkeypatch.setattr(data_loader, "DATASET_REVISION", SHA)
+    hub.online = False
+    assert fingerprint().endswith(f"@{SHA}:workforce")
+    assert hub.calls == 0
+
+def test_unresolved_key_does_not_prune(hub, tmp_path):
+    cache_dir = str(tmp_path / "turns")
+    os.makedirs(cache_dir)
+    df = make_transcripts(5, seed=1)
+    data_loader.dataset_revision.cache_clear()
+    turn_cache.segment_and_cache(df, "workforce", cache_dir=cache_dir)
+    resolved = sorted(os.listdir(cache_dir))
+
+    hub.online = False
+    os.remove(data_loader.REVISION_FILE)
+    data_loader.dataset_revision.cache_clear()
+    assert not data_loader.source_resolved("workforce")
+    turn_cache.segment_and_cache(df, "workforce", cache_dir=cache_dir)
+    assert set(resolved) < set(os.listdir(cache_dir))
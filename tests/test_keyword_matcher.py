@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+import analysis
+import keyword_matcher
+
+FAMILIES = keyword_matcher.DEFAULT_KEYWORD_FAMILIES
+
+TEXTS = [
+    "Please automate this and write this code, then draft a template idea.",
+    "That's WRONG, a Mistake - please revise and update; no, not quite.",
+    # 'İ' lowercases to 'i' + U+0307 in Python, so 'İdea' does not contain 'idea'
+    "İDEA: İnspiration for the İmplementation of a Python APİ",
+    # Final sigma: 'Σ' becomes 'ς' at the end of a word, 'σ' elsewhere
+    "ΛΑΘΟΣ ΣΦΑΛΜΑ wrong",
+    "Straße, ﬁle, Ǆ, café, naïve data in the 𝐂𝐨𝐝𝐞 and ÇODE",
+    "K (Kelvin sign) and Å (Angstrom sign) in a career-skill job",
+    "",
+    "nonono no-no NO",
+]
+
+def python_hits(texts, families):
+    """
+    The classifiers' original semantics: sum of text.lower().count(k) per family.
+    """
+    return pd.DataFrame({name: [sum(t.lower().count(k.lower()) for k in keywords) for t in texts]
+                         for name, keywords in families.items()})
+
+def test_family_hits_match_str_lower_count():
+    expected = python_hits(TEXTS, FAMILIES)
+    hits = keyword_matcher.family_hits(pd.Series(TEXTS), FAMILIES)
+    pd.testing.assert_frame_equal(hits, expected, check_dtype=False)
+
+@pytest.mark.parametrize("families", [
+    {'dotted': ['i̇dea', 'ç'], 'sigma': ['ς', 'σ', 'θος'], 'kelvin': ['k', 'å']},
+    {'overlapping': ['no', 'not', 'on', 'ono'], 'repeated': ['no', 'no']},
+])
+def test_non_ascii_keywords_match_str_lower_count(families):
+    texts = TEXTS + ["ΟΣ Σ ΑΣΑ", "İ̇", "ǅ Ǆ ǆ"]
+    hits = keyword_matcher.family_hits(texts, families)
+    pd.testing.assert_frame_equal(hits, python_hits(texts, families), check_dtype=False)
+
+def test_lowercase_mismatches_cover_dotted_i_and_sigma():
+    pattern = keyword_matcher.lowercase_mismatches()
+    assert "\\x{130}" in pattern and "\\x{3a3}" in pattern
+    # Plain ASCII text never needs the fallback
+    assert "\\x{" + "41}" not in pattern
+
+def test_classifiers_match_the_original_loops():
+    df_turns = pd.DataFrame({'role': ['user', 'assistant'] * len(TEXTS),
+                             'content': [t for text in TEXTS for t in (text, "answer")],
+                             'transcript_id': [f"t{i // 4}" for i in range(2 * len(TEXTS))]})
+    lowered = [t.lower() for t in TEXTS]
+    def any_of(family, text):
+        return any(k in text for k in FAMILIES[family])
+
+    stats = analysis.analyze_interactions(df_turns)
+    delegation = [any_of('delegation', t) for t in lowered]
+    collaboration = [not d and any_of('collaboration', t) for d, t in zip(delegation, lowered)]
+    assert stats['delegation'] == sum(delegation)
+    assert stats['collaboration'] == sum(collaboration)
+    assert stats['foundation'] == sum(not d and not c and any_of('foundation', t)
+                                      for d, c, t in zip(delegation, collaboration, lowered))
+    assert analysis.analyze_trust_issues(df_turns) == (sum(any_of('error', t) for t in lowered), len(TEXTS))
+    assert len(analysis.analyze_future_outlook(df_turns)) == sum(any_of('future', t) for t in lowered)
@@ -0,0 +1,15 @@
+import portfolio_visuals
+
+def refinement_text(refinement, others):
+    stats = {'avg_len': 900.0, 'avg_len_all': 500.0, 'refinement': refinement, 'refinement_others': others}
+    return portfolio_visuals.persona_texts(stats)['refinement']
+
+def test_refinement_levels():
+    assert refinement_text(3.0, 1.0) == "High (3.0x)"
+    assert refinement_text(26.0, 1.0) == "High (26x)"
+    assert refinement_text(1.0, 1.1) == "Similar (0.9x)"
+    assert refinement_text(0.0, 1.0) == "Low (0.0x)"
+
+def test_refinement_without_others():
+    assert refinement_text(2.0, 0.0) == "High"
+    assert refinement_text(0.0, 0.0) == "Similar"
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import preprocessor
+from synthetic import make_transcripts
+
+def turns_equal(actual, expected):
+    assert list(actual.columns) == preprocessor.TURN_COLUMNS
+    assert len(actual) == len(expected)
+    cols = preprocessor.TURN_COLUMNS
+    assert (actual[cols].astype(object).values == expected[cols].astype(object).values).all()
+
+def test_parity_with_iterrows():
+    df = make_transcripts(300, seed=7)
+    turns_equal(preprocessor.process_dataframe(df), preprocessor.process_dataframe_iterrows(df))
+
+def test_missing_and_empty_text():
+    df = pd.DataFrame({'transcript_id': ['a', 'b', 'c', 'd'],
+                       'text': [None, '', np.nan, 'User: hi']})
+    turns = preprocessor.process_dataframe(df)
+    assert turns['transcript_id'].tolist() == ['d']
+    assert turns['content'].tolist() == ['hi']
+    assert preprocessor.segment_dialogue(None) == []
+    assert preprocessor.segment_dialogue('') == []
+
+def test_empty_frame():
+    turns = preprocessor.process_dataframe(pd.DataFrame(columns=['transcript_id', 'text']))
+    assert turns.empty
+    assert list(turns.columns) == preprocessor.TURN_COLUMNS
+
+def test_text_before_first_marker_is_dropped():
+    df = pd.DataFrame({'transcript_id': ['a'], 'text': ['Intro line\nUser: hello\nAssistant: hi there']})
+    turns = preprocessor.process_dataframe(df)
+    assert turns['role'].tolist() == ['user', 'assistant']
+    assert turns['content'].tolist() == ['hello', 'hi there']
+    turns_equal(turns, preprocessor.process_dataframe_iterrows(df))
+
+def test_turn_metadata():
+    text = 'User: one two\nAssistant: ok\nUser: three\nUser: four, five!\nAssistant: done'
+    turns = preprocessor.process_dataframe(pd.DataFrame({'transcript_id': ['a'], 'text': [text]}))
+    assert turns['turn_id'].tolist() == [0, 1, 2, 3, 4]
+    assert turns['prev_assistant_id'].tolist() == [-1, -1, 1, 1, 1]
+    assert turns['n_tokens'].tolist() == [2, 1, 1, 2, 1]
+    assert turns['length'].tolist() == [len(c) for c in turns['content']]
+
+def test_unicode_byte_offsets():
+    texts = ['  Hi\nUser: héllo wörld, ok?\n\n Assistant:  Sure — ... fine!\nUser: 日本語 テキスト',
+             'Assistant: é User: z ']
+    df = pd.DataFrame({'transcript_id': ['a', 'b'], 'text': texts})
+    turns = preprocessor.process_dataframe(df)
+    for turn in turns.itertuples():
+        raw = texts[0 if turn.transcript_id == 'a' else 1].encode("utf-8")
+        assert raw[turn.byte_start:turn.byte_end].decode("utf-8") == turn.content
+    # Unicode letters are word characters for the token count
+    assert turns['n_tokens'].tolist() == [3, 2, 2, 1, 1]
+    turns_equal(turns, preprocessor.process_dataframe_iterrows(df))
+
+def test_token_counts_match_count_tokens():
+    # Every BMP character as a word, inside a word and as a separator, plus emoji
+    chars = [chr(c) for c in range(0x10000) if not 0xD800 <= c <= 0xDFFF]
+    texts = [t for c in chars for t in (c, f"a{c}b", f" {c} x")]
+    texts += ['', '  ', 'hi 😀 there', '😀', 'x y\x85z', '— ok …', 'snake_case CamelCase 42']
+    strings = pa.array(texts, type=pa.string())
+    expected = [preprocessor.count_tokens(t) for t in texts]
+    assert preprocessor.token_counts(strings).tolist() == expected
+    assert preprocessor.token_counts(pa.array(texts, type=pa.large_string())).tolist() == expected
+    assert preprocessor.token_counts(strings.slice(5, 100)).tolist() == expected[5:105]
+
+def test_token_counts_in_batches(monkeypatch):
+    texts = ['hello world', 'a', '', 'x y z w', '日本 語', '😀 ok', 'b'] * 5
+    monkeypatch.setattr(preprocessor, 'TOKEN_BATCH_BYTES', 7)
+    assert preprocessor.token_counts(pa.array(texts)).tolist() == [preprocessor.count_tokens(t) for t in texts]
@@ -0,0 +1,67 @@
+import functools
+import importlib
+import sys
+import pytest
+import stage_cache
+
+STAGES = '''
+import os
+
+THRESHOLD = 3
+
+def helper(values):
+    return [v for v in values if v > {cutoff}]
+
+def indirect(values):
+    return helper(values)
+
+def stage_plain(df_turns, inputs, split='workforce'):
+    return {{'lines': []}}
+
+def stage_direct(df_turns, inputs, split='workforce'):
+    return {{'lines': helper(df_turns)}}
+
+def stage_indirect(df_turns, inputs, split='workforce'):
+    return {{'lines': [x for x in indirect(df_turns) if x < THRESHOLD]}}
+'''
+
+@pytest.fixture
+def write_stages(tmp_path, monkeypatch):
+    """
+    Writes a toy stage module into a fake src/ dir and returns its task keys.
+    """
+    monkeypatch.setattr(stage_cache, "SRC_DIR", str(tmp_path))
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    def keys(cutoff=0, threshold=3):
+        source = STAGES.format(cutoff=cutoff).replace("THRESHOLD = 3", f"THRESHOLD = {threshold}")
+        (tmp_path / "toy_stages.py").write_text(source)
+        stage_cache.module_source.cache_clear()
+        sys.modules.pop("toy_stages", None)
+        importlib.invalidate_caches()
+        module = importlib.import_module("toy_stages")
+        tasks = {name: (functools.partial(getattr(module, name), split='workforce'), [])
+                 for name in ('stage_plain', 'stage_direct', 'stage_indirect')}
+        return stage_cache.task_keys(tasks, "input")
+
+    yield keys
+    sys.modules.pop("toy_stages", None)
+    stage_cache.module_source.cache_clear()
+
+def test_editing_a_helper_changes_the_keys_of_its_callers(write_stages):
+    before, after = write_stages(cutoff=0), write_stages(cutoff=1)
+    assert before['stage_plain'] == after['stage_plain']
+    assert before['stage_direct'] != after['stage_direct']
+    # Reached through another helper
+    assert before['stage_indirect'] != after['stage_indirect']
+
+def test_settings_read_in_comprehensions_change_the_key(write_stages):
+    before, after = write_stages(threshold=3), write_stages(threshold=4)
+    assert before['stage_indirect'] != after['stage_indirect']
+    assert before['stage_direct'] == after['stage_direct']
+
+def test_real_stages_hash_their_helpers():
+    import main
+    helpers, modules = stage_cache.referenced_code(main.stage_interactions)
+    assert main.keyword_hits in helpers
+    assert 'turn_cache' in modules
@@ -0,0 +1,32 @@
+import pytest
+import preprocessor
+import task_graph
+import turn_cache
+from synthetic import make_transcripts
+
+def report_pool_size(df_turns, inputs):
+    return {'lines': [], 'pool_size': task_graph.pool_size()}
+
+@pytest.fixture
+def turns_path(tmp_path):
+    path = str(tmp_path / "turns.arrow")
+    turn_cache.write_turns(preprocessor.process_dataframe(make_transcripts(5, seed=3)), path)
+    return path
+
+def test_split_shares():
+    assert task_graph.split_shares(8, 3) == [3, 3, 2]
+    assert task_graph.split_shares(8, 8) == [1] * 8
+    # Never less than the task's own process
+    assert task_graph.split_shares(0, 2) == [1, 1]
+
+def test_lone_stage_gets_all_workers(turns_path, monkeypatch):
+    monkeypatch.setattr(task_graph, "MAX_WORKERS", 4)
+    tasks = {'first': (report_pool_size, []), 'alone': (report_pool_size, ['first'])}
+    results = task_graph.run_tasks(tasks, None, turns_path=turns_path, max_workers=4)
+    assert results['alone']['pool_size'] == 4
+
+def test_concurrent_stages_split_the_workers(turns_path, monkeypatch):
+    monkeypatch.setattr(task_graph, "MAX_WORKERS", 4)
+    tasks = {name: (report_pool_size, []) for name in ('a', 'b', 'c')}
+    results = task_graph.run_tasks(tasks, None, turns_path=turns_path, max_workers=4)
+    assert sorted(r['pool_size'] for r in results.values()) == [1, 1, 2]
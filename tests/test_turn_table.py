@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+import preprocessor
+import turn_table
+from synthetic import make_transcripts
+
+def plain_turns():
+    return preprocessor.process_dataframe(make_transcripts(40, seed=11))
+
+def shuffled_turns():
+    # Rows of a transcript are no longer consecutive
+    df = plain_turns()
+    return df.iloc[np.random.default_rng(0).permutation(len(df))].reset_index(drop=True)
+
+TABLES = {
+    'object': plain_turns,
+    'categorical': lambda: turn_table.compact_turns(plain_turns()),
+    'shuffled': shuffled_turns,
+    'shuffled_categorical': lambda: turn_table.compact_turns(shuffled_turns()),
+}
+
+@pytest.fixture(params=list(TABLES))
+def df_turns(request):
+    return TABLES[request.param]()
+
+def transcript_ids(df_turns):
+    return list(pd.unique(df_turns['transcript_id'].astype(object)))
+
+def test_get_transcript_matches_mask(df_turns):
+    index = turn_table.transcript_index(df_turns)
+    for tid in transcript_ids(df_turns):
+        expected = df_turns[(df_turns['transcript_id'] == tid).to_numpy()]
+        for turns in (turn_table.get_transcript(df_turns, tid), turn_table.get_transcript(df_turns, tid, index=index)):
+            assert turns.index.tolist() == expected.index.tolist()
+            assert turns['content'].tolist() == expected['content'].tolist()
+
+def test_unknown_ids(df_turns):
+    assert turn_table.get_transcript(df_turns, 'no-such-id').empty
+    assert len(turn_table.transcript_rows(df_turns, 'no-such-id')) == 0
+    known = transcript_ids(df_turns)[0]
+    rows = turn_table.transcript_rows(df_turns, ['no-such-id', known, 'other'])
+    assert rows.tolist() == np.flatnonzero((df_turns['transcript_id'] == known).to_numpy()).tolist()
+
+def test_transcript_rows_in_id_order(df_turns):
+    ids = transcript_ids(df_turns)[::-3]
+    expected = np.concatenate([np.flatnonzero((df_turns['transcript_id'] == tid).to_numpy()) for tid in ids])
+    assert turn_table.transcript_rows(df_turns, ids).tolist() == expected.tolist()
+    assert turn_table.transcript_rows(df_turns, ids[0]).tolist() == \
+        np.flatnonzero((df_turns['transcript_id'] == ids[0]).to_numpy()).tolist()
+
+def test_transcript_reduce_matches_groupby(df_turns):
+    values = df_turns['length'].to_numpy()
+    groups = pd.Series(values).groupby(df_turns['transcript_id'].astype(object).to_numpy(), sort=False)
+    expected = {'sum': groups.sum(), 'max': groups.max(), 'min': groups.min(),
+                'count': groups.size(), 'first': groups.first()}
+    for how, series in expected.items():
+        result = turn_table.transcript_reduce(df_turns, None if how == 'count' else values, how=how)
+        assert result.to_dict() == series.to_dict(), how
+    with pytest.raises(ValueError):
+        turn_table.transcript_reduce(df_turns, values, how='median')
+
+def test_missing_transcript_ids_are_left_out():
+    df = pd.DataFrame({'role': ['user', 'assistant', 'user'], 'content': ['a', 'b', 'c'],
+                       'transcript_id': ['t1', None, 't1']})
+    assert turn_table.get_transcript(df, 't1')['content'].tolist() == ['a', 'c']
+    assert turn_table.transcript_reduce(df, None, how='count').to_dict() == {'t1': 2}